@@ -12,6 +12,9 @@ urlpatterns = [
     path('change-requests/<int:change_request_id>/', views.change_request_detail_view, name='change_request_detail'),
     path('rides/', views.rides_dashboard_view, name='rides_dashboard'),
     path('rides/trip/<int:trip_pk>/', views.admin_trip_detail_view, name='admin_trip_detail'),
+    path('rides/trip/<int:trip_pk>/replay/', views.admin_trip_replay_api, name='admin_trip_replay_api'),
+    path('rides/fleet/live/', views.admin_fleet_live_api, name='admin_fleet_live_api'),
+    path('notifications/stats/', views.admin_notification_stats_api, name='admin_notification_stats_api'),
     path('rides/booking/<int:booking_pk>/map/', views.admin_booking_map_view, name='admin_booking_map'),
     path('sos/', views.sos_dashboard_view, name='sos_dashboard'),
     path('sos/<int:incident_id>/', views.sos_incident_detail_view, name='sos_incident_detail'),
@@ -1,9 +1,9 @@
 # Add user creation view (GET: show form, POST: save user)
-from django.http import HttpResponseRedirect, JsonResponse
+from django.http import HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.contrib.auth import authenticate, login, logout
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt, csrf_protect
-from datetime import timedelta
+from datetime import datetime, timedelta
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q, Sum, Max
@@ -23,14 +23,19 @@ from lets_go.models import (
     ChangeRequest,
     SupportThread,
     SupportMessage,
+    trip_json_deferred,
 )
 import base64
+import json
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.hashers import make_password
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
 
 from lets_go.views_notifications import send_ride_notification_async
+from lets_go.utils.track_archive import replay_tracks
+from lets_go.utils.live_store import get_live_store
+from lets_go.utils.notification_pool import get_notification_pool
 
 
 def _attach_latest_payments(bookings):
@@ -709,6 +714,122 @@ def change_request_detail_view(request, change_request_id):
     })
 
 
+@login_required
+@require_http_methods(['GET'])
+def admin_trip_replay_api(request, trip_pk):
+    """Stream a trip's recorded tracks as NDJSON for replay.
+
+    Query: role=DRIVER|PASSENGER, resolution=<seconds between points>.
+    Lines: a header, then per track a 'track' line followed by 'points'
+    lines of up to 500 [lat, lng, epoch_seconds] triples.
+    """
+    trip = get_object_or_404(Trip.objects.only('id', 'trip_id'), pk=trip_pk)
+    role = (request.GET.get('role') or '').strip().upper() or None
+    try:
+        resolution = max(float(request.GET.get('resolution') or 0), 0.0)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid resolution'}, status=400)
+
+    def _lines():
+        first = True
+        for source, track in replay_tracks(trip, role=role, resolution_s=resolution):
+            if first:
+                yield json.dumps({'type': 'trip', 'trip_id': trip.trip_id, 'source': source}) + '\n'
+                first = False
+            points = track.pop('points')
+            yield json.dumps(dict(track, type='track', point_count=len(points))) + '\n'
+            for i in range(0, len(points), 500):
+                chunk = [[round(lat, 6), round(lng, 6), round(t, 1)] for lat, lng, t in points[i:i + 500]]
+                yield json.dumps({'type': 'points', 'points': chunk}) + '\n'
+        if first:
+            yield json.dumps({'type': 'trip', 'trip_id': trip.trip_id, 'source': None}) + '\n'
+
+    return StreamingHttpResponse(_lines(), content_type='application/x-ndjson')
+
+
+FLEET_PAGE_SIZE = 500
+FLEET_MAX_PAGE_SIZE = 2000
+FLEET_SIGNAL_LOST_SECONDS = 30
+FLEET_DEVIATION_M = 300
+
+
+@login_required
+@require_http_methods(['GET'])
+def admin_notification_stats_api(request):
+    """Queue depth, delivery counters and latency of the notification pool."""
+    return JsonResponse({'success': True, 'stats': get_notification_pool().stats()})
+
+
+def _parse_bbox(raw):
+    """'west,south,east,north' -> (min_lat, min_lng, max_lat, max_lng)."""
+    if not raw:
+        return None, None, None, None
+    west, south, east, north = (float(v) for v in raw.split(','))
+    if south > north or west > east:
+        raise ValueError('bbox')
+    return south, west, north, east
+
+
+@login_required
+@require_http_methods(['GET'])
+def admin_fleet_live_api(request):
+    """Latest driver position of every IN_PROGRESS trip inside a bounding box.
+
+    Query: bbox=west,south,east,north (optional), limit, after=<trip pk cursor>.
+    Served from the live-position store's grid index; Trip rows are only
+    read for status and trip_id, never live_tracking_state. Pages are
+    ordered by trip pk; pass next_after back as `after` for the next page.
+    """
+    try:
+        bbox = _parse_bbox((request.GET.get('bbox') or '').strip())
+        limit = min(max(int(request.GET.get('limit') or FLEET_PAGE_SIZE), 1), FLEET_MAX_PAGE_SIZE)
+        after = int(request.GET.get('after') or 0)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid bbox, limit or after'}, status=400)
+
+    candidates = [(pk, point) for pk, point in get_live_store().drivers_in_bbox(*bbox) if pk > after]
+    now = timezone.now()
+    trips = []
+    next_after = None
+    for i in range(0, len(candidates), limit):
+        chunk = candidates[i:i + limit]
+        live = dict(
+            Trip.objects.filter(pk__in=[pk for pk, _ in chunk], trip_status='IN_PROGRESS')
+            .values_list('pk', 'trip_id')
+        )
+        for pk, point in chunk:
+            if pk not in live:
+                continue
+            if len(trips) == limit:
+                next_after = trips[-1]['trip_pk']
+                break
+            last_seen = None
+            try:
+                ts = datetime.fromisoformat(str(point.get('timestamp')))
+                last_seen = max(int((now - ts).total_seconds()), 0)
+            except (TypeError, ValueError):
+                pass
+            deviation = point.get('route_deviation_m')
+            trips.append({
+                'trip_pk': pk,
+                'trip_id': live[pk],
+                'driver_id': point.get('user_id'),
+                'lat': point.get('lat'),
+                'lng': point.get('lng'),
+                'speed_mps': point.get('speed_smoothed_mps', point.get('speed')),
+                'heading_deg': point.get('heading_deg'),
+                'timestamp': point.get('timestamp'),
+                'last_seen_seconds': last_seen,
+                'signal_lost': last_seen is None or last_seen > FLEET_SIGNAL_LOST_SECONDS,
+                'deviation_meters': deviation,
+                'is_deviating': None if deviation is None else deviation > FLEET_DEVIATION_M,
+            })
+        if next_after is not None:
+            break
+
+    return JsonResponse({'success': True, 'count': len(trips), 'trips': trips, 'next_after': next_after})
+
+
 def admin_booking_map_view(request, booking_pk):
     """Admin page to visualize a single booking on the map with distance and price totals."""
     booking = get_object_or_404(
@@ -911,12 +1032,14 @@ def sos_dashboard_view(request):
     open_incidents = (
         SosIncident.objects
         .select_related('actor', 'trip', 'booking')
+        .defer(*trip_json_deferred())
         .filter(status='OPEN')
         .order_by('-created_at')[:200]
     )
     resolved_incidents = (
         SosIncident.objects
         .select_related('actor', 'trip', 'booking', 'resolved_by')
+        .defer(*trip_json_deferred())
         .filter(status='RESOLVED')
         .order_by('-resolved_at', '-created_at')[:100]
     )
@@ -936,7 +1059,7 @@ def sos_incident_detail_view(request, incident_id):
         return redirect('administration:login_view')
 
     incident = get_object_or_404(
-        SosIncident.objects.select_related('actor', 'trip', 'booking', 'resolved_by'),
+        SosIncident.objects.select_related('actor', 'trip', 'booking', 'resolved_by').defer(*trip_json_deferred()),
         pk=incident_id,
     )
     return render(
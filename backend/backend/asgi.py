@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up: the WebSocket app uses the ORM.
+from lets_go.ws_live_tracking import LiveTrackingWebSocketApp  # noqa: E402
+
+websocket_application = LiveTrackingWebSocketApp()
+
+
+async def application(scope, receive, send):
+    """HTTP goes to Django; WebSockets (live trip tracking) to the raw ASGI app."""
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
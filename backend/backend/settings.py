@@ -189,3 +189,155 @@ STORAGES = {
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Server-side booking rules (see lets_go/utils/booking_rules.py).
+# Offers at/above Trip.minimum_acceptable_fare are confirmed instantly, offers
+# below floor * BOOKING_AUTO_REJECT_RATIO are declined, everything in between
+# is countered at the floor.
+BOOKING_AUTO_RULES_ENABLED = _env_bool('BOOKING_AUTO_RULES_ENABLED', True)
+BOOKING_AUTO_REJECT_RATIO = float(os.environ.get('BOOKING_AUTO_REJECT_RATIO', '0.5') or 0.5)
+
+# Per-user verification gate decisions (utils/verification_guard.py) are cached
+# for this many seconds and invalidated by model signals. Signals only clear the
+# local process cache unless REDIS_URL configures a shared CACHES backend;
+# 0 disables caching.
+VERIFICATION_GATE_CACHE_SECONDS = int(os.environ.get('VERIFICATION_GATE_CACHE_SECONDS', '60') or 60)
+
+# Lifetime of cached per-user blocked-id sets (utils/blocking.py). Entries are
+# also invalidated by a version bump on every block/unblock.
+BLOCKED_IDS_CACHE_SECONDS = int(os.environ.get('BLOCKED_IDS_CACHE_SECONDS', '300') or 300)
+
+# Caches. REDIS_URL (e.g. redis://host:6379/0) backs both aliases and is
+# required in production: 'live' holds the live-position store (positions,
+# paths, geofence/arrival state and one-shot claims) under its own prefix, so
+# path chunks never evict the short-lived entries kept in 'default'. Instances
+# that do not share it would each see only their own positions. Per-process
+# memory is only used when DEBUG or LIVE_POSITION_ALLOW_LOCAL_CACHE is set
+# (tests, a single local process).
+REDIS_URL = os.environ.get('REDIS_URL', '')
+LIVE_POSITION_ALLOW_LOCAL_CACHE = _env_bool('LIVE_POSITION_ALLOW_LOCAL_CACHE', False)
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'letsgo',
+        },
+        'live': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'letsgo-live',
+        },
+    }
+elif DEBUG or LIVE_POSITION_ALLOW_LOCAL_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'live': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'live-positions',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+    }
+else:
+    raise ValueError('REDIS_URL environment variable is required (or set LIVE_POSITION_ALLOW_LOCAL_CACHE for a single process)')
+
+# Live GPS positions (utils/live_store.py). Pings go to the store; the trip's
+# live_tracking_state JSON is only checkpointed every N seconds.
+LIVE_POSITION_STORE = os.environ.get('LIVE_POSITION_STORE', 'lets_go.utils.live_store.CacheLivePositionStore')
+LIVE_POSITION_CACHE_ALIAS = os.environ.get('LIVE_POSITION_CACHE_ALIAS', 'live')
+LIVE_POSITION_TTL_SECONDS = int(os.environ.get('LIVE_POSITION_TTL_SECONDS', str(6 * 3600)) or 6 * 3600)
+LIVE_TRACKING_CHECKPOINT_SECONDS = int(os.environ.get('LIVE_TRACKING_CHECKPOINT_SECONDS', '30') or 30)
+
+# Write-behind batching of TripLiveLocationUpdate rows (utils/location_buffer.py).
+# Off by default: rows are then written in the request. The buffer flushes from
+# a daemon thread and at exit, so only enable it on long-lived ASGI/gunicorn
+# workers; on serverless (Vercel) instances are frozen or killed with rows
+# still pending.
+LIVE_LOCATION_WRITE_BEHIND = _env_bool('LIVE_LOCATION_WRITE_BEHIND', False)
+LIVE_LOCATION_FLUSH_SIZE = int(os.environ.get('LIVE_LOCATION_FLUSH_SIZE', '200') or 200)
+LIVE_LOCATION_FLUSH_SECONDS = float(os.environ.get('LIVE_LOCATION_FLUSH_SECONDS', '2') or 2)
+LIVE_LOCATION_MAX_PENDING = int(os.environ.get('LIVE_LOCATION_MAX_PENDING', '20000') or 20000)
+
+# Time constant (seconds) of the EWMA that smooths driver speed and heading on
+# each ping (utils/motion.py); larger values give steadier, slower-reacting ETAs.
+LIVE_MOTION_SMOOTHING_SECONDS = float(os.environ.get('LIVE_MOTION_SMOOTHING_SECONDS', '10') or 10)
+
+# Server-Sent Events live tracking (utils/live_stream.py). Each open stream
+# holds a worker thread under WSGI, so streams are closed after
+# LIVE_STREAM_MAX_SECONDS (browsers reconnect) and other processes' updates
+# are noticed within LIVE_STREAM_POLL_SECONDS.
+LIVE_STREAM_MAX_SECONDS = int(os.environ.get('LIVE_STREAM_MAX_SECONDS', '300') or 300)
+LIVE_STREAM_KEEPALIVE_SECONDS = int(os.environ.get('LIVE_STREAM_KEEPALIVE_SECONDS', '15') or 15)
+LIVE_STREAM_POLL_SECONDS = float(os.environ.get('LIVE_STREAM_POLL_SECONDS', '1') or 1)
+
+# WebSocket live tracking (lets_go/ws_live_tracking.py, served by asgi.py).
+# The default broker fans out within one process; use
+# 'lets_go.utils.live_broker.LiveStoreBroker' with a shared live-position cache
+# when running several ASGI nodes.
+LIVE_BROKER = os.environ.get('LIVE_BROKER', 'lets_go.utils.live_broker.InProcessBroker')
+LIVE_WS_REVALIDATE_SECONDS = int(os.environ.get('LIVE_WS_REVALIDATE_SECONDS', '30') or 30)
+
+# Retention of raw TripLiveLocationUpdate rows: `manage.py prune_live_locations`
+# simplifies finished trips older than this into TripTrajectory rows (within
+# TRAJECTORY_TOLERANCE_M meters) and deletes the raw points.
+LIVE_LOCATION_RETENTION_DAYS = int(os.environ.get('LIVE_LOCATION_RETENTION_DAYS', '30') or 30)
+TRAJECTORY_TOLERANCE_M = float(os.environ.get('TRAJECTORY_TOLERANCE_M', '10') or 10)
+
+# Binary trip track archives (`manage.py archive_trip_tracks`). Blobs are kept
+# in the database unless TRACK_ARCHIVE_DIR names a directory, in which case
+# they are written there as files and memory-mapped on replay.
+TRACK_ARCHIVE_DIR = os.environ.get('TRACK_ARCHIVE_DIR', '')
+
+# Pickup/dropoff geofences evaluated on driver location ingest
+# (utils/geofence.py). Fence lists are cached per trip for this long and also
+# dropped whenever one of the trip's bookings is saved.
+GEOFENCE_CACHE_SECONDS = int(os.environ.get('GEOFENCE_CACHE_SECONDS', '60') or 60)
+
+# Adaptive live-location reporting (utils/reporting.py): bounds of the
+# next_interval_s recommended to clients by update_live_location.
+LIVE_REPORT_MIN_INTERVAL_SECONDS = int(os.environ.get('LIVE_REPORT_MIN_INTERVAL_SECONDS', '3') or 3)
+LIVE_REPORT_MAX_INTERVAL_SECONDS = int(os.environ.get('LIVE_REPORT_MAX_INTERVAL_SECONDS', '30') or 30)
+
+# Automatic stop arrival (utils/arrival.py): the driver counts as arrived at a
+# pickup/dropoff stop after staying within ARRIVAL_RADIUS_M of it for
+# ARRIVAL_DWELL_SECONDS, and the stop's bookings are marked as by the
+# driver_mark_reached_* endpoints.
+ARRIVAL_DETECTION_ENABLED = _env_bool('ARRIVAL_DETECTION_ENABLED', True)
+ARRIVAL_RADIUS_M = float(os.environ.get('ARRIVAL_RADIUS_M', '75') or 75)
+ARRIVAL_DWELL_SECONDS = int(os.environ.get('ARRIVAL_DWELL_SECONDS', '30') or 30)
+
+# Public share links (utils/share_cache.py): token checks are cached up to
+# SHARE_TOKEN_CACHE_SECONDS (never past expiry; dropped on revoke; a few seconds
+# only without REDIS_URL, since a local cache cannot see revocations made by
+# other workers) and the live snapshot is rebuilt at most once per
+# SHARE_SNAPSHOT_CACHE_SECONDS per trip.
+SHARE_TOKEN_CACHE_SECONDS = int(os.environ.get('SHARE_TOKEN_CACHE_SECONDS', '3600') or 3600)
+SHARE_SNAPSHOT_CACHE_SECONDS = int(os.environ.get('SHARE_SNAPSHOT_CACHE_SECONDS', '1') or 1)
+
+# Outgoing push notifications (utils/notification_pool.py): a fixed pool of
+# workers drains a bounded queue. When it is full, 'newest' drops the incoming
+# message and 'oldest' evicts the longest-waiting one. At exit the queue is
+# flushed for up to NOTIFICATION_DRAIN_SECONDS.
+NOTIFICATION_POOL_WORKERS = int(os.environ.get('NOTIFICATION_POOL_WORKERS', '4') or 4)
+NOTIFICATION_QUEUE_SIZE = int(os.environ.get('NOTIFICATION_QUEUE_SIZE', '1000') or 1000)
+NOTIFICATION_DROP_POLICY = os.environ.get('NOTIFICATION_DROP_POLICY', 'newest') or 'newest'
+NOTIFICATION_DRAIN_SECONDS = float(os.environ.get('NOTIFICATION_DRAIN_SECONDS', '5') or 5)
+
+# Notification outbox (utils/notification_outbox.py): rows written with the
+# state change are leased for LEASE_SECONDS and handed to the notification pool
+# once the transaction commits. Anything not delivered is retried by
+# `manage.py dispatch_notifications` or the cron endpoint
+# notifications/outbox/dispatch/ (Vercel Cron, authenticated with CRON_SECRET).
+# Failed rows are retried after BACKOFF * 2^(attempts-1) seconds (capped) and
+# dead-lettered after MAX_ATTEMPTS; sent rows are purged after RETENTION_DAYS.
+NOTIFICATION_OUTBOX_BATCH_SIZE = int(os.environ.get('NOTIFICATION_OUTBOX_BATCH_SIZE', '50') or 50)
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_OUTBOX_MAX_ATTEMPTS', '8') or 8)
+NOTIFICATION_OUTBOX_BACKOFF_SECONDS = int(os.environ.get('NOTIFICATION_OUTBOX_BACKOFF_SECONDS', '30') or 30)
+NOTIFICATION_OUTBOX_MAX_BACKOFF_SECONDS = int(os.environ.get('NOTIFICATION_OUTBOX_MAX_BACKOFF_SECONDS', '3600') or 3600)
+NOTIFICATION_OUTBOX_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_OUTBOX_RETENTION_DAYS', '7') or 7)
+NOTIFICATION_OUTBOX_DELIVER_ON_COMMIT = _env_bool('NOTIFICATION_OUTBOX_DELIVER_ON_COMMIT', True)
+NOTIFICATION_OUTBOX_LEASE_SECONDS = int(os.environ.get('NOTIFICATION_OUTBOX_LEASE_SECONDS', '120') or 120)
+NOTIFICATION_OUTBOX_CRON_SECONDS = int(os.environ.get('NOTIFICATION_OUTBOX_CRON_SECONDS', '20') or 20)
+CRON_SECRET = os.environ.get('CRON_SECRET', '')
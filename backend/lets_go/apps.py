@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class LetsGoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'lets_go'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from lets_go.utils.track_archive import archive_completed_trips
+
+
+class Command(BaseCommand):
+    help = (
+        'Archive the driver/passenger tracks of trips completed since the last run '
+        'into compact binary TripTrackArchive blobs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=200,
+                            help='Maximum number of trips to archive in this run.')
+        parser.add_argument('--settle-minutes', type=int, default=10,
+                            help='Skip trips completed more recently than this.')
+
+    def handle(self, *args, **options):
+        archives = archive_completed_trips(limit=options['limit'], settle_minutes=options['settle_minutes'])
+        points = sum(a.point_count for a in archives)
+        size = sum(a.byte_size for a in archives)
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {len(archives)} trips: {points} points in {size} bytes'
+        ))
@@ -0,0 +1,57 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lets_go.utils.notification_outbox import dispatch_pending, purge_sent
+
+
+class Command(BaseCommand):
+    help = (
+        'Deliver pending NotificationOutbox rows in batches, retrying failures with '
+        'exponential backoff and moving rows that exhaust their attempts to DEAD.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows leased per claim (default: NOTIFICATION_OUTBOX_BATCH_SIZE).')
+        parser.add_argument('--max-attempts', type=int, default=None,
+                            help='Attempts before a row is dead-lettered (default: NOTIFICATION_OUTBOX_MAX_ATTEMPTS).')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for due rows instead of exiting once the outbox is drained.')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds to sleep between polls with --loop.')
+        parser.add_argument('--purge-sent-days', type=int, default=None,
+                            help='Delete SENT rows older than this many days before dispatching '
+                                 '(default: NOTIFICATION_OUTBOX_RETENTION_DAYS, 0 disables).')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or int(getattr(settings, 'NOTIFICATION_OUTBOX_BATCH_SIZE', 50))
+        purge_days = options['purge_sent_days']
+        if purge_days is None:
+            purge_days = int(getattr(settings, 'NOTIFICATION_OUTBOX_RETENTION_DAYS', 7))
+        if purge_days > 0:
+            purged = purge_sent(purge_days)
+            if purged:
+                self.stdout.write(f'Purged {purged} sent rows older than {purge_days} days')
+
+        totals = {'claimed': 0, 'sent': 0, 'retried': 0, 'dead': 0}
+        try:
+            while True:
+                counts = dispatch_pending(batch_size=batch_size, max_attempts=options['max_attempts'])
+                for key, value in counts.items():
+                    totals[key] += value
+                if counts['claimed']:
+                    self.stdout.write(
+                        f"sent {counts['sent']}, retrying {counts['retried']}, dead {counts['dead']}"
+                    )
+                if not options['loop']:
+                    break
+                time.sleep(max(options['interval'], 0.1))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Dispatched {totals['claimed']} notifications: {totals['sent']} sent, "
+            f"{totals['retried']} scheduled for retry, {totals['dead']} dead-lettered"
+        ))
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from lets_go.models import Trip, TripLiveLocationUpdate
+from lets_go.utils.trajectory import archive_trip_trajectories, delete_raw_locations
+
+
+class Command(BaseCommand):
+    help = (
+        'Downsample the raw live-location rows of finished trips older than the '
+        'retention window into TripTrajectory rows, then delete the raw rows in batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Retention window in days (default: LIVE_LOCATION_RETENTION_DAYS).')
+        parser.add_argument('--tolerance', type=float, default=None,
+                            help='Simplification tolerance in meters (default: TRAJECTORY_TOLERANCE_M).')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows deleted per DELETE statement.')
+        parser.add_argument('--max-trips', type=int, default=500,
+                            help='Stop after this many trips; run again to continue.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='List the trips that would be processed without changing anything.')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is None:
+            days = int(getattr(settings, 'LIVE_LOCATION_RETENTION_DAYS', 30))
+        cutoff = timezone.now() - timedelta(days=days)
+
+        trips = (
+            Trip.objects
+            .filter(trip_status__in=['COMPLETED', 'CANCELLED'])
+            .filter(Q(completed_at__lt=cutoff) | Q(completed_at__isnull=True, updated_at__lt=cutoff))
+            .filter(Exists(TripLiveLocationUpdate.objects.filter(trip_id=OuterRef('pk'))))
+            .order_by('id')
+            .values_list('id', 'trip_id')[:max(options['max_trips'], 1)]
+        )
+
+        processed = raw_total = kept_total = deleted_total = 0
+        for trip_pk, trip_code in trips:
+            if options['dry_run']:
+                self.stdout.write(f'would prune {trip_code}')
+                processed += 1
+                continue
+            try:
+                raw, kept = archive_trip_trajectories(trip_pk, tolerance_m=options['tolerance'])
+            except Exception as e:
+                # Raw rows are only deleted once their trajectory is saved.
+                self.stderr.write(f'[prune_live_locations] {trip_code}: archive failed: {e!r}')
+                continue
+            deleted = delete_raw_locations(trip_pk, batch_size=max(options['batch_size'], 1))
+            processed += 1
+            raw_total += raw
+            kept_total += kept
+            deleted_total += deleted
+            self.stdout.write(f'{trip_code}: {raw} points -> {kept}, deleted {deleted} rows')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Pruned {processed} trips: {raw_total} points -> {kept_total}, deleted {deleted_total} rows'
+        ))
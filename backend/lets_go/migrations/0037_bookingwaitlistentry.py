@@ -0,0 +1,43 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0036_booking_pre_ride_reminder_sent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingWaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number_of_seats', models.IntegerField(default=1)),
+                ('male_seats', models.IntegerField(default=0)),
+                ('female_seats', models.IntegerField(default=0)),
+                ('original_fare', models.IntegerField(blank=True, null=True)),
+                ('proposed_fare', models.IntegerField(blank=True, null=True)),
+                ('is_negotiated', models.BooleanField(default=False)),
+                ('special_requests', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('WAITING', 'Waiting'), ('PROMOTED', 'Promoted'), ('CANCELLED', 'Cancelled'), ('EXPIRED', 'Expired')], default='WAITING', max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('promoted_at', models.DateTimeField(blank=True, null=True)),
+                ('booking', models.ForeignKey(blank=True, help_text='Booking created when this entry was promoted', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entries', to='lets_go.booking')),
+                ('from_stop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_from', to='lets_go.routestop')),
+                ('passenger', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='lets_go.usersdata')),
+                ('to_stop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_to', to='lets_go.routestop')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='lets_go.trip')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [
+                    models.Index(fields=['trip', 'status', 'created_at'], name='lets_go_boo_trip_id_c5af46_idx'),
+                    models.Index(fields=['passenger', 'status'], name='lets_go_boo_passeng_0d8d29_idx'),
+                ],
+                'constraints': [
+                    models.UniqueConstraint(condition=models.Q(('status', 'WAITING')), fields=('trip', 'passenger'), name='uniq_waitlist_waiting_trip_passenger'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_blocked_pairs(apps, schema_editor):
+    BlockedUser = apps.get_model('lets_go', 'BlockedUser')
+    BlockedPair = apps.get_model('lets_go', 'BlockedPair')
+    pairs = set()
+    for blocker_id, blocked_id in BlockedUser.objects.values_list('blocker_id', 'blocked_user_id').iterator():
+        if blocker_id == blocked_id:
+            continue
+        pairs.add((min(blocker_id, blocked_id), max(blocker_id, blocked_id)))
+    BlockedPair.objects.bulk_create(
+        [BlockedPair(user_low_id=low, user_high_id=high) for low, high in pairs],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0037_bookingwaitlistentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockedPair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user_high', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='block_pairs_high', to='lets_go.usersdata')),
+                ('user_low', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='block_pairs_low', to='lets_go.usersdata')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_high'], name='lets_go_blo_user_hi_2f5f19_idx')],
+                'unique_together': {('user_low', 'user_high')},
+            },
+        ),
+        migrations.RunPython(backfill_blocked_pairs, migrations.RunPython.noop),
+    ]
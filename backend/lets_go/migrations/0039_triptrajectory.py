@@ -0,0 +1,32 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0038_blockedpair'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripTrajectory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(max_length=16)),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('points', models.JSONField(blank=True, default=list)),
+                ('raw_point_count', models.IntegerField(default=0)),
+                ('tolerance_m', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trajectories', to='lets_go.booking')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trajectories', to='lets_go.trip')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trip_trajectories', to='lets_go.usersdata')),
+            ],
+            options={
+                'ordering': ['trip', 'role', 'started_at'],
+                'indexes': [models.Index(fields=['trip', 'role'], name='lets_go_tri_trip_id_d819a8_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lets_go', '0039_triptrajectory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripTrackArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField(blank=True, null=True)),
+                ('file_name', models.CharField(blank=True, default='', max_length=255)),
+                ('byte_size', models.IntegerField(default=0)),
+                ('track_count', models.IntegerField(default=0)),
+                ('point_count', models.IntegerField(default=0)),
+                ('trip_completed_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='track_archive', to='lets_go.trip')),
+            ],
+        ),
+    ]
@@ -3,10 +3,12 @@ from .models_emergency import EmergencyContact
 from .models_vehicle import Vehicle
 from .models_change_request import ChangeRequest
 from .models_route import Route, RouteStop
-from .models_trip import Trip, TripVehicleHistory, TripStopBreakdown, TripLiveLocationUpdate, RideAuditEvent
+from .models_trip import Trip, TripVehicleHistory, TripStopBreakdown, TripLiveLocationUpdate, TripTrajectory, TripTrackArchive, RideAuditEvent, trip_json_deferred
 from .models_booking import Booking
-from .models_blocking import BlockedUser
+from .models_blocking import BlockedUser, BlockedPair
+from .models_waitlist import BookingWaitlistEntry
 from .models_chat import TripChatGroup, ChatGroupMember, ChatMessage, MessageReadStatus
 from .models_support_chat import GuestUser, SupportThread, SupportMessage
 from .models_payment import TripPayment
-from .models_incident import SosIncident, SosShareToken, TripShareToken
\ No newline at end of file
+from .models_incident import SosIncident, SosShareToken, TripShareToken
+from .models_notification import NotificationOutbox
\ No newline at end of file
@@ -16,3 +16,24 @@ class BlockedUser(models.Model):
 
     def __str__(self):
         return f"{self.blocker_id} blocked {self.blocked_user_id}"
+
+
+class BlockedPair(models.Model):
+    """Symmetric mirror of BlockedUser: one row per unordered pair of users with a
+    block in either direction, stored as (user_low, user_high) with low < high.
+
+    Lets "are these two blocked?" be a single unique-index lookup. Kept in sync
+    from BlockedUser signals (see lets_go/utils/blocking.py); never write directly.
+    """
+    user_low = models.ForeignKey('UsersData', on_delete=models.CASCADE, related_name='block_pairs_low')
+    user_high = models.ForeignKey('UsersData', on_delete=models.CASCADE, related_name='block_pairs_high')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user_low', 'user_high')
+        indexes = [
+            models.Index(fields=['user_high']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_low_id} <-> {self.user_high_id}"
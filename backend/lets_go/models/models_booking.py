@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
@@ -308,19 +308,20 @@ class Booking(models.Model):
         if not self.can_cancel:
             raise ValidationError('This booking cannot be cancelled.')
 
+        from ..utils.waitlist import release_seats_and_promote
+
         was_confirmed = self.booking_status == 'CONFIRMED'
-        self.booking_status = 'CANCELLED'
-        self.cancelled_at = timezone.now()
-        self.save(update_fields=['booking_status', 'cancelled_at', 'updated_at'])
+        with transaction.atomic():
+            self.booking_status = 'CANCELLED'
+            self.cancelled_at = timezone.now()
+            self.save(update_fields=['booking_status', 'cancelled_at', 'updated_at'])
 
-        if self.seats_locked:
-            self.trip.available_seats += self.number_of_seats
-            self.trip.save(update_fields=['available_seats'])
-            self.seats_locked = False
-            self.save(update_fields=['seats_locked', 'updated_at'])
-        elif was_confirmed:
-            self.trip.available_seats += self.number_of_seats
-            self.trip.save(update_fields=['available_seats'])
+            if self.seats_locked or was_confirmed:
+                # Freed seats go to the trip's waitlist in the same transaction.
+                self.seats_locked = False
+                self.save(update_fields=['seats_locked', 'updated_at'])
+                release_seats_and_promote(self.trip_id, self.number_of_seats)
+                self.trip.refresh_from_db(fields=['available_seats'])
 
         if was_confirmed:
             try:
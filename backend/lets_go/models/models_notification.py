@@ -0,0 +1,42 @@
+from django.db import models
+from django.utils import timezone
+
+
+class NotificationOutbox(models.Model):
+    """A push notification written in the same transaction as the state change
+    that triggers it. Handed to the notification pool once that transaction
+    commits; the outbox dispatcher (cron endpoint or
+    `manage.py dispatch_notifications`) retries what was not delivered."""
+    KIND_RIDE = 'RIDE'
+
+    KIND_CHOICES = [
+        (KIND_RIDE, 'Ride notification'),
+    ]
+
+    STATUS_PENDING = 'PENDING'
+    STATUS_SENT = 'SENT'
+    STATUS_DEAD = 'DEAD'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_DEAD, 'Dead letter'),
+    ]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES, default=KIND_RIDE)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"Outbox {self.id} {self.kind} ({self.status}, attempts={self.attempts})"
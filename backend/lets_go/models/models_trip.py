@@ -4,6 +4,41 @@ from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import timedelta
 
+
+# Large JSON columns that most Trip reads never look at: the live-tracking
+# document carries up to a 2000-point driver path.
+TRIP_HEAVY_JSON_FIELDS = ('live_tracking_state', 'fare_calculation', 'bargaining_history')
+
+
+class TripQuerySet(models.QuerySet):
+    def with_json(self, *fields):
+        """Opt back in to loading heavy JSON columns (all of them when no
+        names are given)."""
+        fields = fields or TRIP_HEAVY_JSON_FIELDS
+        deferred = [f for f in TRIP_HEAVY_JSON_FIELDS if f not in fields]
+        qs = self.defer(None)
+        return qs.defer(*deferred) if deferred else qs
+
+    def only(self, *fields):
+        # only() after the manager's defer() would drop any heavy field it
+        # names, so start from a clean slate.
+        return super(TripQuerySet, self.defer(None)).only(*fields)
+
+
+class TripManager(models.Manager.from_queryset(TripQuerySet)):
+    """Default manager: heavy JSON columns are deferred. Use
+    Trip.objects.with_json(...) or only(...) to load them with the row."""
+
+    def get_queryset(self):
+        return super().get_queryset().defer(*TRIP_HEAVY_JSON_FIELDS)
+
+
+def trip_json_deferred(prefix='trip__'):
+    """Heavy Trip JSON fields as defer() names across a relation, for
+    select_related('trip') queries on other models."""
+    return [prefix + f for f in TRIP_HEAVY_JSON_FIELDS]
+
+
 class Trip(models.Model):
     """Model for individual bus/shuttle trips"""
     TRIP_STATUS_CHOICES = [
@@ -122,6 +157,8 @@ class Trip(models.Model):
         help_text="Has the T-10 pre-ride reminder been sent for this trip?",
     )
 
+    objects = TripManager()
+
     class Meta:
         indexes = [
             models.Index(fields=['trip_date']),
@@ -433,6 +470,54 @@ class TripLiveLocationUpdate(models.Model):
         ordering = ['-recorded_at']
 
 
+class TripTrajectory(models.Model):
+    """Downsampled track of one participant of a finished trip.
+
+    Written by the prune_live_locations command before the raw
+    TripLiveLocationUpdate rows are deleted. points is a list of
+    [lat, lng, seconds_since_started_at].
+    """
+    trip = models.ForeignKey('Trip', on_delete=models.CASCADE, related_name='trajectories')
+    user = models.ForeignKey('UsersData', on_delete=models.SET_NULL, null=True, blank=True, related_name='trip_trajectories')
+    booking = models.ForeignKey('Booking', on_delete=models.SET_NULL, null=True, blank=True, related_name='trajectories')
+    role = models.CharField(max_length=16)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    points = models.JSONField(default=list, blank=True)
+    raw_point_count = models.IntegerField(default=0)
+    tolerance_m = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['trip', 'role']),
+        ]
+        ordering = ['trip', 'role', 'started_at']
+
+    def __str__(self):
+        return f"Trajectory {self.trip_id} {self.role} ({len(self.points or [])}/{self.raw_point_count} points)"
+
+
+class TripTrackArchive(models.Model):
+    """Binary archive of all tracks of a completed trip (utils/track_archive.py).
+
+    The blob is kept in data, or as a file under settings.TRACK_ARCHIVE_DIR
+    (file_name relative to it) when that is configured.
+    """
+    trip = models.OneToOneField('Trip', on_delete=models.CASCADE, related_name='track_archive')
+    data = models.BinaryField(null=True, blank=True)
+    file_name = models.CharField(max_length=255, blank=True, default='')
+    byte_size = models.IntegerField(default=0)
+    track_count = models.IntegerField(default=0)
+    point_count = models.IntegerField(default=0)
+    trip_completed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Track archive {self.trip_id} ({self.point_count} points, {self.byte_size} bytes)"
+
+
 class RideAuditEvent(models.Model):
     trip = models.ForeignKey('Trip', on_delete=models.CASCADE, related_name='audit_events')
     booking = models.ForeignKey('Booking', on_delete=models.SET_NULL, null=True, blank=True, related_name='audit_events')
@@ -0,0 +1,60 @@
+from django.db import models
+from django.db.models import Q
+
+
+class BookingWaitlistEntry(models.Model):
+    """A passenger queued on a full trip, promoted FIFO when seats are released."""
+    STATUS_WAITING = 'WAITING'
+    STATUS_PROMOTED = 'PROMOTED'
+    STATUS_CANCELLED = 'CANCELLED'
+    STATUS_EXPIRED = 'EXPIRED'
+
+    STATUS_CHOICES = [
+        (STATUS_WAITING, 'Waiting'),
+        (STATUS_PROMOTED, 'Promoted'),
+        (STATUS_CANCELLED, 'Cancelled'),
+        (STATUS_EXPIRED, 'Expired'),
+    ]
+
+    trip = models.ForeignKey('Trip', on_delete=models.CASCADE, related_name='waitlist_entries')
+    passenger = models.ForeignKey('UsersData', on_delete=models.CASCADE, related_name='waitlist_entries')
+    from_stop = models.ForeignKey('RouteStop', on_delete=models.CASCADE, related_name='waitlist_from')
+    to_stop = models.ForeignKey('RouteStop', on_delete=models.CASCADE, related_name='waitlist_to')
+
+    # Original request, replayed as a booking request on promotion
+    number_of_seats = models.IntegerField(default=1)
+    male_seats = models.IntegerField(default=0)
+    female_seats = models.IntegerField(default=0)
+    original_fare = models.IntegerField(null=True, blank=True)
+    proposed_fare = models.IntegerField(null=True, blank=True)
+    is_negotiated = models.BooleanField(default=False)
+    special_requests = models.TextField(null=True, blank=True)
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_WAITING)
+    booking = models.ForeignKey(
+        'Booking',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='waitlist_entries',
+        help_text='Booking created when this entry was promoted',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    promoted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['trip', 'status', 'created_at']),
+            models.Index(fields=['passenger', 'status']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['trip', 'passenger'],
+                condition=Q(status='WAITING'),
+                name='uniq_waitlist_waiting_trip_passenger',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Waitlist {self.trip_id} passenger={self.passenger_id} ({self.status})"
@@ -0,0 +1,54 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import BlockedUser, Booking, ChangeRequest, Route, RouteStop, SosShareToken, TripShareToken, UsersData, Vehicle
+from .utils.blocking import sync_block_pair
+from .utils.geofence import invalidate_trip_geofences
+from .utils.route_index import invalidate_route_index
+from .utils.share_cache import invalidate_share_access
+from .utils.verification_guard import invalidate_verification_gate
+
+
+@receiver([post_save, post_delete], sender=UsersData)
+def _users_data_changed(sender, instance, **kwargs):
+    invalidate_verification_gate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=ChangeRequest)
+def _change_request_changed(sender, instance, **kwargs):
+    invalidate_verification_gate(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Vehicle)
+def _vehicle_changed(sender, instance, **kwargs):
+    invalidate_verification_gate(getattr(instance, 'owner_id', None))
+
+
+@receiver([post_save, post_delete], sender=BlockedUser)
+def _blocked_user_changed(sender, instance, **kwargs):
+    sync_block_pair(instance.blocker_id, instance.blocked_user_id)
+
+
+@receiver([post_save, post_delete], sender=Route)
+def _route_changed(sender, instance, **kwargs):
+    invalidate_route_index(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=RouteStop)
+def _route_stop_changed(sender, instance, **kwargs):
+    invalidate_route_index(instance.route_id)
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def _booking_changed(sender, instance, **kwargs):
+    invalidate_trip_geofences(instance.trip_id)
+
+
+@receiver([post_save, post_delete], sender=TripShareToken)
+def _trip_share_token_changed(sender, instance, **kwargs):
+    invalidate_share_access('trip', instance.token)
+
+
+@receiver([post_save, post_delete], sender=SosShareToken)
+def _sos_share_token_changed(sender, instance, **kwargs):
+    invalidate_share_access('sos', instance.token)
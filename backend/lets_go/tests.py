@@ -1,3 +1,311 @@
-from django.test import TestCase
+import json
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .models import (
+    Booking, NotificationOutbox, Route, RouteStop, Trip, TripLiveLocationUpdate, TripTrajectory, UsersData,
+    trip_json_deferred,
+)
+from .utils.booking_rules import AUTO_ACCEPT, AUTO_COUNTER, AUTO_REJECT, evaluate_booking_offer
+from .utils.notification_outbox import backoff_seconds, record_result
+from .utils.track_archive import MAGIC, encode_tracks, iter_tracks
+from .utils.trajectory import archive_trip_trajectories, simplify_indices
+
+
+def _make_user(n, gender='male'):
+    return UsersData.objects.create(
+        name=f'User {n}',
+        username=f'user{n}',
+        email=f'user{n}@example.com',
+        password='x',
+        address='Test address',
+        phone_no=f'+92300{n:07d}',
+        cnic_no=f'35202-{n:07d}-1',
+        gender=gender,
+    )
+
+
+def _make_trip(driver, total_seats=2, available_seats=2, **extra):
+    route = Route.objects.create(route_id=f'R-{driver.id}', route_name='Test route')
+    stops = [
+        RouteStop.objects.create(route=route, stop_name=f'Stop {i}', stop_order=i)
+        for i in (1, 2)
+    ]
+    trip = Trip.objects.create(
+        trip_id=f'T-{driver.id}',
+        route=route,
+        driver=driver,
+        trip_date=date(2030, 1, 1),
+        departure_time=time(8, 0),
+        estimated_arrival_time=time(9, 0),
+        total_seats=total_seats,
+        available_seats=available_seats,
+        base_fare=500,
+        **extra,
+    )
+    return trip, stops
+
+
+def _make_booking(trip, passenger, stops, **extra):
+    fields = {
+        'booking_id': f'B-{trip.id}-{passenger.id}',
+        'trip': trip,
+        'passenger': passenger,
+        'from_stop': stops[0],
+        'to_stop': stops[1],
+        'number_of_seats': 1,
+        'total_fare': 500,
+        'original_fare': 500,
+        'booking_status': 'PENDING',
+    }
+    fields.update(extra)
+    return Booking.objects.create(**fields)
+
+
+@mock.patch('lets_go.views_negotiation.verification_block_response', return_value=None)
+class BatchRespondTests(TestCase):
+    def setUp(self):
+        self.driver = _make_user(1)
+        # Full trip: the only seat-holding request is booking A.
+        self.trip, stops = _make_trip(self.driver, total_seats=2, available_seats=0)
+        self.held = _make_booking(self.trip, _make_user(2), stops, seats_locked=True)
+        self.waiting = _make_booking(self.trip, _make_user(3), stops, seats_locked=False)
+
+    def _respond(self, decisions):
+        return self.client.post(
+            f'/lets_go/ride-booking/{self.trip.trip_id}/requests/batch-respond/',
+            data=json.dumps({'driver_id': self.driver.id, 'decisions': decisions}),
+            content_type='application/json',
+        )
+
+    def test_rejection_frees_seat_for_accept_in_same_batch(self, _guard):
+        res = self._respond([
+            {'booking_id': self.held.id, 'action': 'reject'},
+            {'booking_id': self.waiting.id, 'action': 'accept'},
+        ])
+        self.assertEqual(res.status_code, 200, res.content)
+        self.assertEqual(res.json()['processed'], 2)
+        self.held.refresh_from_db()
+        self.waiting.refresh_from_db()
+        self.trip.refresh_from_db()
+        self.assertEqual(self.held.booking_status, 'CANCELLED')
+        self.assertEqual(self.waiting.booking_status, 'CONFIRMED')
+        self.assertTrue(self.waiting.seats_locked)
+        self.assertEqual(self.trip.available_seats, 0)
+
+    def test_accept_without_free_seat_is_refused(self, _guard):
+        res = self._respond([{'booking_id': self.waiting.id, 'action': 'accept'}])
+        self.assertEqual(res.status_code, 200, res.content)
+        self.assertFalse(res.json()['results'][0]['success'])
+        self.waiting.refresh_from_db()
+        self.assertEqual(self.waiting.booking_status, 'PENDING')
+
+
+@override_settings(BOOKING_AUTO_RULES_ENABLED=True, BOOKING_AUTO_REJECT_RATIO=0.5)
+class EvaluateBookingOfferTests(SimpleTestCase):
+    def _trip(self, floor=1000, negotiable=True):
+        return SimpleNamespace(is_negotiable=negotiable, minimum_acceptable_fare=floor)
+
+    def test_offer_at_or_above_floor_is_accepted_at_offer(self):
+        self.assertEqual(evaluate_booking_offer(self._trip(), 1000), (AUTO_ACCEPT, 1000))
+        self.assertEqual(evaluate_booking_offer(self._trip(), 1200), (AUTO_ACCEPT, 1200))
+
+    def test_offer_between_ratio_and_floor_is_countered_at_floor(self):
+        self.assertEqual(evaluate_booking_offer(self._trip(), 500), (AUTO_COUNTER, 1000))
+        self.assertEqual(evaluate_booking_offer(self._trip(), 999), (AUTO_COUNTER, 1000))
+
+    def test_offer_below_ratio_is_rejected(self):
+        self.assertEqual(evaluate_booking_offer(self._trip(), 499), (AUTO_REJECT, None))
+
+    def test_no_rules_without_floor_or_negotiation(self):
+        self.assertEqual(evaluate_booking_offer(self._trip(floor=None), 100), (None, None))
+        self.assertEqual(evaluate_booking_offer(self._trip(floor=0), 100), (None, None))
+        self.assertEqual(evaluate_booking_offer(self._trip(negotiable=False), 100), (None, None))
+        self.assertEqual(evaluate_booking_offer(self._trip(), None), (None, None))
+
+    @override_settings(BOOKING_AUTO_RULES_ENABLED=False)
+    def test_rules_can_be_disabled(self):
+        self.assertEqual(evaluate_booking_offer(self._trip(), 1200), (None, None))
+
+
+class SimplifyIndicesTests(SimpleTestCase):
+    def test_short_tracks_are_kept(self):
+        self.assertEqual(simplify_indices([], 10), [])
+        self.assertEqual(simplify_indices([(31.5, 74.3, 0)], 10), [0])
+
+    def test_uniform_straight_track_keeps_endpoints(self):
+        points = [(31.5 + i * 0.0001, 74.3, i) for i in range(20)]
+        self.assertEqual(simplify_indices(points, 5), [0, 19])
+
+    def test_stop_on_straight_track_is_kept(self):
+        # Same straight line, but the driver waits at the midpoint for 60s;
+        # a time-aware distance keeps the stop so replay timing survives.
+        points = [(31.5 + i * 0.0001, 74.3, i) for i in range(10)]
+        points += [(31.5 + (10 + i) * 0.0001, 74.3, 70 + i) for i in range(10)]
+        kept = simplify_indices(points, 5)
+        self.assertIn(9, kept)
+        self.assertIn(10, kept)
+
+    def test_corner_is_kept(self):
+        points = [(31.5 + i * 0.0001, 74.3, i) for i in range(10)]
+        points += [(31.5009, 74.3 + i * 0.0001, 9 + i) for i in range(1, 10)]
+        self.assertIn(9, simplify_indices(points, 5))
+
+
+class ArchiveTripTrajectoriesTests(TestCase):
+    def setUp(self):
+        self.driver = _make_user(1)
+        self.trip, _ = _make_trip(self.driver)
+        self.t0 = datetime(2026, 1, 1, 8, 0, tzinfo=dt_timezone.utc)
+
+    def _raw(self, points):
+        TripLiveLocationUpdate.objects.bulk_create([
+            TripLiveLocationUpdate(
+                trip=self.trip, user=self.driver, role='DRIVER',
+                latitude=lat, longitude=lng, recorded_at=self.t0 + timedelta(seconds=t),
+            )
+            for lat, lng, t in points
+        ])
+
+    def test_late_rows_are_merged_into_existing_trajectory(self):
+        self._raw([(31.5 + i * 0.0001, 74.3, i) for i in range(10)])
+        archive_trip_trajectories(self.trip.pk, tolerance_m=5)
+        TripLiveLocationUpdate.objects.filter(trip=self.trip).delete()
+
+        self._raw([(31.5009, 74.3 + i * 0.0001, 9 + i) for i in range(1, 10)])
+        archive_trip_trajectories(self.trip.pk, tolerance_m=5)
+
+        track = TripTrajectory.objects.get(trip=self.trip)
+        self.assertEqual(track.raw_point_count, 19)
+        self.assertEqual(track.started_at, self.t0)
+        self.assertEqual(track.ended_at, self.t0 + timedelta(seconds=18))
+        self.assertEqual([p[2] for p in track.points], [0.0, 9.0, 18.0])
+
+
+class TrackArchiveCodecTests(SimpleTestCase):
+    def test_round_trip(self):
+        t0 = datetime(2026, 1, 1, 8, 0, tzinfo=dt_timezone.utc)
+        tracks = [
+            {'role': 'DRIVER', 'user_id': 7, 'booking_id': None, 'points': [
+                (31.5204123, 74.3587456, t0),
+                (31.5201, 74.3590001, t0 + timedelta(seconds=4.3)),
+                (-33.8688, 151.2093, t0 + timedelta(seconds=9)),
+            ]},
+            {'role': 'PASSENGER', 'user_id': 0, 'booking_id': 12, 'points': [
+                (31.52, 74.35, t0.timestamp() + 1.5),
+            ]},
+            {'role': 'PASSENGER', 'user_id': 9, 'booking_id': 13, 'points': []},
+        ]
+        blob = encode_tracks(tracks)
+        self.assertTrue(blob.startswith(MAGIC))
+
+        decoded = list(iter_tracks(memoryview(blob)))
+        self.assertEqual(len(decoded), 2)
+        driver, passenger = decoded
+        self.assertEqual((driver['role'], driver['user_id'], driver['booking_id']), ('DRIVER', 7, None))
+        self.assertEqual((passenger['role'], passenger['user_id'], passenger['booking_id']), ('PASSENGER', 0, 12))
+        for (lat, lng, ts), (dlat, dlng, depoch) in zip(tracks[0]['points'], driver['points']):
+            self.assertAlmostEqual(dlat, lat, places=6)
+            self.assertAlmostEqual(dlng, lng, places=6)
+            self.assertAlmostEqual(depoch, ts.timestamp(), places=1)
+        self.assertAlmostEqual(passenger['points'][0][2], t0.timestamp() + 1.5, places=1)
+
+    def test_rejects_foreign_data(self):
+        with self.assertRaises(ValueError):
+            list(iter_tracks(b'nope'))
+
+
+class TripJsonDeferralTests(TestCase):
+    def setUp(self):
+        driver = _make_user(1)
+        self.trip, stops = _make_trip(
+            driver,
+            fare_calculation={'total': 500},
+            live_tracking_state={'ended_at': None},
+        )
+        self.booking = _make_booking(self.trip, _make_user(2), stops)
+
+    def test_heavy_json_is_deferred_by_default(self):
+        trip = Trip.objects.get(pk=self.trip.pk)
+        self.assertTrue({'live_tracking_state', 'fare_calculation', 'bargaining_history'} <= trip.get_deferred_fields())
+        with self.assertNumQueries(1):
+            self.assertEqual(trip.fare_calculation, {'total': 500})
+
+    def test_only_can_name_a_heavy_field(self):
+        with self.assertNumQueries(1):
+            trip = Trip.objects.only('id', 'trip_id', 'fare_calculation').get(pk=self.trip.pk)
+            self.assertEqual(trip.fare_calculation, {'total': 500})
+            self.assertEqual(trip.trip_id, self.trip.trip_id)
+
+    def test_with_json_loads_all_heavy_fields(self):
+        with self.assertNumQueries(1):
+            trip = Trip.objects.with_json().get(pk=self.trip.pk)
+            self.assertEqual(trip.fare_calculation, {'total': 500})
+            self.assertEqual(trip.live_tracking_state, {'ended_at': None})
+        self.assertFalse(trip.get_deferred_fields())
+
+    def test_with_json_named_field_keeps_the_rest_deferred(self):
+        with self.assertNumQueries(1):
+            trip = Trip.objects.with_json('fare_calculation').get(pk=self.trip.pk)
+            self.assertEqual(trip.fare_calculation, {'total': 500})
+        self.assertIn('live_tracking_state', trip.get_deferred_fields())
+
+    def test_select_related_trip_defers_joined_json(self):
+        with self.assertNumQueries(1):
+            booking = (
+                Booking.objects
+                .select_related('trip')
+                .defer(*trip_json_deferred())
+                .get(pk=self.booking.pk)
+            )
+            self.assertEqual(booking.trip.trip_id, self.trip.trip_id)
+        self.assertIn('fare_calculation', booking.trip.get_deferred_fields())
+
+
+@override_settings(NOTIFICATION_OUTBOX_BACKOFF_SECONDS=30, NOTIFICATION_OUTBOX_MAX_BACKOFF_SECONDS=3600)
+class OutboxBackoffTests(SimpleTestCase):
+    def test_backoff_doubles_per_attempt(self):
+        self.assertEqual(backoff_seconds(1), 30)
+        self.assertEqual(backoff_seconds(2), 60)
+        self.assertEqual(backoff_seconds(4), 240)
+
+    def test_backoff_is_capped(self):
+        self.assertEqual(backoff_seconds(8), 3600)
+        self.assertEqual(backoff_seconds(50), 3600)
+
+    def test_first_attempt_never_shrinks_base(self):
+        self.assertEqual(backoff_seconds(0), 30)
+
+
+class OutboxRecordResultTests(TestCase):
+    def setUp(self):
+        self.row = NotificationOutbox.objects.create(payload={'user_id': '1'}, attempts=1)
+
+    def test_sent(self):
+        self.assertEqual(record_result(self.row), 'sent')
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.status, NotificationOutbox.STATUS_SENT)
+        self.assertIsNotNone(self.row.sent_at)
+
+    def test_failure_is_retried_then_dead(self):
+        self.assertEqual(record_result(self.row, 'timeout', max_attempts=2), 'retried')
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.status, NotificationOutbox.STATUS_PENDING)
+        self.assertEqual(self.row.last_error, 'timeout')
+
+        NotificationOutbox.objects.filter(pk=self.row.pk).update(attempts=2)
+        self.row.attempts = 2
+        self.assertEqual(record_result(self.row, 'timeout', max_attempts=2), 'dead')
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.status, NotificationOutbox.STATUS_DEAD)
+
+    def test_stale_lease_does_not_overwrite(self):
+        # Another dispatcher re-claimed the row after this lease ran out.
+        NotificationOutbox.objects.filter(pk=self.row.pk).update(attempts=2)
+        self.assertIsNone(record_result(self.row))
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.status, NotificationOutbox.STATUS_PENDING)
+        self.assertIsNone(self.row.sent_at)
@@ -66,6 +66,7 @@ urlpatterns = [
     path('ride-booking/<str:trip_id>/requests/', views_negotiation.list_pending_requests, name='list_pending_requests'),
     path('ride-booking/<str:trip_id>/requests/<int:booking_id>/', views_negotiation.booking_request_details, name='booking_request_details'),
     path('ride-booking/<str:trip_id>/requests/<int:booking_id>/respond/', views_negotiation.respond_booking_request, name='respond_booking_request'),
+    path('ride-booking/<str:trip_id>/requests/batch-respond/', views_negotiation.respond_booking_requests_batch, name='respond_booking_requests_batch'),
     # Passenger decision endpoint (negotiation)
     path('ride-booking/<str:trip_id>/requests/<int:booking_id>/passenger-respond/', views_negotiation.passenger_respond_booking, name='passenger_respond_booking'),
     # Negotiation history endpoint
@@ -75,6 +76,7 @@ urlpatterns = [
     path('users/<int:user_id>/blocked/', views_blocking.list_blocked_users, name='list_blocked_users'),
     path('users/<int:user_id>/blocked/<int:blocked_user_id>/unblock/', views_blocking.unblock_user, name='unblock_user'),
     path('ride-booking/<str:trip_id>/blocked/<int:passenger_id>/unblock/', views_negotiation.unblock_passenger_for_trip, name='unblock_passenger_for_trip'),
+    path('ride-booking/<str:trip_id>/waitlist/leave/', views_negotiation.leave_trip_waitlist, name='leave_trip_waitlist'),
     
     # Additional endpoints that might be needed
     path('routes/<int:route_id>/', views_rideposting.get_route_details, name='get_route_details'),
@@ -94,7 +96,9 @@ urlpatterns = [
     path('bookings/<int:booking_id>/driver-reached-pickup/', views_post_booking.driver_mark_reached_pickup, name='driver_mark_reached_pickup'),
     path('bookings/<int:booking_id>/driver-reached-dropoff/', views_post_booking.driver_mark_reached_dropoff, name='driver_mark_reached_dropoff'),
     path('trips/<str:trip_id>/location/update/', views_post_booking.update_live_location, name='update_live_location'),
+    path('trips/<str:trip_id>/location/batch/', views_post_booking.update_live_location_batch, name='update_live_location_batch'),
     path('trips/<str:trip_id>/location/', views_post_booking.get_live_location, name='get_live_location'),
+    path('trips/<str:trip_id>/location/stream/', views_post_booking.stream_live_location, name='stream_live_location'),
     path('trips/<str:trip_id>/bookings/<int:booking_id>/pickup-code/', views_post_booking.generate_pickup_code, name='generate_pickup_code'),
     path('pickup-code/verify/', views_post_booking.verify_pickup_code, name='verify_pickup_code'),
     path('bookings/<int:booking_id>/payment/', views_post_booking.get_booking_payment_details, name='get_booking_payment_details'),
@@ -109,13 +113,16 @@ urlpatterns = [
     path('chat/messages/<int:message_id>/read/', views_chat.mark_message_read, name='mark_message_read'),
     # Notification endpoints
     path('update_fcm_token/', views_notifications.update_fcm_token, name='update_fcm_token'),
+    path('notifications/outbox/dispatch/', views_notifications.dispatch_notification_outbox, name='dispatch_notification_outbox'),
     # Public share links (non-SOS)
     path('trips/<str:trip_id>/share/', views_incidents.trip_share_token, name='trip_share_token'),
     path('trips/share/<str:token>/', views_incidents.trip_share_view, name='trip_share'),
     path('trips/share/<str:token>/live/', views_incidents.trip_share_live, name='trip_share_live'),
+    path('trips/share/<str:token>/stream/', views_incidents.trip_share_stream, name='trip_share_stream'),
     path('incidents/sos/', views_incidents.sos_incident, name='sos_incident'),
     path('incidents/sos/share/<str:token>/', views_incidents.sos_share_view, name='sos_share'),
     path('incidents/sos/share/<str:token>/send', views_incidents.sos_share_send, name='sos_share_send'),
     path('incidents/sos/share/<str:token>/live/', views_incidents.sos_share_live, name='sos_share_live'),
+    path('incidents/sos/share/<str:token>/stream/', views_incidents.sos_share_stream, name='sos_share_stream'),
     path('logout/', views_authentication.logout_view, name='logout'),
 ]
\ No newline at end of file
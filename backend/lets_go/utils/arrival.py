@@ -0,0 +1,196 @@
+from django.conf import settings
+from django.db import transaction
+
+from .geo import haversine_meters
+from .geofence import fence_armed, get_trip_geofences, invalidate_trip_geofences
+from .json_update import merge_json
+from .live_store import get_live_store
+
+
+def _arrival_settings():
+    try:
+        radius = float(getattr(settings, 'ARRIVAL_RADIUS_M', 75))
+        dwell = float(getattr(settings, 'ARRIVAL_DWELL_SECONDS', 30))
+    except (TypeError, ValueError):
+        radius, dwell = 75.0, 30.0
+    return radius, dwell
+
+
+def _stop_groups(fences):
+    """Armed fences grouped by stop: {'pickup:3': [fence, ...], ...}."""
+    groups = {}
+    for fence in fences:
+        if fence_armed(fence):
+            groups.setdefault(f"{fence['kind']}:{fence['stop_order']}", []).append(fence)
+    return groups
+
+
+def detect_arrivals(trip, point, now):
+    """Dwell-based arrival at pickup and dropoff stops on driver ingest.
+
+    The driver has arrived at a stop once consecutive fixes keep it within
+    ARRIVAL_RADIUS_M of the stop for ARRIVAL_DWELL_SECONDS. Every booking at
+    that stop is then marked the way driver_mark_reached_pickup/_dropoff do
+    by hand, in bulk, and the same notifications are queued. Entry times are
+    kept in the live store. Returns the booking ids marked.
+    """
+    if not getattr(settings, 'ARRIVAL_DETECTION_ENABLED', True):
+        return []
+    lat, lng = point.get('lat'), point.get('lng')
+    if lat is None or lng is None:
+        return []
+    radius_m, dwell_s = _arrival_settings()
+    groups = _stop_groups(get_trip_geofences(trip.id))
+    store = get_live_store()
+    dwell = store.get_dwell_state(trip.id)
+    if not groups and not dwell:
+        return []
+
+    now_s = now.timestamp()
+    entered = {}
+    arrived = []
+    for key, fences in groups.items():
+        d = haversine_meters(lat, lng, fences[0]['lat'], fences[0]['lng'])
+        if d is None or d > radius_m:
+            continue
+        entered[key] = dwell.get(key, now_s)
+        if now_s - entered[key] >= dwell_s:
+            arrived.append(fences)
+    if entered != dwell:
+        store.set_dwell_state(trip.id, entered)
+
+    marked = []
+    for fences in arrived:
+        fences = [f for f in fences if store.claim_once(trip.id, f"arrived:{f['id']}")]
+        if not fences:
+            continue
+        try:
+            if fences[0]['kind'] == 'pickup':
+                marked += _mark_reached_pickup(trip, fences, now)
+            else:
+                marked += _mark_reached_dropoff(trip, fences, now)
+        except Exception as e:
+            # Marking skips bookings already flagged/dropped off, so the next
+            # fix inside the radius can safely retry.
+            print('[detect_arrivals][ERROR]:', repr(e))
+            for f in fences:
+                store.release_claim(trip.id, f"arrived:{f['id']}")
+    return marked
+
+
+def _already_flagged(trip_pk, flag):
+    from ..models import Trip
+
+    flags = Trip.objects.filter(pk=trip_pk).values_list('live_tracking_state__booking_flags', flat=True).first()
+    if not isinstance(flags, dict):
+        return set()
+    return {int(bid) for bid, row in flags.items() if isinstance(row, dict) and row.get(flag)}
+
+
+def _audit(trip, booking_ids, event_type, now):
+    from ..models import RideAuditEvent
+
+    RideAuditEvent.objects.bulk_create([
+        RideAuditEvent(
+            trip_id=trip.id,
+            booking_id=bid,
+            actor_id=trip.driver_id,
+            event_type=event_type,
+            payload={'booking_id': bid, 'timestamp': now.isoformat(), 'source': 'dwell'},
+            created_at=now,
+        )
+        for bid in booking_ids
+    ])
+
+
+def _notify(payloads):
+    from ..views_notifications import send_ride_notifications_batch_async
+
+    try:
+        send_ride_notifications_batch_async(payloads)
+    except Exception as e:
+        print('[detect_arrivals][notify_error]:', repr(e))
+
+
+def _set_flags(trip_pk, booking_ids, flag, now):
+    from ..models import Trip
+
+    for bid in booking_ids:
+        merge_json(Trip, trip_pk, 'live_tracking_state', {flag: now.isoformat()}, path=('booking_flags', bid))
+
+
+def _mark_reached_pickup(trip, fences, now):
+    done = _already_flagged(trip.id, 'driver_reached_pickup_at')
+    fences = [f for f in fences if f['booking_id'] not in done]
+    if not fences:
+        return []
+    ids = [f['booking_id'] for f in fences]
+    with transaction.atomic():
+        _set_flags(trip.id, ids, 'driver_reached_pickup_at', now)
+        _audit(trip, ids, 'DRIVER_REACHED_PICKUP', now)
+
+    _notify([{
+        'user_id': str(f['passenger_id']),
+        'driver_id': str(trip.driver_id),
+        'title': 'Driver arrived',
+        'body': f"Driver reached {f.get('stop_name') or 'pickup point'}.",
+        'data': {
+            'type': 'driver_reached_pickup',
+            'trip_id': str(trip.trip_id),
+            'booking_id': str(f['booking_id']),
+        },
+    } for f in fences])
+    return ids
+
+
+def _mark_reached_dropoff(trip, fences, now):
+    from ..models import Booking
+
+    by_id = {f['booking_id']: f for f in fences}
+    with transaction.atomic():
+        ids = list(
+            Booking.objects.select_for_update()
+            .filter(id__in=list(by_id), trip_id=trip.id, ride_status='RIDE_STARTED')
+            .values_list('id', flat=True)
+        )
+        if not ids:
+            return []
+        Booking.objects.filter(id__in=ids).update(
+            booking_status='COMPLETED',
+            ride_status='DROPPED_OFF',
+            dropoff_at=now,
+            completed_at=now,
+            updated_at=now,
+        )
+        _set_flags(trip.id, ids, 'driver_reached_dropoff_at', now)
+        _audit(trip, ids, 'DRIVER_REACHED_DROPOFF', now)
+    # queryset.update() skips the Booking post_save receiver.
+    invalidate_trip_geofences(trip.id)
+
+    payloads = []
+    for bid in ids:
+        f = by_id[bid]
+        payloads.append({
+            'user_id': str(f['passenger_id']),
+            'driver_id': str(trip.driver_id),
+            'title': 'Reached destination',
+            'body': f"You reached {f.get('stop_name') or 'destination'}. Please proceed to payment.",
+            'data': {
+                'type': 'driver_reached_dropoff',
+                'trip_id': str(trip.trip_id),
+                'booking_id': str(bid),
+            },
+        })
+        payloads.append({
+            'user_id': str(trip.driver_id),
+            'driver_id': str(trip.driver_id),
+            'title': 'Drop-off reached',
+            'body': f'Drop-off completed for booking {bid}.',
+            'data': {
+                'type': 'driver_dropoff_completed',
+                'trip_id': str(trip.trip_id),
+                'booking_id': str(bid),
+            },
+        })
+    _notify(payloads)
+    return ids
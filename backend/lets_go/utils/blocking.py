@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from ..models import BlockedUser, BlockedPair
+
+
+# Per-user sets are cached under a versioned key; bumping the version on any
+# block/unblock makes every cached set for that user unreachable at once.
+_BLOCK_SET_PREFIX = 'blocked_ids'
+_BLOCK_VERSION_PREFIX = 'blocked_ids_ver'
+
+
+def _ordered(user_a, user_b):
+    a, b = int(user_a), int(user_b)
+    return (a, b) if a <= b else (b, a)
+
+
+def _block_set_ttl():
+    try:
+        return max(int(getattr(settings, 'BLOCKED_IDS_CACHE_SECONDS', 300)), 0)
+    except (TypeError, ValueError):
+        return 300
+
+
+def _block_version(user_id):
+    try:
+        return int(cache.get(f'{_BLOCK_VERSION_PREFIX}:{user_id}') or 0)
+    except Exception:
+        return 0
+
+
+def bump_block_version(user_id):
+    key = f'{_BLOCK_VERSION_PREFIX}:{int(user_id)}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+    except Exception as e:
+        print('[bump_block_version][WARN]:', repr(e))
+
+
+def sync_block_pair(user_a, user_b):
+    """Mirror BlockedUser (either direction) into BlockedPair for one pair of users."""
+    low, high = _ordered(user_a, user_b)
+    if low == high:
+        return
+    still_blocked = BlockedUser.objects.filter(
+        Q(blocker_id=low, blocked_user_id=high) | Q(blocker_id=high, blocked_user_id=low)
+    ).exists()
+    if still_blocked:
+        BlockedPair.objects.get_or_create(user_low_id=low, user_high_id=high)
+    else:
+        BlockedPair.objects.filter(user_low_id=low, user_high_id=high).delete()
+
+    def _bump():
+        bump_block_version(low)
+        bump_block_version(high)
+
+    transaction.on_commit(_bump)
+
+
+def get_blocked_user_ids(user_id):
+    """frozenset of user ids that user_id has blocked or is blocked by."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return frozenset()
+
+    key = f'{_BLOCK_SET_PREFIX}:{user_id}:{_block_version(user_id)}'
+    try:
+        ids = cache.get(key)
+    except Exception:
+        ids = None
+    if ids is not None:
+        return ids
+
+    rows = (
+        BlockedPair.objects
+        .filter(Q(user_low_id=user_id) | Q(user_high_id=user_id))
+        .values_list('user_low_id', 'user_high_id')
+    )
+    ids = frozenset(high if low == user_id else low for low, high in rows)
+    ttl = _block_set_ttl()
+    if ttl:
+        try:
+            cache.set(key, ids, timeout=ttl)
+        except Exception:
+            pass
+    return ids
+
+
+def is_blocked_between(user_a, user_b):
+    """True if either user has blocked the other."""
+    if user_a is None or user_b is None:
+        return False
+    try:
+        return int(user_b) in get_blocked_user_ids(user_a)
+    except (TypeError, ValueError):
+        return False
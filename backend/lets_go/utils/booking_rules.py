@@ -0,0 +1,50 @@
+from django.conf import settings
+
+
+AUTO_ACCEPT = 'accept'
+AUTO_COUNTER = 'counter'
+AUTO_REJECT = 'reject'
+
+
+def _auto_reject_ratio():
+    try:
+        ratio = float(getattr(settings, 'BOOKING_AUTO_REJECT_RATIO', 0.5))
+    except (TypeError, ValueError):
+        ratio = 0.5
+    return min(max(ratio, 0.0), 1.0)
+
+
+def evaluate_booking_offer(trip, offer_per_seat):
+    """Decide a passenger's per-seat offer on the driver's behalf.
+
+    Rules only apply to negotiable trips where the driver has set
+    minimum_acceptable_fare (the floor):
+
+    - offer >= floor                    -> accept at the offer
+    - floor * ratio <= offer < floor    -> counter at the floor
+    - offer < floor * ratio             -> reject
+
+    Returns (action, fare_per_seat), or (None, None) when the request should
+    wait for the driver as before.
+    """
+    if not getattr(settings, 'BOOKING_AUTO_RULES_ENABLED', True):
+        return None, None
+    if not getattr(trip, 'is_negotiable', False):
+        return None, None
+
+    floor = getattr(trip, 'minimum_acceptable_fare', None)
+    if floor is None or offer_per_seat is None:
+        return None, None
+    try:
+        floor = int(floor)
+        offer = int(offer_per_seat)
+    except (TypeError, ValueError):
+        return None, None
+    if floor <= 0:
+        return None, None
+
+    if offer >= floor:
+        return AUTO_ACCEPT, offer
+    if offer < floor * _auto_reject_ratio():
+        return AUTO_REJECT, None
+    return AUTO_COUNTER, floor
@@ -0,0 +1,35 @@
+import math
+
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def haversine_meters(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters, or None if any coordinate is not numeric."""
+    try:
+        lat1 = float(lat1)
+        lon1 = float(lon1)
+        lat2 = float(lat2)
+        lon2 = float(lon2)
+    except (TypeError, ValueError):
+        return None
+
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2.0) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2.0) ** 2
+    return EARTH_RADIUS_M * 2.0 * math.atan2(math.sqrt(a), math.sqrt(1.0 - a))
+
+
+def bearing_degrees(lat1, lon1, lat2, lon2):
+    """Initial bearing from point 1 to point 2 in degrees [0, 360), or None."""
+    try:
+        phi1 = math.radians(float(lat1))
+        phi2 = math.radians(float(lat2))
+        dlambda = math.radians(float(lon2) - float(lon1))
+    except (TypeError, ValueError):
+        return None
+    x = math.sin(dlambda) * math.cos(phi2)
+    y = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlambda)
+    return math.degrees(math.atan2(x, y)) % 360.0
@@ -0,0 +1,178 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .geo import haversine_meters
+from .live_store import get_live_store
+
+
+# Per-trip fence lists are cached and dropped by the Booking post_save/
+# post_delete receiver in lets_go/signals.py, so pickup verification or a
+# cancellation retires a fence on the next ping.
+GEOFENCE_CACHE_PREFIX = 'geofences'
+
+PICKUP_RADIUS_M = 600.0
+DROPOFF_RADIUS_M = 800.0
+
+# A fence is left only once the driver is this far beyond its radius, so GPS
+# jitter on the boundary does not flap between enter and exit.
+EXIT_HYSTERESIS_M = 100.0
+
+
+def _geofence_cache_key(trip_pk):
+    return f'{GEOFENCE_CACHE_PREFIX}:{trip_pk}'
+
+
+def _geofence_cache_ttl():
+    try:
+        return max(int(getattr(settings, 'GEOFENCE_CACHE_SECONDS', 60)), 0)
+    except (TypeError, ValueError):
+        return 60
+
+
+def invalidate_trip_geofences(trip_pk):
+    if trip_pk is None:
+        return
+    try:
+        cache.delete(_geofence_cache_key(int(trip_pk)))
+    except Exception as e:
+        print('[invalidate_trip_geofences][WARN]:', repr(e))
+
+
+def _build_trip_geofences(trip_pk):
+    from ..models import Booking
+
+    bookings = (
+        Booking.objects.filter(trip_id=trip_pk, booking_status='CONFIRMED')
+        .select_related('from_stop', 'to_stop')
+        .only(
+            'id', 'passenger_id', 'ride_status', 'pickup_verified_at',
+            'from_stop__latitude', 'from_stop__longitude', 'from_stop__stop_order', 'from_stop__stop_name',
+            'to_stop__latitude', 'to_stop__longitude', 'to_stop__stop_order', 'to_stop__stop_name',
+        )
+    )
+    fences = []
+    for b in bookings:
+        for kind, stop, radius in (
+            ('pickup', b.from_stop, PICKUP_RADIUS_M),
+            ('dropoff', b.to_stop, DROPOFF_RADIUS_M),
+        ):
+            if stop is None or stop.latitude is None or stop.longitude is None:
+                continue
+            fences.append({
+                'id': f'{kind}:{b.id}',
+                'kind': kind,
+                'booking_id': b.id,
+                'passenger_id': b.passenger_id,
+                'stop_order': stop.stop_order,
+                'stop_name': stop.stop_name,
+                'lat': float(stop.latitude),
+                'lng': float(stop.longitude),
+                'radius_m': radius,
+                'ride_status': b.ride_status,
+                'pickup_verified': b.pickup_verified_at is not None,
+            })
+    return fences
+
+
+def get_trip_geofences(trip_pk):
+    """Pickup and dropoff circles for the trip's confirmed bookings."""
+    key = _geofence_cache_key(int(trip_pk))
+    fences = cache.get(key)
+    if fences is None:
+        fences = _build_trip_geofences(trip_pk)
+        ttl = _geofence_cache_ttl()
+        if ttl:
+            cache.set(key, fences, timeout=ttl)
+    return fences
+
+
+def fence_armed(fence):
+    """Whether the fence's stop is still ahead for its booking: pickup not yet
+    verified, or the passenger on board for a dropoff."""
+    if fence['kind'] == 'pickup':
+        return not fence['pickup_verified'] and fence['ride_status'] == 'NOT_STARTED'
+    return fence['ride_status'] == 'RIDE_STARTED'
+
+
+def distance_to_next_stop(trip_pk, lat, lng, booking_id=None):
+    """Meters from (lat, lng) to the nearest stop still ahead: an unverified
+    pickup or the dropoff of an on-board booking. With booking_id only that
+    booking's stops count. None when there is no such stop."""
+    best = None
+    for fence in get_trip_geofences(trip_pk):
+        if booking_id is not None and fence['booking_id'] != booking_id:
+            continue
+        if not fence_armed(fence):
+            continue
+        d = haversine_meters(lat, lng, fence['lat'], fence['lng'])
+        if d is not None and (best is None or d < best):
+            best = d
+    return best
+
+
+def _notification_payload(trip, fence):
+    if fence['kind'] == 'pickup':
+        title, body, kind = 'Driver almost reached', 'Your driver almost reached to pick you.', 'driver_near_pickup'
+    else:
+        title, body, kind = 'Near destination', 'You are near your destination.', 'near_destination'
+    return {
+        'user_id': str(fence['passenger_id']),
+        'driver_id': str(trip.driver_id),
+        'title': title,
+        'body': body,
+        'data': {
+            'type': kind,
+            'trip_id': str(trip.trip_id),
+            'booking_id': str(fence['booking_id']),
+        },
+    }
+
+
+def evaluate_geofences(trip, point):
+    """Update the driver's enter/exit state for the trip's fences from one
+    driver point and notify passengers whose fence the driver is inside.
+
+    State lives in the live store, and each (fence, notification) pair is
+    claimed there so it is sent exactly once; nothing is written to the Trip
+    row. Returns the transitions as [{'event': 'enter'|'exit', 'fence': {...}}].
+    """
+    lat, lng = point.get('lat'), point.get('lng')
+    if lat is None or lng is None:
+        return []
+    fences = get_trip_geofences(trip.id)
+    store = get_live_store()
+    was_inside = set(store.get_fence_state(trip.id))
+    if not fences and not was_inside:
+        return []
+
+    inside = set()
+    events = []
+    for fence in fences:
+        d = haversine_meters(lat, lng, fence['lat'], fence['lng'])
+        if d is None:
+            continue
+        if fence['id'] in was_inside:
+            if d <= fence['radius_m'] + EXIT_HYSTERESIS_M:
+                inside.add(fence['id'])
+            else:
+                events.append({'event': 'exit', 'fence': fence})
+        elif d <= fence['radius_m']:
+            inside.add(fence['id'])
+            events.append({'event': 'enter', 'fence': fence})
+
+    if inside != was_inside:
+        store.set_fence_state(trip.id, inside)
+
+    # Checked for every fence the driver is inside, not just on entry, so a
+    # dropoff fence entered before the ride started still notifies once armed.
+    payloads = []
+    for fence in fences:
+        if fence['id'] in inside and fence_armed(fence) and store.claim_once(trip.id, f"notify:{fence['id']}"):
+            payloads.append(_notification_payload(trip, fence))
+    if payloads:
+        from ..views_notifications import send_ride_notifications_batch_async
+        try:
+            send_ride_notifications_batch_async(payloads)
+        except Exception as e:
+            print('[evaluate_geofences][notify_error]:', repr(e))
+    return events
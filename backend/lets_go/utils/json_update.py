@@ -0,0 +1,124 @@
+import copy
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+
+
+def _deep_merge(base, patch, path=(), defaults=None):
+    """Python twin of the SQL in merge_json_field(); returns a new dict."""
+    root = copy.deepcopy(base) if isinstance(base, dict) else {}
+    if defaults:
+        root = dict(copy.deepcopy(defaults), **root)
+    node = root
+    for key in path:
+        child = node.get(key)
+        if not isinstance(child, dict):
+            child = {}
+        node[key] = child
+        node = child
+    node.update(copy.deepcopy(patch))
+    return root
+
+
+def _merge_sql(column, path, defaults):
+    """jsonb expression merging a patch object into column at path.
+
+    Each level along the path is rebuilt as `existing || {key: child}`, so
+    missing or non-object intermediates become objects (jsonb_set alone does
+    not create them). Returns (sql, params) with the patch as the last param.
+    """
+    def obj_at(prefix):
+        return (
+            f"(CASE WHEN jsonb_typeof({column} #> %s::text[]) = 'object' "
+            f"THEN {column} #> %s::text[] ELSE '{{}}'::jsonb END)",
+            [list(prefix), list(prefix)],
+        )
+
+    sql, params = obj_at(path)
+    sql = f"{sql} || %s::jsonb"
+    for depth in range(len(path) - 1, -1, -1):
+        parent_sql, parent_params = obj_at(path[:depth])
+        sql = f"{parent_sql} || jsonb_build_object(%s::text, {sql})"
+        params = parent_params + [path[depth]] + params
+    if defaults:
+        sql = f"%s::jsonb || {sql}"
+        params = [json.dumps(defaults, cls=DjangoJSONEncoder)] + params
+    return sql, params
+
+
+def merge_json(model, pk, field_name, patch, path=(), defaults=None, using=None):
+    """Merge `patch` (a dict) into a JSONField of one row in a single UPDATE.
+
+    path names nested object keys to merge into, e.g. ('booking_flags', '12').
+    defaults are top-level keys set only when absent. Other keys of the
+    document are left as they are in the database, so concurrent writers of
+    different keys do not clobber each other. On PostgreSQL this is one
+    `UPDATE ... SET col = col || ...`; other backends (SQLite in tests) lock
+    the row and merge in Python. Returns the number of rows updated.
+    """
+    path = tuple(str(k) for k in path)
+    db = using or model._default_manager.db
+    connection = connections[db]
+    field = model._meta.get_field(field_name)
+
+    if connection.vendor == 'postgresql':
+        qn = connection.ops.quote_name
+        column = qn(field.column)
+        expr, params = _merge_sql(column, path, defaults)
+        params.append(json.dumps(dict(patch), cls=DjangoJSONEncoder))
+        sql = (
+            f'UPDATE {qn(model._meta.db_table)} SET {column} = {expr} '
+            f'WHERE {qn(model._meta.pk.column)} = %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [pk])
+            return cursor.rowcount
+
+    with transaction.atomic(using=db):
+        qs = model._default_manager.using(db).select_for_update().filter(pk=pk)
+        current = qs.values_list(field_name, flat=True).first()
+        merged = json.loads(json.dumps(_deep_merge(current, patch, path, defaults), cls=DjangoJSONEncoder))
+        return model._default_manager.using(db).filter(pk=pk).update(**{field_name: merged})
+
+
+def merge_json_field(instance, field_name, patch, path=(), defaults=None):
+    """merge_json() for a saved model instance; the in-memory value of the
+    field is updated the same way unless the field was deferred."""
+    updated = merge_json(type(instance), instance.pk, field_name, patch, path, defaults, using=instance._state.db)
+    attname = instance._meta.get_field(field_name).attname
+    if attname not in instance.get_deferred_fields():
+        setattr(instance, attname, _deep_merge(getattr(instance, attname, None), patch, tuple(str(k) for k in path), defaults))
+    return updated
+
+
+def json_without_keys(model, pk, field_name, keys, using=None):
+    """Read a JSONField object of one row minus the given top-level keys.
+
+    On PostgreSQL the keys are removed in SQL (`col - keys`), so large values
+    under them are never sent to the client. Returns {} for a missing row or
+    a non-object value.
+    """
+    db = using or model._default_manager.db
+    connection = connections[db]
+    field = model._meta.get_field(field_name)
+    keys = [str(k) for k in keys]
+
+    if connection.vendor == 'postgresql' and keys:
+        qn = connection.ops.quote_name
+        column = qn(field.column)
+        sql = (
+            f"SELECT CASE WHEN jsonb_typeof({column}) = 'object' THEN {column} - %s::text[] END "
+            f'FROM {qn(model._meta.db_table)} WHERE {qn(model._meta.pk.column)} = %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [keys, pk])
+            row = cursor.fetchone()
+        value = row[0] if row else None
+        if isinstance(value, str):
+            value = json.loads(value)
+    else:
+        value = model._default_manager.using(db).filter(pk=pk).values_list(field_name, flat=True).first()
+        if isinstance(value, dict):
+            value = {k: v for k, v in value.items() if k not in keys}
+    return value if isinstance(value, dict) else {}
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class LiveBroker:
+    """Fan-out of live tracking messages to WebSocket subscribers, per trip.
+
+    publish() is synchronous and thread-safe so it can be called from WSGI
+    views and sync_to_async workers alike; subscribe() is used from the ASGI
+    event loop and returns a LiveSubscription.
+    """
+
+    def publish(self, trip_pk, message):
+        raise NotImplementedError
+
+    def subscribe(self, trip_pk):
+        raise NotImplementedError
+
+
+class LiveSubscription:
+    """Bounded message queue of one subscriber; slow consumers lose the oldest
+    messages rather than growing memory (only the latest position matters)."""
+
+    def __init__(self, broker, trip_pk, maxsize=100):
+        self.broker = broker
+        self.trip_pk = int(trip_pk)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def _put(self, message):
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(message)
+
+    def deliver(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # Event loop already closed; the subscriber is gone.
+            pass
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker._unsubscribe(self)
+
+
+class InProcessBroker(LiveBroker):
+    """Default broker: subscribers and publishers share one process.
+
+    Enough for a single ASGI node; HTTP ingest running in the same process
+    reaches WebSocket subscribers too.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs = {}
+
+    def publish(self, trip_pk, message):
+        with self._lock:
+            subs = list(self._subs.get(int(trip_pk), ()))
+        for sub in subs:
+            sub.deliver(message)
+
+    def subscribe(self, trip_pk):
+        sub = LiveSubscription(self, trip_pk)
+        with self._lock:
+            self._subs.setdefault(sub.trip_pk, set()).add(sub)
+        return sub
+
+    def _unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subs.get(sub.trip_pk)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    self._subs.pop(sub.trip_pk, None)
+
+    def has_subscribers(self, trip_pk):
+        with self._lock:
+            return bool(self._subs.get(int(trip_pk)))
+
+
+class LiveStoreBroker(InProcessBroker):
+    """Multi-node broker on top of the shared live-position store.
+
+    Local publishes are delivered immediately. For every trip with local
+    subscribers one poller per process watches the store's change version
+    (LIVE_STREAM_POLL_SECONDS) and, when another node published, fans the
+    store snapshot out as a 'snapshot' message. Requires a shared
+    LIVE_POSITION_CACHE_ALIAS.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._pollers = {}
+        self._local_versions = {}
+
+    def publish(self, trip_pk, message):
+        from .live_store import get_live_store
+
+        self._local_versions[int(trip_pk)] = get_live_store().version(trip_pk)
+        super().publish(trip_pk, message)
+
+    def subscribe(self, trip_pk):
+        sub = super().subscribe(trip_pk)
+        with self._lock:
+            if sub.trip_pk not in self._pollers:
+                self._pollers[sub.trip_pk] = sub.loop.create_task(self._poll(sub.trip_pk))
+        return sub
+
+    async def _poll(self, trip_pk):
+        from asgiref.sync import sync_to_async
+        from .live_store import get_live_store
+
+        store = get_live_store()
+        interval = float(getattr(settings, 'LIVE_STREAM_POLL_SECONDS', 1.0) or 1.0)
+        seen = await sync_to_async(store.version, thread_sensitive=False)(trip_pk)
+        try:
+            while self.has_subscribers(trip_pk):
+                await asyncio.sleep(interval)
+                version = await sync_to_async(store.version, thread_sensitive=False)(trip_pk)
+                if version == seen:
+                    continue
+                seen = version
+                if version == self._local_versions.get(trip_pk):
+                    continue
+                snapshot = await sync_to_async(store.snapshot, thread_sensitive=False)(trip_pk)
+                super().publish(trip_pk, {'type': 'snapshot', 'live_state': snapshot or {}})
+        finally:
+            with self._lock:
+                self._pollers.pop(trip_pk, None)
+                self._local_versions.pop(trip_pk, None)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_live_broker():
+    """Process-wide broker built from settings.LIVE_BROKER (dotted path)."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'LIVE_BROKER', 'lets_go.utils.live_broker.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
@@ -0,0 +1,128 @@
+from django.utils import timezone
+
+from .live_store import get_live_store, checkpoint_live_state
+from .live_broker import get_live_broker
+from .arrival import detect_arrivals
+from .geofence import evaluate_geofences
+from .location_buffer import record_location
+from .motion import update_motion
+from .route_index import get_route_index
+
+
+DRIVER_PATH_MIN_SPACING_M = 12.0
+
+
+def enrich_driver_point(trip, point, previous=None):
+    """Add route_offset_m (along-route meters, snapped incrementally from the
+    previous point's offset), route_deviation_m (distance off the route) and
+    smoothed speed/heading to a driver point."""
+    try:
+        route_index = get_route_index(trip.route_id)
+        if route_index is not None:
+            last_offset = previous.get('route_offset_m') if isinstance(previous, dict) else None
+            hit, offset = route_index.locate(point.get('lat'), point.get('lng'), last_offset)
+            if hit is not None:
+                point['route_offset_m'] = round(float(offset), 1)
+                point['route_deviation_m'] = round(float(hit.distance_m), 1)
+    except Exception as e:
+        print('[enrich_driver_point][route_error]:', repr(e))
+    try:
+        update_motion(previous, point)
+    except Exception as e:
+        print('[enrich_driver_point][motion_error]:', repr(e))
+    return point
+
+
+def ingest_driver_point(trip, user_id, lat, lng, speed, now=None):
+    """Record one live driver fix: live store, path ring buffer, geofences,
+    stop arrival and the TripLiveLocationUpdate history row. Returns the
+    stored point."""
+    from ..models import TripLiveLocationUpdate
+
+    store = get_live_store()
+    now = now or timezone.now()
+    point = {'lat': lat, 'lng': lng, 'speed': speed, 'timestamp': now.isoformat()}
+    stored = enrich_driver_point(trip, dict(point, user_id=user_id), store.get_driver(trip.id))
+    store.set_driver(trip.id, stored)
+    # Traveled path for map display, thinned to points >= 12m apart.
+    try:
+        store.append_driver_path(trip.id, point, min_distance_m=DRIVER_PATH_MIN_SPACING_M)
+    except Exception as e:
+        print('[ingest_driver_point][path_error]:', repr(e))
+    try:
+        evaluate_geofences(trip, stored)
+    except Exception as e:
+        print('[ingest_driver_point][geofence_error]:', repr(e))
+    try:
+        detect_arrivals(trip, stored, now)
+    except Exception as e:
+        print('[ingest_driver_point][arrival_error]:', repr(e))
+
+    try:
+        record_location(TripLiveLocationUpdate(
+            trip_id=trip.id,
+            user_id=trip.driver_id,
+            booking=None,
+            role='DRIVER',
+            latitude=lat,
+            longitude=lng,
+            speed_mps=speed,
+            recorded_at=now,
+        ))
+    except Exception as e:
+        print('[ingest_driver_point][persist_error]:', repr(e))
+    return stored
+
+
+def ingest_passenger_point(trip, booking, lat, lng, speed, now=None):
+    """Record one live passenger fix for an on-board booking. Returns the stored point."""
+    from ..models import TripLiveLocationUpdate
+
+    now = now or timezone.now()
+    stored = {
+        'booking_id': booking.id,
+        'user_id': booking.passenger_id,
+        'lat': lat,
+        'lng': lng,
+        'speed': speed,
+        'timestamp': now.isoformat(),
+    }
+    get_live_store().set_passenger(trip.id, booking.id, stored)
+
+    try:
+        record_location(TripLiveLocationUpdate(
+            trip_id=trip.id,
+            user_id=booking.passenger_id,
+            booking_id=booking.id,
+            role='PASSENGER',
+            latitude=lat,
+            longitude=lng,
+            speed_mps=speed,
+            recorded_at=now,
+        ))
+    except Exception as e:
+        print('[ingest_passenger_point][persist_error]:', repr(e))
+    return stored
+
+
+def position_message(role, point):
+    return {'type': 'position', 'role': role, 'point': point}
+
+
+def publish_live_update(trip_pk, timestamp, messages=()):
+    """Finish an ingest: stamp last_update, notify SSE streams and WebSocket
+    subscribers, and checkpoint to Trip.live_tracking_state when due."""
+    store = get_live_store()
+    store.touch(trip_pk, timestamp)
+    store.publish(trip_pk)
+    broker = get_live_broker()
+    for message in messages:
+        try:
+            broker.publish(trip_pk, message)
+        except Exception as e:
+            print('[publish_live_update][broker_error]:', repr(e))
+    # Trip.live_tracking_state is only refreshed every LIVE_TRACKING_CHECKPOINT_SECONDS.
+    try:
+        checkpoint_live_state(trip_pk)
+    except Exception as e:
+        print('[publish_live_update][checkpoint_error]:', repr(e))
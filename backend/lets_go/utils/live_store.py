@@ -0,0 +1,474 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .geo import haversine_meters
+from .json_update import json_without_keys, merge_json
+
+
+# Keys of Trip.live_tracking_state owned by the live store. Everything else in
+# that JSON (system_notifications, booking_flags, ended_at, ...) stays DB-only.
+LIVE_KEYS = ('driver', 'driver_path', 'passengers', 'last_update')
+
+PATH_CHUNK_SIZE = 100
+DEFAULT_PATH_MAX_POINTS = 2000
+
+# Fleet index: driver positions bucketed into FLEET_CELL_DEG-degree grid cells
+# (~5.5 km of latitude). A trip re-registers in its cell at least every
+# FLEET_INDEX_REFRESH_SECONDS, which heals entries lost to racing writers.
+FLEET_CELL_DEG = 0.05
+FLEET_INDEX_REFRESH_SECONDS = 60
+
+# Same-process subscribers wait on a Condition of their own trip, so a publish
+# wakes only that trip's streams; other processes notice the version bump on
+# their next poll of the backing cache. Entries exist while a trip has waiters.
+_trip_conditions = {}
+_trip_conditions_lock = threading.Lock()
+
+
+@contextmanager
+def _trip_condition(trip_pk):
+    key = int(trip_pk)
+    with _trip_conditions_lock:
+        entry = _trip_conditions.get(key)
+        if entry is None:
+            entry = _trip_conditions[key] = [threading.Condition(), 0]
+        entry[1] += 1
+    try:
+        yield entry[0]
+    finally:
+        with _trip_conditions_lock:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                _trip_conditions.pop(key, None)
+
+
+def _notify_trip(trip_pk):
+    with _trip_conditions_lock:
+        entry = _trip_conditions.get(int(trip_pk))
+    if entry is not None:
+        with entry[0]:
+            entry[0].notify_all()
+
+
+class CacheLivePositionStore:
+    """Latest driver/passenger positions and recent driver path per trip, on a
+    Django cache backend.
+
+    GPS pings write here instead of rewriting Trip.live_tracking_state; the DB
+    copy is refreshed by checkpoint_live_state() at a throttled interval.
+    Uses the LIVE_POSITION_CACHE_ALIAS cache, which settings back with Redis
+    whenever REDIS_URL is set. The driver path is a ring buffer of fixed-size
+    chunks so an append rewrites at most PATH_CHUNK_SIZE points, not the whole
+    path.
+    """
+
+    def __init__(self, cache=None, cache_alias=None, ttl_seconds=None, path_max_points=None):
+        if cache is None:
+            cache = caches[cache_alias or getattr(settings, 'LIVE_POSITION_CACHE_ALIAS', 'live')]
+        self._cache = cache
+        self._ttl = int(ttl_seconds or getattr(settings, 'LIVE_POSITION_TTL_SECONDS', 6 * 3600))
+        self._path_max = int(path_max_points or DEFAULT_PATH_MAX_POINTS)
+
+    def _key(self, trip_pk, suffix):
+        return f'live:{int(trip_pk)}:{suffix}'
+
+    def _chunk_key(self, trip_pk, chunk_no):
+        return self._key(trip_pk, f'path:{chunk_no}')
+
+    def set_driver(self, trip_pk, point):
+        self._cache.set(self._key(trip_pk, 'driver'), dict(point), timeout=self._ttl)
+        try:
+            self._index_driver(trip_pk, point)
+        except Exception as e:
+            print('[CacheLivePositionStore][fleet_index_error]:', repr(e))
+
+    def get_driver(self, trip_pk):
+        """Latest driver point, or None."""
+        return self._cache.get(self._key(trip_pk, 'driver'))
+
+    @staticmethod
+    def _cell_of(lat, lng):
+        return (math.floor(float(lat) / FLEET_CELL_DEG), math.floor(float(lng) / FLEET_CELL_DEG))
+
+    @contextmanager
+    def _fleet_lock(self, name):
+        # Best-effort mutex for the shared index values; after ~100ms the write
+        # goes ahead unlocked and the periodic refresh repairs any lost entry.
+        lock_key = f'live:fleet:lock:{name}'
+        acquired = False
+        for _ in range(20):
+            acquired = bool(self._cache.add(lock_key, 1, timeout=5))
+            if acquired:
+                break
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            if acquired:
+                self._cache.delete(lock_key)
+
+    def _fleet_cell_update(self, cell, trip_pk, add):
+        cell_key = 'live:fleet:cell:%d:%d' % cell
+        with self._fleet_lock('%d:%d' % cell):
+            members = set(self._cache.get(cell_key) or ())
+            if add:
+                members.add(int(trip_pk))
+            else:
+                members.discard(int(trip_pk))
+            if members:
+                self._cache.set(cell_key, members, timeout=self._ttl)
+            else:
+                self._cache.delete(cell_key)
+        with self._fleet_lock('cells'):
+            cells = set(self._cache.get('live:fleet:cells') or ())
+            if members and cell not in cells:
+                cells.add(cell)
+            elif not members and cell in cells:
+                cells.discard(cell)
+            else:
+                return
+            self._cache.set('live:fleet:cells', cells, timeout=self._ttl)
+
+    def _index_driver(self, trip_pk, point):
+        if point.get('lat') is None or point.get('lng') is None:
+            return
+        cell = self._cell_of(point['lat'], point['lng'])
+        cell_key = self._key(trip_pk, 'cell')
+        now = time.time()
+        prev = self._cache.get(cell_key)
+        if prev is not None and tuple(prev[0]) == cell and now - prev[1] < FLEET_INDEX_REFRESH_SECONDS:
+            return
+        if prev is not None and tuple(prev[0]) != cell:
+            self._fleet_cell_update(tuple(prev[0]), trip_pk, add=False)
+        self._fleet_cell_update(cell, trip_pk, add=True)
+        self._cache.set(cell_key, (cell, now), timeout=self._ttl)
+
+    def drivers_in_bbox(self, min_lat, min_lng, max_lat, max_lng):
+        """[(trip_pk, driver point)] for every trip whose latest driver point
+        lies in the box, ordered by trip_pk. Any bound may be None."""
+        def inside(lat, lng):
+            return ((min_lat is None or lat >= min_lat) and (max_lat is None or lat <= max_lat)
+                    and (min_lng is None or lng >= min_lng) and (max_lng is None or lng <= max_lng))
+
+        lo = self._cell_of(min_lat if min_lat is not None else -90, min_lng if min_lng is not None else -180)
+        hi = self._cell_of(max_lat if max_lat is not None else 90, max_lng if max_lng is not None else 180)
+        cells = [c for c in (self._cache.get('live:fleet:cells') or ()) if lo[0] <= c[0] <= hi[0] and lo[1] <= c[1] <= hi[1]]
+        if not cells:
+            return []
+        found = self._cache.get_many(['live:fleet:cell:%d:%d' % c for c in cells])
+        trip_pks = sorted({pk for members in found.values() for pk in members})
+        if not trip_pks:
+            return []
+        keys = {self._key(pk, 'driver'): pk for pk in trip_pks}
+        points = self._cache.get_many(list(keys))
+        out = []
+        for key, pk in keys.items():
+            point = points.get(key)
+            if not point or point.get('lat') is None or point.get('lng') is None:
+                continue
+            if inside(float(point['lat']), float(point['lng'])):
+                out.append((pk, point))
+        return out
+
+    def append_driver_path(self, trip_pk, point, min_distance_m=0.0):
+        """Append to the path ring buffer unless within min_distance_m of the
+        last point. Returns the new point's sequence number or None."""
+        head_key = self._key(trip_pk, 'path_head')
+        head = self._cache.get(head_key)
+        chunk = []
+        if head is not None:
+            chunk = self._cache.get(self._chunk_key(trip_pk, head // PATH_CHUNK_SIZE)) or []
+            last = chunk[-1] if chunk else None
+            if last is not None and min_distance_m > 0:
+                d = haversine_meters(last.get('lat'), last.get('lng'), point.get('lat'), point.get('lng'))
+                if d is not None and d < float(min_distance_m):
+                    return None
+
+        seq = 0 if head is None else int(head) + 1
+        chunk_no = seq // PATH_CHUNK_SIZE
+        if seq % PATH_CHUNK_SIZE == 0:
+            chunk = []
+        chunk.append(dict(point, seq=seq))
+        self._cache.set_many({
+            self._chunk_key(trip_pk, chunk_no): chunk,
+            head_key: seq,
+        }, timeout=self._ttl)
+
+        if seq % PATH_CHUNK_SIZE == 0:
+            stale = chunk_no - (self._path_max // PATH_CHUNK_SIZE) - 1
+            if stale >= 0:
+                self._cache.delete(self._chunk_key(trip_pk, stale))
+        return seq
+
+    def get_driver_path(self, trip_pk, limit=None, head=None):
+        if head is None:
+            head = self._cache.get(self._key(trip_pk, 'path_head'))
+        if head is None:
+            return []
+        head = int(head)
+        limit = min(int(limit or self._path_max), self._path_max)
+        first = max(head - limit + 1, 0)
+        keys = [self._chunk_key(trip_pk, n) for n in range(first // PATH_CHUNK_SIZE, head // PATH_CHUNK_SIZE + 1)]
+        found = self._cache.get_many(keys)
+        path = []
+        for k in keys:
+            for p in found.get(k) or []:
+                if first <= int(p.get('seq', -1)) <= head:
+                    path.append(p)
+        return path
+
+    def set_passenger(self, trip_pk, booking_id, point):
+        booking_id = int(booking_id)
+        idx_key = self._key(trip_pk, 'pidx')
+        ids = self._cache.get(idx_key) or []
+        if booking_id not in ids:
+            ids = list(ids) + [booking_id]
+            self._cache.set(idx_key, ids, timeout=self._ttl)
+        self._cache.set(self._key(trip_pk, f'p:{booking_id}'), dict(point), timeout=self._ttl)
+
+    def touch(self, trip_pk, timestamp):
+        self._cache.set(self._key(trip_pk, 'last_update'), timestamp, timeout=self._ttl)
+
+    def snapshot(self, trip_pk, path_after=None):
+        """Dict with any of LIVE_KEYS that are known, or None. With path_after
+        (a path seq) only driver_path points after it are read, when the
+        buffer still holds them."""
+        head_keys = {
+            'driver': self._key(trip_pk, 'driver'),
+            'path_head': self._key(trip_pk, 'path_head'),
+            'pidx': self._key(trip_pk, 'pidx'),
+            'last_update': self._key(trip_pk, 'last_update'),
+        }
+        found = self._cache.get_many(list(head_keys.values()))
+        if not found:
+            return None
+
+        snap = {}
+        driver = found.get(head_keys['driver'])
+        if driver is not None:
+            snap['driver'] = driver
+        head = found.get(head_keys['path_head'])
+        if head is not None:
+            limit = None
+            if isinstance(path_after, int) and 0 <= path_after <= int(head):
+                limit = int(head) - path_after
+            snap['driver_path'] = [] if limit == 0 else self.get_driver_path(trip_pk, limit=limit, head=head)
+        ids = found.get(head_keys['pidx']) or []
+        if ids:
+            p_keys = [self._key(trip_pk, f'p:{bid}') for bid in ids]
+            rows = self._cache.get_many(p_keys)
+            snap['passengers'] = [rows[k] for k in p_keys if k in rows]
+        if found.get(head_keys['last_update']) is not None:
+            snap['last_update'] = found[head_keys['last_update']]
+        return snap
+
+    def clear(self, trip_pk):
+        prev_cell = self._cache.get(self._key(trip_pk, 'cell'))
+        if prev_cell is not None:
+            try:
+                self._fleet_cell_update(tuple(prev_cell[0]), trip_pk, add=False)
+            except Exception as e:
+                print('[CacheLivePositionStore][fleet_index_error]:', repr(e))
+        head = self._cache.get(self._key(trip_pk, 'path_head'))
+        ids = self._cache.get(self._key(trip_pk, 'pidx')) or []
+        keys = [self._key(trip_pk, s) for s in ('driver', 'path_head', 'pidx', 'last_update', 'ckpt', 'ver', 'gf', 'dwell', 'cell')]
+        keys += [self._key(trip_pk, f'p:{bid}') for bid in ids]
+        if head is not None:
+            keys += [self._chunk_key(trip_pk, n) for n in range(int(head) // PATH_CHUNK_SIZE + 1)]
+        self._cache.delete_many(keys)
+
+    def checkpoint_due(self, trip_pk, interval_seconds):
+        """True at most once per interval per trip (across processes when the
+        backing cache is shared)."""
+        if interval_seconds <= 0:
+            return True
+        return bool(self._cache.add(self._key(trip_pk, 'ckpt'), 1, timeout=interval_seconds))
+
+    def publish(self, trip_pk):
+        """Bump the trip's change version and wake its subscribers."""
+        key = self._key(trip_pk, 'ver')
+        try:
+            version = self._cache.incr(key)
+        except ValueError:
+            # Missing key: seed it. A concurrent seed just loses one bump, and
+            # any change of value is enough to wake subscribers.
+            version = int(time.time() * 1000)
+            self._cache.set(key, version, timeout=self._ttl)
+        _notify_trip(trip_pk)
+        return version
+
+    def version(self, trip_pk):
+        """Current change version (None before the first publish)."""
+        return self._cache.get(self._key(trip_pk, 'ver'))
+
+    def wait_for_update(self, trip_pk, last_version, timeout):
+        """Block until version(trip_pk) differs from last_version or timeout
+        seconds pass; returns the version seen last."""
+        poll = float(getattr(settings, 'LIVE_STREAM_POLL_SECONDS', 1.0) or 1.0)
+        deadline = time.monotonic() + max(float(timeout), 0.0)
+        with _trip_condition(trip_pk) as updated:
+            while True:
+                version = self.version(trip_pk)
+                remaining = deadline - time.monotonic()
+                if version != last_version or remaining <= 0:
+                    return version
+                with updated:
+                    updated.wait(min(poll, remaining))
+
+    def get_fence_state(self, trip_pk):
+        """Geofence ids the driver is currently inside (see utils/geofence.py)."""
+        return list(self._cache.get(self._key(trip_pk, 'gf')) or [])
+
+    def set_fence_state(self, trip_pk, inside):
+        self._cache.set(self._key(trip_pk, 'gf'), sorted(inside), timeout=self._ttl)
+
+    def get_dwell_state(self, trip_pk):
+        """{stop key: epoch seconds the driver entered its arrival radius}
+        (see utils/arrival.py)."""
+        return dict(self._cache.get(self._key(trip_pk, 'dwell')) or {})
+
+    def set_dwell_state(self, trip_pk, dwell):
+        self._cache.set(self._key(trip_pk, 'dwell'), dict(dwell), timeout=self._ttl)
+
+    def claim_once(self, trip_pk, name):
+        """True for the first caller per (trip, name), False afterwards. Claims
+        are not dropped by clear() so a finished trip cannot re-emit."""
+        return bool(self._cache.add(self._key(trip_pk, f'once:{name}'), 1, timeout=self._ttl))
+
+    def release_claim(self, trip_pk, name):
+        """Undo claim_once, e.g. when the claimed work failed and must be retried."""
+        self._cache.delete(self._key(trip_pk, f'once:{name}'))
+
+
+class InMemoryLivePositionStore(CacheLivePositionStore):
+    """Process-local store on a private LocMemCache; for tests and one-process runs."""
+
+    def __init__(self, **kwargs):
+        from django.core.cache.backends.locmem import LocMemCache
+        super().__init__(cache=LocMemCache('lets_go-live-positions', {'TIMEOUT': None}), **kwargs)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_live_store():
+    """Process-wide store built from settings.LIVE_POSITION_STORE (dotted path)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                path = getattr(settings, 'LIVE_POSITION_STORE', 'lets_go.utils.live_store.CacheLivePositionStore')
+                _store = import_string(path)()
+    return _store
+
+
+def merge_live_snapshot(state, snapshot):
+    """Overlay the store's live keys on a Trip.live_tracking_state dict (copy)."""
+    merged = dict(state) if isinstance(state, dict) else {}
+    if snapshot:
+        for k in LIVE_KEYS:
+            if k in snapshot:
+                merged[k] = snapshot[k]
+    return merged
+
+
+def live_tracking_state_for(trip, path_after=None):
+    """Trip.live_tracking_state with the freshest positions from the live store.
+
+    When the trip was loaded with the JSON deferred (the default, see
+    TripManager), only the keys the store cannot supply are read from the DB.
+    """
+    from ..models import Trip
+
+    try:
+        snapshot = get_live_store().snapshot(trip.id, path_after=path_after)
+    except Exception as e:
+        print('[live_tracking_state_for][WARN]:', repr(e))
+        snapshot = None
+    if 'live_tracking_state' in trip.get_deferred_fields():
+        covered = [k for k in LIVE_KEYS if snapshot and k in snapshot]
+        state = json_without_keys(Trip, trip.pk, 'live_tracking_state', covered)
+    else:
+        state = trip.live_tracking_state
+    return merge_live_snapshot(state, snapshot)
+
+
+def parse_path_since(since):
+    """A `since` query value as a path seq (int) or an aware datetime, or None."""
+    if since is None or isinstance(since, bool):
+        return None
+    if isinstance(since, int):
+        return since
+    text = str(since).strip()
+    if not text:
+        return None
+    if text.lstrip('-').isdigit():
+        return int(text)
+    try:
+        dt = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+
+
+def path_since(path, since):
+    """Points of a driver path added after `since`.
+
+    since is a path seq or a datetime (see parse_path_since). Returns
+    (points, mode, last_seq): mode is 'append' when points extend what the
+    client holds, or 'replace' when the full path is returned because since is
+    missing, older than the buffer, or from a reset path. last_seq is the seq to
+    send as the next since (None for paths written before seqs existed).
+    """
+    path = [p for p in (path or []) if isinstance(p, dict)]
+    seqs = [p.get('seq') for p in path]
+    has_seq = all(isinstance(q, int) for q in seqs)
+    last_seq = seqs[-1] if (path and has_seq) else None
+
+    if isinstance(since, int) and has_seq:
+        if path and (seqs[0] > since + 1 or seqs[-1] < since):
+            return path, 'replace', last_seq
+        return [p for p in path if p['seq'] > since], 'append', (last_seq if path else since)
+
+    if isinstance(since, datetime):
+        stamps = []
+        for p in path:
+            try:
+                ts = datetime.fromisoformat(str(p.get('timestamp')))
+            except (TypeError, ValueError):
+                return path, 'replace', last_seq
+            stamps.append(timezone.make_aware(ts) if timezone.is_naive(ts) else ts)
+        if stamps and stamps[0] > since:
+            return path, 'replace', last_seq
+        return [p for p, ts in zip(path, stamps) if ts > since], 'append', last_seq
+
+    return path, 'replace', last_seq
+
+
+def checkpoint_live_state(trip_pk, force=False):
+    """Copy the store's live keys into Trip.live_tracking_state.
+
+    Runs at most once per LIVE_TRACKING_CHECKPOINT_SECONDS per trip unless
+    forced. Only LIVE_KEYS are merged into the JSON (one UPDATE, see
+    merge_json), so concurrent writers of other keys are not clobbered.
+    Returns True if written.
+    """
+    from ..models import Trip
+
+    store = get_live_store()
+    interval = int(getattr(settings, 'LIVE_TRACKING_CHECKPOINT_SECONDS', 30))
+    if not force and not store.checkpoint_due(trip_pk, interval):
+        return False
+    snapshot = store.snapshot(trip_pk)
+    if not snapshot:
+        return False
+    return merge_json(Trip, trip_pk, 'live_tracking_state', merge_live_snapshot({}, snapshot)) > 0
@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .live_store import get_live_store, path_since
+
+
+# Stream payloads are shared per (trip, published version, viewer variant) so a
+# publish rebuilds each variant once, not once per open stream. Versions only
+# move forward, so the TTL just bounds how long old entries linger.
+STREAM_PAYLOAD_CACHE_PREFIX = 'live_stream'
+STREAM_PAYLOAD_CACHE_SECONDS = 60
+_build_locks = [threading.Lock() for _ in range(32)]
+
+
+def sse_event(data, event=None, event_id=None):
+    """Format one Server-Sent Events frame."""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    body = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+    lines.extend(f'data: {line}' for line in body.split('\n'))
+    return '\n'.join(lines) + '\n\n'
+
+
+def path_delta(live_state, cursor, key='driver_path'):
+    """Reduce live_state[key] to the points the client has not seen yet.
+
+    cursor carries the last sent path seq between events; see path_since for
+    when the whole path is sent instead (live_state[key + '_mode']).
+    """
+    if not isinstance(live_state, dict) or not isinstance(live_state.get(key), list):
+        return live_state
+    points, mode, last_seq = path_since(live_state.get(key), cursor.get(key))
+    cursor[key] = last_seq
+    live_state = dict(live_state)
+    live_state[key] = points
+    live_state[key + '_mode'] = mode
+    live_state[key + '_seq'] = last_seq
+    return live_state
+
+
+def cached_stream_payload(trip_pk, version, variant, build):
+    """build() at most once per (trip, version, variant) across viewers.
+
+    Streams of the same trip woken by one publish share the result through
+    the default cache; within a process they also wait for a build already
+    running instead of starting their own. Only dicts are cached, and nothing
+    is cached before the trip's first publish (version None).
+    """
+    if version is None:
+        return build()
+    key = f'{STREAM_PAYLOAD_CACHE_PREFIX}:{int(trip_pk)}:{version}:{variant}'
+    payload = cache.get(key)
+    if payload is not None:
+        return payload
+    with _build_locks[hash(key) % len(_build_locks)]:
+        payload = cache.get(key)
+        if payload is None:
+            payload = build()
+            if isinstance(payload, dict):
+                cache.set(key, payload, timeout=STREAM_PAYLOAD_CACHE_SECONDS)
+    return payload
+
+
+def live_event_stream(trip_pk, build_payload):
+    """Yield SSE frames for a trip: a 'snapshot' event, then an 'update' event
+    each time the live store publishes a change for the trip.
+
+    build_payload(cursor) returns the event data, or None to end the stream
+    (trip finished, link expired); cursor is a dict kept across events so the
+    builder can send deltas, and cursor['version'] is the version being sent.
+    Idle connections get a comment line every LIVE_STREAM_KEEPALIVE_SECONDS,
+    and the stream closes after LIVE_STREAM_MAX_SECONDS so worker threads are
+    recycled; EventSource reconnects on its own.
+    """
+    store = get_live_store()
+    keepalive = float(getattr(settings, 'LIVE_STREAM_KEEPALIVE_SECONDS', 15) or 15)
+    deadline = time.monotonic() + float(getattr(settings, 'LIVE_STREAM_MAX_SECONDS', 300) or 300)
+    cursor = {}
+    event = 'snapshot'
+    version = store.version(trip_pk)
+    sent_version = object()
+
+    yield 'retry: 3000\n\n'
+    while True:
+        if version != sent_version:
+            cursor['version'] = version
+            try:
+                payload = build_payload(cursor)
+            except Exception as e:
+                print('[live_event_stream][ERROR]:', repr(e))
+                payload = None
+            if payload is None:
+                yield sse_event({'success': False, 'error': 'Live tracking ended'}, event='end')
+                return
+            yield sse_event(payload, event=event, event_id=version)
+            event = 'update'
+            sent_version = version
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        version = store.wait_for_update(trip_pk, sent_version, min(keepalive, remaining))
+        if version == sent_version:
+            yield ': keepalive\n\n'
+
+
+def sse_response(stream):
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Disable proxy buffering (nginx) so frames are delivered as they are written.
+    response['X-Accel-Buffering'] = 'no'
+    return response
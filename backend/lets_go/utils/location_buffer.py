@@ -0,0 +1,122 @@
+import atexit
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+class LocationWriteBuffer:
+    """Per-process write-behind buffer for TripLiveLocationUpdate rows.
+
+    Opt-in (LIVE_LOCATION_WRITE_BEHIND) for long-lived worker processes only.
+
+    Request threads only append unsaved model instances; a daemon thread
+    writes them with bulk_create once flush_size rows are pending or every
+    flush_interval seconds, and once more at interpreter exit. When the DB
+    falls behind, rows beyond max_pending are dropped and counted rather than
+    letting memory grow without bound.
+    """
+
+    def __init__(self, flush_size=200, flush_interval=2.0, max_pending=20000):
+        self.flush_size = max(int(flush_size), 1)
+        self.flush_interval = max(float(flush_interval), 0.1)
+        self.max_pending = max(int(max_pending), self.flush_size)
+        self._rows = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.flushed = 0
+        self.dropped = 0
+        self.failed_batches = 0
+
+    def add(self, row):
+        """Queue an unsaved TripLiveLocationUpdate. Returns False if dropped."""
+        with self._lock:
+            if len(self._rows) >= self.max_pending:
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    print(f'[LocationWriteBuffer][WARN] buffer full; dropped={self.dropped}')
+                return False
+            self._rows.append(row)
+            pending = len(self._rows)
+        self._ensure_thread()
+        if pending >= self.flush_size:
+            self._wake.set()
+        return True
+
+    def extend(self, rows):
+        return sum(1 for r in rows if self.add(r))
+
+    def flush(self):
+        """Write everything pending. Safe to call from any thread."""
+        from ..models import TripLiveLocationUpdate
+
+        with self._lock:
+            batch, self._rows = self._rows, []
+        if not batch:
+            return 0
+        try:
+            TripLiveLocationUpdate.objects.bulk_create(batch, batch_size=500)
+        except Exception as e:
+            with self._lock:
+                self.failed_batches += 1
+                self.dropped += len(batch)
+            print(f'[LocationWriteBuffer][ERROR] bulk_create of {len(batch)} rows failed:', repr(e))
+            return 0
+        with self._lock:
+            self.flushed += len(batch)
+        return len(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._rows),
+                'flushed': self.flushed,
+                'dropped': self.dropped,
+                'failed_batches': self.failed_batches,
+            }
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='location-write-buffer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_location_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = LocationWriteBuffer(
+                    flush_size=getattr(settings, 'LIVE_LOCATION_FLUSH_SIZE', 200),
+                    flush_interval=getattr(settings, 'LIVE_LOCATION_FLUSH_SECONDS', 2.0),
+                    max_pending=getattr(settings, 'LIVE_LOCATION_MAX_PENDING', 20000),
+                )
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+def record_location(row):
+    """Save a TripLiveLocationUpdate now, or queue it for write-behind when
+    LIVE_LOCATION_WRITE_BEHIND is on."""
+    if not getattr(settings, 'LIVE_LOCATION_WRITE_BEHIND', False):
+        row.save()
+        return True
+    return get_location_buffer().add(row)
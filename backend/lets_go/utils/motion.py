@@ -0,0 +1,102 @@
+import math
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from .geo import haversine_meters, bearing_degrees
+
+
+# Moves shorter than this between fixes are GPS jitter: they still count
+# towards speed but do not turn the heading.
+MIN_HEADING_MOVE_M = 5.0
+# Fixes closer together than this are too noisy to derive a speed from.
+MIN_SPEED_INTERVAL_S = 0.5
+# Raw speeds above this (m/s, ~250 km/h) are treated as GPS jumps.
+MAX_PLAUSIBLE_SPEED_MPS = 70.0
+
+
+def _parse_ts(v):
+    if isinstance(v, datetime):
+        return v if not timezone.is_naive(v) else timezone.make_aware(v)
+    if not v:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(v))
+    except ValueError:
+        return None
+    return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+
+
+def _float_or_none(v):
+    if v is None or isinstance(v, bool):
+        return None
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        return None
+    return f if math.isfinite(f) else None
+
+
+def update_motion(previous, point, tau_seconds=None):
+    """Fold a new driver fix into the smoothed speed/heading carried on the
+    previous fix, and return the point with speed_smoothed_mps / heading_deg.
+
+    Both are exponentially weighted moving averages whose weight depends on
+    the time since the last fix (alpha = 1 - exp(-dt / tau)), so irregular
+    ping intervals smooth consistently. Speed uses the client's reported speed
+    when present, else along-route progress (route_offset_m) and finally the
+    straight-line distance between fixes. Heading is averaged as a unit vector
+    so it wraps correctly around north.
+    """
+    if tau_seconds is None:
+        tau_seconds = float(getattr(settings, 'LIVE_MOTION_SMOOTHING_SECONDS', 10.0) or 10.0)
+    if not isinstance(previous, dict):
+        previous = {}
+
+    prev_speed = _float_or_none(previous.get('speed_smoothed_mps'))
+    prev_heading = _float_or_none(previous.get('heading_deg'))
+    t0 = _parse_ts(previous.get('timestamp'))
+    t1 = _parse_ts(point.get('timestamp'))
+    dt = (t1 - t0).total_seconds() if (t0 is not None and t1 is not None) else None
+
+    raw_speed = _float_or_none(point.get('speed'))
+    moved_m = None
+    if previous.get('lat') is not None and previous.get('lng') is not None:
+        moved_m = haversine_meters(previous.get('lat'), previous.get('lng'), point.get('lat'), point.get('lng'))
+    if (raw_speed is None or raw_speed < 0) and dt is not None and dt >= MIN_SPEED_INTERVAL_S:
+        o0 = _float_or_none(previous.get('route_offset_m'))
+        o1 = _float_or_none(point.get('route_offset_m'))
+        if o0 is not None and o1 is not None and o1 >= o0:
+            raw_speed = (o1 - o0) / dt
+        elif moved_m is not None:
+            raw_speed = moved_m / dt
+    if raw_speed is not None and not (0 <= raw_speed <= MAX_PLAUSIBLE_SPEED_MPS):
+        raw_speed = None
+
+    if dt is None or dt <= 0:
+        alpha = 1.0
+    else:
+        alpha = 1.0 - math.exp(-dt / max(float(tau_seconds), 0.1))
+
+    speed = prev_speed
+    if raw_speed is not None:
+        speed = raw_speed if prev_speed is None else prev_speed + alpha * (raw_speed - prev_speed)
+
+    heading = prev_heading
+    if moved_m is not None and moved_m >= MIN_HEADING_MOVE_M:
+        raw_heading = bearing_degrees(previous.get('lat'), previous.get('lng'), point.get('lat'), point.get('lng'))
+        if raw_heading is not None:
+            if prev_heading is None:
+                heading = raw_heading
+            else:
+                a0, a1 = math.radians(prev_heading), math.radians(raw_heading)
+                x = math.cos(a0) + alpha * (math.cos(a1) - math.cos(a0))
+                y = math.sin(a0) + alpha * (math.sin(a1) - math.sin(a0))
+                heading = math.degrees(math.atan2(y, x)) % 360.0 if (x or y) else raw_heading
+
+    if speed is not None:
+        point['speed_smoothed_mps'] = round(speed, 2)
+    if heading is not None:
+        point['heading_deg'] = round(heading, 1)
+    return point
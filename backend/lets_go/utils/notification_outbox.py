@@ -0,0 +1,192 @@
+import time
+from datetime import timedelta
+from functools import partial
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models.models_notification import NotificationOutbox
+
+
+def enqueue_notification(payload, kind=NotificationOutbox.KIND_RIDE):
+    """Queue one notification in the outbox.
+
+    Call inside the transaction that makes the state change: the row commits
+    or rolls back with it. Once committed it is handed to the notification
+    pool right away; the dispatcher retries anything that is not delivered.
+    """
+    row = NotificationOutbox.objects.create(kind=kind, payload=payload)
+    _deliver_after_commit([row.id])
+    return row
+
+
+def enqueue_notifications(payloads, kind=NotificationOutbox.KIND_RIDE):
+    """Bulk variant of enqueue_notification; non-dict payloads are skipped."""
+    rows = [NotificationOutbox(kind=kind, payload=p) for p in (payloads or []) if isinstance(p, dict)]
+    if rows:
+        NotificationOutbox.objects.bulk_create(rows)
+        _deliver_after_commit([r.id for r in rows if r.id is not None])
+    return rows
+
+
+def _deliver_after_commit(ids):
+    if ids and getattr(settings, 'NOTIFICATION_OUTBOX_DELIVER_ON_COMMIT', True):
+        transaction.on_commit(partial(deliver_now, ids))
+
+
+def backoff_seconds(attempts):
+    """Delay before retry number `attempts` + 1: base * 2^(attempts-1), capped."""
+    base = float(getattr(settings, 'NOTIFICATION_OUTBOX_BACKOFF_SECONDS', 30))
+    cap = float(getattr(settings, 'NOTIFICATION_OUTBOX_MAX_BACKOFF_SECONDS', 3600))
+    return min(base * (2 ** max(int(attempts) - 1, 0)), cap)
+
+
+def claim(batch_size=50, ids=None, lease_seconds=None):
+    """Lease up to `batch_size` due PENDING rows in a short transaction.
+
+    Rows are picked with SELECT ... FOR UPDATE SKIP LOCKED, get their attempt
+    counted and next_attempt_at pushed out by the lease, and the transaction
+    commits before anything is sent. Another dispatcher only sees a leased
+    row again once the lease has run out without a recorded result.
+    """
+    if lease_seconds is None:
+        lease_seconds = int(getattr(settings, 'NOTIFICATION_OUTBOX_LEASE_SECONDS', 120))
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=lease_seconds)
+    with transaction.atomic():
+        qs = (
+            NotificationOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=NotificationOutbox.STATUS_PENDING, next_attempt_at__lte=now)
+        )
+        if ids is not None:
+            qs = qs.filter(id__in=ids)
+        rows = list(qs.order_by('next_attempt_at', 'id')[:max(int(batch_size), 1)])
+        if rows:
+            NotificationOutbox.objects.filter(id__in=[r.id for r in rows]).update(
+                attempts=F('attempts') + 1, next_attempt_at=lease_until,
+            )
+    for row in rows:
+        row.attempts += 1
+        row.next_attempt_at = lease_until
+    return rows
+
+
+def record_result(row, error=None, max_attempts=None):
+    """Store the outcome of one leased delivery with a single UPDATE.
+
+    Returns 'sent', 'retried' or 'dead', or None when the row was meanwhile
+    re-claimed under a newer lease (its attempt count moved on).
+    """
+    if max_attempts is None:
+        max_attempts = int(getattr(settings, 'NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 8))
+    qs = NotificationOutbox.objects.filter(
+        pk=row.pk, status=NotificationOutbox.STATUS_PENDING, attempts=row.attempts,
+    )
+    if error is None:
+        outcome = 'sent'
+        updated = qs.update(status=NotificationOutbox.STATUS_SENT, sent_at=timezone.now(), last_error='')
+    elif row.attempts >= max_attempts:
+        outcome = 'dead'
+        updated = qs.update(status=NotificationOutbox.STATUS_DEAD, last_error=str(error)[:1000])
+        if updated:
+            print(f'[record_result] outbox {row.id} dead after {row.attempts} attempts: {error}')
+    else:
+        outcome = 'retried'
+        updated = qs.update(
+            next_attempt_at=timezone.now() + timedelta(seconds=backoff_seconds(row.attempts)),
+            last_error=str(error)[:1000],
+        )
+    return outcome if updated else None
+
+
+def _deliver(session, row, timeout):
+    if row.kind == NotificationOutbox.KIND_RIDE:
+        from ..views_notifications import post_ride_notification
+        post_ride_notification(session, row.payload, timeout=timeout)
+        return
+    raise ValueError(f'unknown outbox kind {row.kind!r}')
+
+
+def deliver_now(ids):
+    """on_commit hook: lease freshly written rows and hand them to the
+    notification pool, whose workers record each result. Rows that cannot be
+    queued keep their lease and are picked up by the dispatcher afterwards."""
+    from ..views_notifications import submit_ride_notification
+
+    try:
+        rows = claim(batch_size=len(ids), ids=ids)
+    except Exception as e:
+        print('[deliver_now][claim_error]:', repr(e))
+        return
+    for row in rows:
+        if row.kind != NotificationOutbox.KIND_RIDE:
+            continue
+        try:
+            submit_ride_notification(row.payload, on_done=partial(_record_from_pool, row))
+        except Exception as e:
+            print('[deliver_now][ERROR]:', repr(e))
+
+
+def _record_from_pool(row, error):
+    # Runs on a pool worker thread, outside any request cycle.
+    close_old_connections()
+    try:
+        record_result(row, error)
+    finally:
+        close_old_connections()
+
+
+def dispatch_batch(session, batch_size=50, max_attempts=None, timeout=10):
+    """Claim up to `batch_size` due rows and try to deliver each once.
+
+    The claim is its own short transaction; delivery happens outside any
+    transaction and each result is recorded separately, so a slow edge
+    function never holds row locks. Failed rows are retried after
+    backoff_seconds(attempts) and moved to DEAD once they have used up
+    `max_attempts`. Delivery is at-least-once: a dispatcher that dies after
+    sending leaves the row to be sent again when its lease runs out.
+    """
+    rows = claim(batch_size=batch_size, lease_seconds=int(batch_size) * timeout + 30)
+    counts = {'claimed': len(rows), 'sent': 0, 'retried': 0, 'dead': 0}
+    for row in rows:
+        error = None
+        try:
+            _deliver(session, row, timeout)
+        except Exception as e:
+            error = str(e) or repr(e)
+        outcome = record_result(row, error, max_attempts=max_attempts)
+        if outcome:
+            counts[outcome] += 1
+    return counts
+
+
+def dispatch_pending(batch_size=None, max_attempts=None, timeout=10, time_budget=None):
+    """Run dispatch_batch until the outbox has no more due rows or
+    `time_budget` seconds have passed. Returns the summed counts."""
+    if batch_size is None:
+        batch_size = int(getattr(settings, 'NOTIFICATION_OUTBOX_BATCH_SIZE', 50))
+    deadline = time.monotonic() + float(time_budget) if time_budget else None
+    totals = {'claimed': 0, 'sent': 0, 'retried': 0, 'dead': 0}
+    with requests.Session() as session:
+        while True:
+            counts = dispatch_batch(session, batch_size=batch_size, max_attempts=max_attempts, timeout=timeout)
+            for key, value in counts.items():
+                totals[key] += value
+            if counts['claimed'] < batch_size:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+    return totals
+
+
+def purge_sent(older_than_days):
+    """Delete SENT rows older than the given number of days; DEAD rows are kept."""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    deleted, _ = NotificationOutbox.objects.filter(
+        status=NotificationOutbox.STATUS_SENT, sent_at__lt=cutoff,
+    ).delete()
+    return deleted
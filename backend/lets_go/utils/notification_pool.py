@@ -0,0 +1,182 @@
+import atexit
+import queue
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+
+DROP_NEWEST = 'newest'
+DROP_OLDEST = 'oldest'
+
+_STOP = object()
+
+
+class NotificationPool:
+    """Process-wide bounded queue of outgoing HTTP notifications.
+
+    A fixed set of daemon workers drains the queue, each reusing one
+    keep-alive requests.Session, so a burst of N notifications costs at most
+    `workers` connections instead of N threads and N TLS handshakes. When the
+    queue is full a submit waits up to `put_timeout` seconds, then applies
+    the drop policy: 'newest' rejects the new job, 'oldest' evicts the job
+    that has waited longest. Pending jobs are drained at interpreter exit for
+    up to `drain_seconds`.
+    """
+
+    def __init__(self, workers=4, max_queue=1000, drop_policy=DROP_NEWEST, put_timeout=0.05, drain_seconds=5.0, timeout=10):
+        self.workers = max(int(workers), 1)
+        self.drop_policy = DROP_OLDEST if drop_policy == DROP_OLDEST else DROP_NEWEST
+        self.put_timeout = max(float(put_timeout), 0.0)
+        self.drain_seconds = max(float(drain_seconds), 0.0)
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max(int(max_queue), 1))
+        self._lock = threading.Lock()
+        self._threads = []
+        self._closed = False
+        self.submitted = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def submit(self, url, payload, headers=None, tag='notification', on_done=None):
+        """Queue a JSON POST. Returns False if the job was dropped.
+
+        on_done(error) runs on the worker after the attempt, with None on a
+        2xx response and a short error text otherwise. It is not called for
+        dropped jobs.
+        """
+        if self._closed:
+            return False
+        self._ensure_workers()
+        job = (url, payload, dict(headers or {}), tag, time.monotonic(), on_done)
+        try:
+            self._queue.put(job, timeout=self.put_timeout)
+        except queue.Full:
+            if self.drop_policy == DROP_OLDEST:
+                try:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                except queue.Empty:
+                    pass
+                try:
+                    self._queue.put_nowait(job)
+                except queue.Full:
+                    return self._drop(tag)
+                self._count_drop(tag)
+            else:
+                return self._drop(tag)
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def _count_drop(self, tag):
+        with self._lock:
+            self.dropped += 1
+            dropped = self.dropped
+        if dropped % 100 == 1:
+            print(f'[NotificationPool][WARN] queue full; dropped={dropped} (last: {tag})')
+
+    def _drop(self, tag):
+        self._count_drop(tag)
+        return False
+
+    def stats(self):
+        with self._lock:
+            done = self.sent + self.failed
+            return {
+                'queue_depth': self._queue.qsize(),
+                'queue_capacity': self._queue.maxsize,
+                'workers': len([t for t in self._threads if t.is_alive()]),
+                'submitted': self.submitted,
+                'sent': self.sent,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'avg_latency_ms': round(self._latency_total / done * 1000.0, 1) if done else None,
+                'max_latency_ms': round(self._latency_max * 1000.0, 1),
+            }
+
+    def drain(self, timeout=None):
+        """Stop accepting jobs and wait for the queue to empty (best effort)."""
+        self._closed = True
+        deadline = time.monotonic() + (self.drain_seconds if timeout is None else float(timeout))
+        for _ in self._threads:
+            try:
+                self._queue.put(_STOP, timeout=max(deadline - time.monotonic(), 0.0))
+            except queue.Full:
+                break
+        for t in self._threads:
+            t.join(max(deadline - time.monotonic(), 0.0))
+        pending = self._queue.qsize()
+        if pending:
+            print(f'[NotificationPool][WARN] exiting with {pending} notifications unsent')
+
+    def _ensure_workers(self):
+        if len(self._threads) >= self.workers and all(t.is_alive() for t in self._threads):
+            return
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._run, name=f'notification-worker-{len(self._threads)}', daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _run(self):
+        with requests.Session() as session:
+            while True:
+                job = self._queue.get()
+                try:
+                    if job is _STOP:
+                        return
+                    self._deliver(session, job)
+                finally:
+                    self._queue.task_done()
+
+    def _deliver(self, session, job):
+        url, payload, headers, tag, enqueued_at, on_done = job
+        ok = False
+        error = None
+        try:
+            resp = session.post(url, headers=headers, json=payload, timeout=self.timeout)
+            ok = 200 <= resp.status_code < 300
+            print(f'[{tag}] status={resp.status_code}, body={resp.text[:200]}')
+            if not ok:
+                error = f'status={resp.status_code}, body={resp.text[:200]}'
+        except Exception as e:
+            print(f'[{tag}][ERROR]:', e)
+            error = str(e) or repr(e)
+        latency = time.monotonic() - enqueued_at
+        with self._lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+        if on_done is not None:
+            try:
+                on_done(error)
+            except Exception as e:
+                print(f'[{tag}][on_done][ERROR]:', repr(e))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_notification_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = NotificationPool(
+                    workers=getattr(settings, 'NOTIFICATION_POOL_WORKERS', 4),
+                    max_queue=getattr(settings, 'NOTIFICATION_QUEUE_SIZE', 1000),
+                    drop_policy=getattr(settings, 'NOTIFICATION_DROP_POLICY', DROP_NEWEST),
+                    drain_seconds=getattr(settings, 'NOTIFICATION_DRAIN_SECONDS', 5.0),
+                )
+                atexit.register(_pool.drain)
+    return _pool
@@ -0,0 +1,70 @@
+from django.conf import settings
+
+from .location_buffer import get_location_buffer
+
+
+# Within this distance of the next stop clients report at the fastest rate so
+# arrival, geofences and ETAs stay sharp.
+NEAR_STOP_M = 1000.0
+STATIONARY_SPEED_MPS = 0.5
+
+
+def _setting(name, default):
+    try:
+        return float(getattr(settings, name, default))
+    except (TypeError, ValueError):
+        return float(default)
+
+
+def _server_load():
+    """0..1 fill level of this process's location write-behind buffer; stays 0
+    when LIVE_LOCATION_WRITE_BEHIND is off and nothing is queued."""
+    try:
+        buf = get_location_buffer()
+        return min(max(buf.stats()['pending'] / float(buf.max_pending), 0.0), 1.0)
+    except Exception:
+        return 0.0
+
+
+def recommend_reporting(trip_status, speed_mps=None, distance_to_stop_m=None, load=None):
+    """Next reporting interval and minimum movement for a live-location client.
+
+    Fixes are spaced by distance rather than time: far from the next stop a
+    point every few hundred meters is enough, but the spacing shrinks so at
+    least two fixes land before the NEAR_STOP_M zone, inside which the client
+    reports at the fastest rate. Parked clients only send a heartbeat. Under
+    write-buffer pressure intervals outside the near-stop zone are stretched
+    by up to 2x. Returns {'next_interval_s', 'min_distance_m'}.
+    """
+    min_s = _setting('LIVE_REPORT_MIN_INTERVAL_SECONDS', 3)
+    max_s = max(_setting('LIVE_REPORT_MAX_INTERVAL_SECONDS', 30), min_s)
+
+    if trip_status != 'IN_PROGRESS':
+        return {'next_interval_s': int(max_s * 2), 'min_distance_m': 0.0}
+
+    try:
+        speed = max(float(speed_mps), 0.0)
+    except (TypeError, ValueError):
+        speed = None
+    near = distance_to_stop_m is not None and float(distance_to_stop_m) <= NEAR_STOP_M
+
+    if near:
+        interval, spacing = min_s, 5.0
+    elif speed is None:
+        interval, spacing = (min_s + max_s) / 2.0, 25.0
+    elif speed < STATIONARY_SPEED_MPS:
+        interval, spacing = max_s, 10.0
+    else:
+        spacing = 400.0
+        if distance_to_stop_m is not None:
+            spacing = min(spacing, (float(distance_to_stop_m) - NEAR_STOP_M) / 2.0)
+        spacing = max(spacing, 25.0)
+        interval = spacing / speed
+
+    if not near:
+        interval *= 1.0 + (_server_load() if load is None else min(max(float(load), 0.0), 1.0))
+    interval = min(max(interval, min_s), max_s)
+    return {
+        'next_interval_s': int(round(interval)),
+        'min_distance_m': round(min(max(spacing / 2.0, 5.0), 200.0), 1),
+    }
@@ -0,0 +1,271 @@
+import math
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict, namedtuple
+
+from .geo import haversine_meters
+
+
+METERS_PER_DEG_LAT = 111320.0
+DEFAULT_CELL_M = 200.0
+DEFAULT_SEARCH_M = 1000.0
+MAX_CACHED_ROUTES = 256
+REVALIDATE_SECONDS = 60.0
+
+# Incremental snapping: look this far behind/ahead of the last known offset
+# before falling back to a grid lookup, and accept a snap within max_snap_m.
+SNAP_BACK_M = 100.0
+SNAP_AHEAD_M = 600.0
+SNAP_MAX_M = 75.0
+
+# distance_m: to the closest point on the route; segment: index i of the
+# segment (vertex i -> i + 1); t: position along that segment in [0, 1];
+# lat/lng: the closest point itself.
+RouteHit = namedtuple('RouteHit', ['distance_m', 'segment', 't', 'lat', 'lng'])
+
+
+class RouteSegmentIndex:
+    """Uniform grid over a route polyline's segments.
+
+    Vertices are projected to an equirectangular plane (meters) for bucketing.
+    Candidate segments are measured in a plane centred on the query point, and
+    the returned distance is the haversine distance to the foot point found
+    there. A lookup only scans the segments in the cells around the point.
+    """
+
+    def __init__(self, points, cell_m=DEFAULT_CELL_M, version=None, source=None, stops=None):
+        self.points = [(float(lat), float(lng)) for lat, lng in points]
+        self.cell_m = float(cell_m)
+        self.version = version
+        self.source = source
+        lat0 = sum(p[0] for p in self.points) / len(self.points) if self.points else 0.0
+        self._kx = math.cos(math.radians(lat0)) * METERS_PER_DEG_LAT
+        self._ky = METERS_PER_DEG_LAT
+        self._xy = [self._to_xy(lat, lng) for lat, lng in self.points]
+        self._cells = defaultdict(list)
+
+        n = len(self._xy)
+        self.segment_count = max(n - 1, 1) if n else 0
+        for i in range(self.segment_count):
+            (x1, y1) = self._xy[i]
+            (x2, y2) = self._xy[min(i + 1, n - 1)]
+            cx1, cy1 = self._cell(min(x1, x2), min(y1, y2))
+            cx2, cy2 = self._cell(max(x1, x2), max(y1, y2))
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    self._cells[(cx, cy)].append(i)
+
+        # Linear referencing: along-route distance (m) at each vertex, and each
+        # stop's offset, projected in stop order so loops cannot send a later
+        # stop back onto an earlier leg.
+        self.cum = [0.0]
+        for i in range(1, n):
+            d = haversine_meters(self.points[i - 1][0], self.points[i - 1][1], self.points[i][0], self.points[i][1])
+            self.cum.append(self.cum[-1] + (d or 0.0))
+        self.length_m = self.cum[-1] if self.cum else 0.0
+        self.stop_offsets = {}
+        first_segment = 0
+        for order, lat, lng in sorted(stops or []):
+            hit = self._nearest_in(lat, lng, range(first_segment, self.segment_count))
+            if hit is None:
+                continue
+            self.stop_offsets[int(order)] = self.offset_of(hit)
+            first_segment = hit.segment
+
+    def _to_xy(self, lat, lng):
+        return (float(lng) * self._kx, float(lat) * self._ky)
+
+    def _cell(self, x, y):
+        return (int(math.floor(x / self.cell_m)), int(math.floor(y / self.cell_m)))
+
+    def _segment_hit(self, i, lat, lng, kx):
+        n = len(self.points)
+        (lat1, lng1), (lat2, lng2) = self.points[i], self.points[min(i + 1, n - 1)]
+        x, y = 0.0, 0.0
+        x1, y1 = (lng1 - lng) * kx, (lat1 - lat) * self._ky
+        x2, y2 = (lng2 - lng) * kx, (lat2 - lat) * self._ky
+        dx, dy = x2 - x1, y2 - y1
+        seg_len2 = dx * dx + dy * dy
+        t = 0.0 if seg_len2 <= 0 else max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / seg_len2))
+        planar = math.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
+        return planar, t
+
+    def _finish(self, lat, lng, i, t):
+        n = len(self.points)
+        (lat1, lng1), (lat2, lng2) = self.points[i], self.points[min(i + 1, n - 1)]
+        flat = lat1 + (lat2 - lat1) * t
+        flng = lng1 + (lng2 - lng1) * t
+        d = haversine_meters(lat, lng, flat, flng)
+        return RouteHit(float(d if d is not None else 0.0), i, t, flat, flng)
+
+    def offset_of(self, hit):
+        """Along-route distance (m) from the route start to a RouteHit."""
+        i = hit.segment
+        j = min(i + 1, len(self.cum) - 1)
+        return self.cum[i] + (self.cum[j] - self.cum[i]) * hit.t
+
+    def _nearest_in(self, lat, lng, segments):
+        try:
+            lat, lng = float(lat), float(lng)
+        except (TypeError, ValueError):
+            return None
+        kx = math.cos(math.radians(lat)) * METERS_PER_DEG_LAT
+        best = None
+        for i in segments:
+            planar, t = self._segment_hit(i, lat, lng, kx)
+            if best is None or planar < best[0]:
+                best = (planar, i, t)
+        return None if best is None else self._finish(lat, lng, best[1], best[2])
+
+    def locate(self, lat, lng, last_offset=None):
+        """Snap a position to the route: (RouteHit, offset_m), or (None, None).
+
+        With last_offset (the previous fix's offset) only segments in a short
+        window around it are examined, so consecutive pings cost O(1); the
+        grid lookup is used on the first fix or when the snap is poor.
+        """
+        if not self.points:
+            return None, None
+        if last_offset is not None and self.segment_count:
+            try:
+                last_offset = float(last_offset)
+                lo = max(bisect_right(self.cum, last_offset - SNAP_BACK_M) - 1, 0)
+                hi = min(bisect_right(self.cum, last_offset + SNAP_AHEAD_M), self.segment_count)
+                hit = self._nearest_in(lat, lng, range(lo, max(hi, lo + 1)))
+                if hit is not None and hit.distance_m <= SNAP_MAX_M:
+                    return hit, self.offset_of(hit)
+            except (TypeError, ValueError):
+                pass
+        hit = self.nearest(lat, lng)
+        if hit is None:
+            return None, None
+        return hit, self.offset_of(hit)
+
+    def remaining_to_stop(self, offset_m, stop_order):
+        """Along-route meters from offset_m to a stop (0 once passed), or None."""
+        target = self.stop_offsets.get(int(stop_order)) if stop_order is not None else None
+        if target is None or offset_m is None:
+            return None
+        return max(float(target) - float(offset_m), 0.0)
+
+    def nearest(self, lat, lng, search_m=DEFAULT_SEARCH_M):
+        """Closest point on the route, as a RouteHit (None for an empty route).
+
+        Grid rings are scanned outward up to search_m; if nothing is that
+        close (the vehicle is far off-route) all segments are scanned.
+        """
+        if not self._xy:
+            return None
+        try:
+            lat, lng = float(lat), float(lng)
+        except (TypeError, ValueError):
+            return None
+        x, y = self._to_xy(lat, lng)
+        kx = math.cos(math.radians(lat)) * METERS_PER_DEG_LAT
+        cx, cy = self._cell(x, y)
+        max_ring = int(math.ceil(float(search_m) / self.cell_m)) + 1
+
+        best = None
+        seen = set()
+        for ring in range(max_ring + 1):
+            for gx in range(cx - ring, cx + ring + 1):
+                for gy in range(cy - ring, cy + ring + 1):
+                    if ring and abs(gx - cx) != ring and abs(gy - cy) != ring:
+                        continue
+                    for i in self._cells.get((gx, gy), ()):
+                        if i in seen:
+                            continue
+                        seen.add(i)
+                        planar, t = self._segment_hit(i, lat, lng, kx)
+                        if best is None or planar < best[0]:
+                            best = (planar, i, t)
+            # Anything in a farther ring is at least ring * cell_m away (in grid
+            # meters; the margin covers the grid's fixed longitude scale).
+            if best is not None and best[0] <= ring * self.cell_m * 0.9:
+                break
+
+        if best is None or best[0] > max_ring * self.cell_m * 0.9:
+            for i in range(self.segment_count):
+                planar, t = self._segment_hit(i, lat, lng, kx)
+                if best is None or planar < best[0]:
+                    best = (planar, i, t)
+        return self._finish(lat, lng, best[1], best[2])
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _load_route_points(route_id):
+    from ..models import Route, RouteStop
+
+    row = Route.objects.filter(id=route_id).values('updated_at', 'route_geometry').first()
+    if row is None:
+        return None, None, None, None
+    stops = [
+        (int(order), float(lat), float(lng))
+        for order, lat, lng in (
+            RouteStop.objects
+            .filter(route_id=route_id, latitude__isnull=False, longitude__isnull=False)
+            .order_by('stop_order')
+            .values_list('stop_order', 'latitude', 'longitude')
+        )
+    ]
+    points = []
+    geom = row.get('route_geometry')
+    if isinstance(geom, list):
+        for p in geom:
+            if isinstance(p, dict) and p.get('lat') is not None and p.get('lng') is not None:
+                try:
+                    points.append((float(p['lat']), float(p['lng'])))
+                except (TypeError, ValueError):
+                    continue
+    source = 'geometry'
+    if not points:
+        source = 'stops'
+        points = [(lat, lng) for _, lat, lng in stops]
+    return row.get('updated_at'), points, source, stops
+
+
+def get_route_index(route_id):
+    """Cached RouteSegmentIndex for a route (route_geometry, else its stops),
+    with the route's stops projected to along-route offsets.
+
+    Entries are rebuilt when Route.updated_at changes; that is re-checked at
+    most every REVALIDATE_SECONDS, and signals drop entries immediately.
+    """
+    from ..models import Route
+
+    if route_id is None:
+        return None
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(route_id)
+        if entry is not None:
+            _cache.move_to_end(route_id)
+    if entry is not None:
+        index, checked_at = entry
+        if now - checked_at < REVALIDATE_SECONDS:
+            return index
+        version = Route.objects.filter(id=route_id).values_list('updated_at', flat=True).first()
+        if version == index.version:
+            with _cache_lock:
+                _cache[route_id] = (index, now)
+            return index
+
+    version, points, source, stops = _load_route_points(route_id)
+    if not points:
+        return None
+    index = RouteSegmentIndex(points, version=version, source=source, stops=stops)
+    with _cache_lock:
+        _cache[route_id] = (index, now)
+        _cache.move_to_end(route_id)
+        while len(_cache) > MAX_CACHED_ROUTES:
+            _cache.popitem(last=False)
+    return index
+
+
+def invalidate_route_index(route_id):
+    with _cache_lock:
+        _cache.pop(route_id, None)
@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from ..models import SosShareToken, TripShareToken
+
+
+# Public share links are polled by every viewer every few seconds. Token
+# checks are cached until the token expires (capped by
+# SHARE_TOKEN_CACHE_SECONDS) and dropped by the post_save/post_delete
+# receivers in lets_go/signals.py on revocation; the rendered live snapshot
+# is cached per trip for SHARE_SNAPSHOT_CACHE_SECONDS so N viewers cost one
+# rebuild per interval.
+SHARE_TOKEN_CACHE_PREFIX = 'share_token'
+SHARE_SNAPSHOT_CACHE_PREFIX = 'share_snapshot'
+UNKNOWN_TOKEN_CACHE_SECONDS = 60
+# Without a shared cache a revocation only clears the entry in the process
+# that saved the token, so other workers may serve it for this long.
+LOCAL_TOKEN_CACHE_SECONDS = 5
+
+
+def _setting(name, default):
+    try:
+        return max(float(getattr(settings, name, default)), 0.0)
+    except (TypeError, ValueError):
+        return float(default)
+
+
+def _cache_is_shared():
+    backend = (getattr(settings, 'CACHES', {}).get('default') or {}).get('BACKEND', '')
+    return not backend.endswith(('LocMemCache', 'DummyCache'))
+
+
+def _token_cache_key(kind, token):
+    return f'{SHARE_TOKEN_CACHE_PREFIX}:{kind}:{token}'
+
+
+def invalidate_share_access(kind, token):
+    if not token:
+        return
+    try:
+        cache.delete(_token_cache_key(kind, token))
+    except Exception as e:
+        print('[invalidate_share_access][WARN]:', repr(e))
+
+
+def _load_share_access(kind, token):
+    if kind == 'trip':
+        row = (
+            TripShareToken.objects.filter(token=token)
+            .values('trip_id', 'trip__trip_id', 'role', 'booking_id', 'expires_at', 'revoked_at')
+            .first()
+        )
+        if row is None:
+            return None
+        return {
+            'trip_pk': row['trip_id'],
+            'trip_id': row['trip__trip_id'],
+            'role': (row['role'] or '').strip().lower(),
+            'booking_id': row['booking_id'],
+            'incident_id': None,
+            'expires_at': row['expires_at'].timestamp() if row['expires_at'] else None,
+            'revoked': row['revoked_at'] is not None,
+        }
+    row = (
+        SosShareToken.objects.filter(token=token)
+        .values(
+            'incident_id', 'incident__trip_id', 'incident__trip__trip_id',
+            'incident__role', 'incident__booking_id', 'expires_at', 'revoked_at',
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    return {
+        'trip_pk': row['incident__trip_id'],
+        'trip_id': row['incident__trip__trip_id'],
+        'role': (row['incident__role'] or '').strip().lower(),
+        'booking_id': row['incident__booking_id'],
+        'incident_id': row['incident_id'],
+        'expires_at': row['expires_at'].timestamp() if row['expires_at'] else None,
+        'revoked': row['revoked_at'] is not None,
+    }
+
+
+def get_share_access(kind, token):
+    """What an active share token (kind 'trip' or 'sos') grants, or None.
+
+    Returns {'trip_pk', 'trip_id', 'role', 'booking_id', 'incident_id'} plus
+    the token's expiry, with the same rules as the models' is_active().
+    """
+    token = (token or '').strip()
+    if not token:
+        return None
+    key = _token_cache_key(kind, token)
+    access = cache.get(key)
+    if access is None:
+        access = _load_share_access(kind, token) or {'unknown': True}
+        if access.get('unknown') or access['revoked']:
+            ttl = UNKNOWN_TOKEN_CACHE_SECONDS
+        else:
+            ttl = _setting('SHARE_TOKEN_CACHE_SECONDS', 3600)
+            if access['expires_at'] is not None:
+                ttl = min(ttl, access['expires_at'] - timezone.now().timestamp())
+        if not _cache_is_shared():
+            ttl = min(ttl, LOCAL_TOKEN_CACHE_SECONDS)
+        if ttl >= 1:
+            cache.set(key, access, timeout=int(ttl))
+
+    if access.get('unknown') or access['revoked']:
+        return None
+    if access['expires_at'] is not None and timezone.now().timestamp() >= access['expires_at']:
+        return None
+    return access
+
+
+def cached_share_snapshot(trip_pk, role, booking_id, build):
+    """build() for (trip, role, booking) at most once per
+    SHARE_SNAPSHOT_CACHE_SECONDS; concurrent viewers share the result."""
+    ttl = _setting('SHARE_SNAPSHOT_CACHE_SECONDS', 1)
+    if not ttl:
+        return build()
+    key = f'{SHARE_SNAPSHOT_CACHE_PREFIX}:{trip_pk}:{role}:{booking_id or 0}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build()
+        # Memcached/Redis timeouts are whole seconds; round sub-second values up.
+        cache.set(key, snapshot, timeout=max(int(round(ttl)), 1))
+    return snapshot
@@ -0,0 +1,218 @@
+import mmap
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from .trajectory import load_trip_tracks
+
+
+# Track archive format (all integers are LEB128 varints; signed ones zigzag):
+#   b'LGT1' | track_count
+#   per track: len(role) role | user_id+1 | booking_id+1 | point_count
+#              lat0 lng0 t0 | (dlat dlng dt) * (point_count - 1)
+# Coordinates are micro-degrees (~0.1 m), times are deciseconds since epoch.
+MAGIC = b'LGT1'
+COORD_SCALE = 1_000_000
+TIME_SCALE = 10
+
+
+def _put_varint(buf, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            buf.append(byte | 0x80)
+        else:
+            buf.append(byte)
+            return
+
+
+def _put_signed(buf, value):
+    _put_varint(buf, (value << 1) ^ (value >> 63))
+
+
+def _get_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _get_signed(data, pos):
+    value, pos = _get_varint(data, pos)
+    return (value >> 1) ^ -(value & 1), pos
+
+
+def _epoch_ds(ts):
+    if isinstance(ts, datetime):
+        ts = ts.timestamp()
+    return int(round(float(ts) * TIME_SCALE))
+
+
+def encode_tracks(tracks):
+    """Encode load_trip_tracks()-style tracks into the compact archive format."""
+    buf = bytearray(MAGIC)
+    tracks = [t for t in tracks if t.get('points')]
+    _put_varint(buf, len(tracks))
+    for track in tracks:
+        role = (track.get('role') or '').encode('ascii', 'replace')
+        _put_varint(buf, len(role))
+        buf.extend(role)
+        for key in ('user_id', 'booking_id'):
+            _put_varint(buf, 0 if track.get(key) is None else int(track[key]) + 1)
+        points = track['points']
+        _put_varint(buf, len(points))
+        prev = (0, 0, 0)
+        for lat, lng, ts in points:
+            cur = (int(round(float(lat) * COORD_SCALE)), int(round(float(lng) * COORD_SCALE)), _epoch_ds(ts))
+            for c, p in zip(cur, prev):
+                _put_signed(buf, c - p)
+            prev = cur
+    return bytes(buf)
+
+
+def iter_tracks(data):
+    """Decode an archive (bytes, memoryview or mmap) one track at a time:
+    yields {'role', 'user_id', 'booking_id', 'points': [(lat, lng, epoch_s), ...]}."""
+    if bytes(data[:4]) != MAGIC:
+        raise ValueError('Not a track archive')
+    pos = 4
+    count, pos = _get_varint(data, pos)
+    for _ in range(count):
+        n, pos = _get_varint(data, pos)
+        role = bytes(data[pos:pos + n]).decode('ascii')
+        pos += n
+        user_id, pos = _get_varint(data, pos)
+        booking_id, pos = _get_varint(data, pos)
+        n, pos = _get_varint(data, pos)
+        lat = lng = t = 0
+        points = []
+        for _ in range(n):
+            d, pos = _get_signed(data, pos)
+            lat += d
+            d, pos = _get_signed(data, pos)
+            lng += d
+            d, pos = _get_signed(data, pos)
+            t += d
+            points.append((lat / COORD_SCALE, lng / COORD_SCALE, t / TIME_SCALE))
+        yield {
+            'role': role,
+            'user_id': user_id - 1 if user_id else None,
+            'booking_id': booking_id - 1 if booking_id else None,
+            'points': points,
+        }
+
+
+def _archive_dir():
+    return (getattr(settings, 'TRACK_ARCHIVE_DIR', '') or '').strip()
+
+
+def _write_file(trip_pk, blob):
+    """Write the blob under TRACK_ARCHIVE_DIR atomically; returns its relative name."""
+    rel = os.path.join(str(int(trip_pk) // 1000), f'{int(trip_pk)}.trk')
+    path = os.path.join(_archive_dir(), rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fh:
+        fh.write(blob)
+    os.replace(tmp, path)
+    return rel
+
+
+@contextmanager
+def open_archive_data(archive):
+    """Archive bytes: memory-mapped from TRACK_ARCHIVE_DIR for file-backed
+    archives, so replays do not read whole blobs into memory."""
+    if archive.file_name:
+        with open(os.path.join(_archive_dir(), archive.file_name), 'rb') as fh:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield mm
+    else:
+        yield memoryview(bytes(archive.data or b''))
+
+
+def archive_trip(trip):
+    """Create or replace the TripTrackArchive of a finished trip."""
+    from ..models import TripTrackArchive
+
+    tracks = load_trip_tracks(trip.pk)
+    blob = encode_tracks(tracks)
+    fields = {
+        'byte_size': len(blob),
+        'track_count': sum(1 for t in tracks if t.get('points')),
+        'point_count': sum(len(t.get('points') or []) for t in tracks),
+        'trip_completed_at': trip.completed_at,
+        'data': None,
+        'file_name': '',
+    }
+    if _archive_dir():
+        fields['file_name'] = _write_file(trip.pk, blob)
+    else:
+        fields['data'] = blob
+    archive, _ = TripTrackArchive.objects.update_or_create(trip=trip, defaults=fields)
+    return archive
+
+
+def archive_completed_trips(limit=200, settle_minutes=10):
+    """Archive trips completed since the watermark (the newest completed_at
+    already archived). Trips completed in the last settle_minutes are skipped
+    so write-behind location rows have landed. Returns the archives written."""
+    from ..models import Trip, TripTrackArchive
+
+    watermark = TripTrackArchive.objects.aggregate(m=Max('trip_completed_at'))['m']
+    trips = (
+        Trip.objects
+        .filter(trip_status='COMPLETED', completed_at__isnull=False,
+                completed_at__lte=timezone.now() - timedelta(minutes=settle_minutes))
+        .exclude(Exists(TripTrackArchive.objects.filter(trip_id=OuterRef('pk'))))
+        .only('id', 'trip_id', 'completed_at')
+        .order_by('completed_at', 'id')
+    )
+    if watermark is not None:
+        trips = trips.filter(completed_at__gte=watermark)
+    return [archive_trip(trip) for trip in trips[:max(int(limit), 1)]]
+
+
+def replay_tracks(trip, role=None, resolution_s=0.0):
+    """Tracks of a trip for replay, thinned so consecutive points are at least
+    resolution_s seconds apart (first and last point always kept).
+
+    Uses the binary archive when present, else the TripTrajectory/raw rows.
+    Yields ('archive' | 'live', track) pairs with epoch-second timestamps.
+    """
+    from ..models import TripTrackArchive
+
+    archive = TripTrackArchive.objects.filter(trip=trip).first()
+    if archive is not None:
+        source = 'archive'
+        with open_archive_data(archive) as data:
+            tracks = [t for t in iter_tracks(data) if not role or t['role'] == role]
+    else:
+        source = 'live'
+        tracks = []
+        for t in load_trip_tracks(trip.pk, role=role):
+            t['points'] = [(lat, lng, ts.timestamp()) for lat, lng, ts in t['points']]
+            tracks.append(t)
+
+    for track in tracks:
+        points = track['points']
+        if resolution_s and resolution_s > 0 and len(points) > 2:
+            kept = [points[0]]
+            for p in points[1:-1]:
+                if p[2] - kept[-1][2] >= resolution_s:
+                    kept.append(p)
+            kept.append(points[-1])
+            track['points'] = kept
+        yield source, track
+
+
+def epoch_to_iso(epoch_s):
+    return datetime.fromtimestamp(epoch_s, tz=dt_timezone.utc).isoformat()
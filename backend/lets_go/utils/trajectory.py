@@ -0,0 +1,172 @@
+import math
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+
+
+METERS_PER_DEG_LAT = 111320.0
+
+
+def simplify_indices(points, tolerance_m):
+    """Douglas-Peucker over (lat, lng, epoch_seconds) points; returns kept indices.
+
+    Distances are synchronized Euclidean distances: each point is compared
+    with where the object would be at that point's time when moving uniformly
+    between the segment ends. Stops and speed changes therefore survive, and
+    replay timing stays right, not just the drawn shape. Iterative, so long
+    tracks cannot hit the recursion limit.
+    """
+    n = len(points)
+    if n <= 2:
+        return list(range(n))
+    kx = math.cos(math.radians(points[0][0])) * METERS_PER_DEG_LAT
+    xy = [(lng * kx, lat * METERS_PER_DEG_LAT) for lat, lng, _ in points]
+    ts = [p[2] for p in points]
+    tol2 = float(tolerance_m) ** 2
+
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        ax, ay = xy[a]
+        bx, by = xy[b]
+        span = ts[b] - ts[a]
+        worst, worst_i = -1.0, -1
+        for i in range(a + 1, b):
+            f = (ts[i] - ts[a]) / span if span > 0 else 0.5
+            px, py = xy[i]
+            dx = ax + (bx - ax) * f - px
+            dy = ay + (by - ay) * f - py
+            d2 = dx * dx + dy * dy
+            if d2 > worst:
+                worst, worst_i = d2, i
+        if worst > tol2:
+            keep[worst_i] = True
+            stack.append((a, worst_i))
+            stack.append((worst_i, b))
+    return [i for i in range(n) if keep[i]]
+
+
+def _track_groups(trip_pk):
+    """Raw rows of a trip grouped per participant, oldest first."""
+    from ..models import TripLiveLocationUpdate
+
+    rows = (
+        TripLiveLocationUpdate.objects
+        .filter(trip_id=trip_pk)
+        .order_by('role', 'user_id', 'booking_id', 'recorded_at', 'id')
+        .values_list('role', 'user_id', 'booking_id', 'latitude', 'longitude', 'recorded_at')
+        .iterator(chunk_size=2000)
+    )
+    for key, group in groupby(rows, key=lambda r: (r[0], r[1], r[2])):
+        yield key, [(float(r[3]), float(r[4]), r[5]) for r in group]
+
+
+def archive_trip_trajectories(trip_pk, tolerance_m=None):
+    """Build simplified TripTrajectory rows from the trip's raw
+    TripLiveLocationUpdate rows. Returns (raw_points, kept_points).
+
+    A participant that already has a trajectory (late rows arriving after an
+    earlier run) gets the stored points merged with the new raw ones and
+    simplified again; trajectories without new raw rows are left alone.
+    """
+    from ..models import TripTrajectory
+
+    if tolerance_m is None:
+        tolerance_m = float(getattr(settings, 'TRAJECTORY_TOLERANCE_M', 10.0))
+    existing = {
+        (t.role, t.user_id, t.booking_id): t
+        for t in TripTrajectory.objects.filter(trip_id=trip_pk)
+    }
+    trajectories = []
+    replaced = []
+    raw_total = kept_total = 0
+    for key, track in _track_groups(trip_pk):
+        role, user_id, booking_id = key
+        raw_count = len(track)
+        previous = existing.get(key)
+        if previous is not None:
+            replaced.append(previous.pk)
+            raw_count += previous.raw_point_count
+            track = sorted(
+                track + [
+                    (p[0], p[1], previous.started_at + timedelta(seconds=p[2]))
+                    for p in (previous.points or [])
+                ],
+                key=lambda p: p[2],
+            )
+        started_at = track[0][2]
+        points = [(lat, lng, (ts - started_at).total_seconds()) for lat, lng, ts in track]
+        kept = [points[i] for i in simplify_indices(points, tolerance_m)]
+        trajectories.append(TripTrajectory(
+            trip_id=trip_pk,
+            user_id=user_id,
+            booking_id=booking_id,
+            role=role,
+            started_at=started_at,
+            ended_at=track[-1][2],
+            points=[[round(lat, 6), round(lng, 6), round(t, 1)] for lat, lng, t in kept],
+            raw_point_count=raw_count,
+            tolerance_m=tolerance_m,
+        ))
+        raw_total += len(points)
+        kept_total += len(kept)
+
+    with transaction.atomic():
+        if replaced:
+            TripTrajectory.objects.filter(pk__in=replaced).delete()
+        TripTrajectory.objects.bulk_create(trajectories)
+    return raw_total, kept_total
+
+
+def delete_raw_locations(trip_pk, batch_size=5000):
+    """Delete a trip's TripLiveLocationUpdate rows in bounded batches so no
+    single statement holds locks or bloats WAL for long. Returns rows deleted."""
+    from ..models import TripLiveLocationUpdate
+
+    deleted = 0
+    while True:
+        ids = list(
+            TripLiveLocationUpdate.objects
+            .filter(trip_id=trip_pk)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        TripLiveLocationUpdate.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+
+def load_trip_tracks(trip_pk, role=None):
+    """Tracks of a trip for replay, one dict per participant:
+    {'role', 'user_id', 'booking_id', 'points': [(lat, lng, datetime), ...]}.
+
+    Reads the compact TripTrajectory rows when the trip has been archived and
+    the raw TripLiveLocationUpdate rows otherwise.
+    """
+    from ..models import TripTrajectory
+
+    qs = TripTrajectory.objects.filter(trip_id=trip_pk)
+    if role:
+        qs = qs.filter(role=role)
+    tracks = [
+        {
+            'role': t.role,
+            'user_id': t.user_id,
+            'booking_id': t.booking_id,
+            'points': [(p[0], p[1], t.started_at + timedelta(seconds=p[2])) for p in (t.points or [])],
+        }
+        for t in qs
+    ]
+    if tracks:
+        return tracks
+    return [
+        {'role': r, 'user_id': u, 'booking_id': b, 'points': track}
+        for (r, u, b), track in _track_groups(trip_pk)
+        if not role or r == role
+    ]
@@ -1,16 +1,102 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.http import JsonResponse
 
 from lets_go.models import UsersData, Vehicle, ChangeRequest
 
 
-def verification_block_response(user_id):
+# Gate decisions are cached per user and dropped by the post_save/post_delete
+# receivers in lets_go/signals.py whenever the inputs change.
+GATE_CACHE_PREFIX = 'verification_gate'
+
+_PROFILE_KEYS = ['name', 'address', 'email', 'phone_no', 'phone_number']
+_GENDER_KEYS = ['gender']
+_CNIC_KEYS = [
+    'cnic_no', 'cnic',
+    'cnic_front_image_url', 'cnic_back_image_url',
+    'cnic_front_image', 'cnic_back_image',
+    'cnic_front', 'cnic_back',
+]
+_LICENSE_KEYS = [
+    'driving_license_no',
+    'driving_license_front_url', 'driving_license_back_url',
+    'driving_license_front', 'driving_license_back',
+]
+
+
+def _gate_cache_key(user_id):
+    return f'{GATE_CACHE_PREFIX}:{user_id}'
+
+
+def _gate_cache_ttl():
+    try:
+        return max(int(getattr(settings, 'VERIFICATION_GATE_CACHE_SECONDS', 60)), 0)
+    except (TypeError, ValueError):
+        return 60
+
+
+def invalidate_verification_gate(user_id):
+    if user_id is None:
+        return
+    try:
+        cache.delete(_gate_cache_key(int(user_id)))
+    except Exception as e:
+        print('[invalidate_verification_gate][WARN]:', repr(e))
+
+
+def _compute_gate_state(user_id):
+    """Returns (state, cacheable). A failed pending-request scan is not cached."""
     try:
         user = UsersData.objects.only('id', 'status').get(id=user_id)
     except UsersData.DoesNotExist:
+        return {'exists': False}, True
+
+    state = {
+        'exists': True,
+        'banned': (getattr(user, 'status', None) or '').strip().upper() == 'BANNED',
+        'pending_profile': False,
+        'pending_license': False,
+    }
+    try:
+        pending = list(_pending_user_profile_change_requests(user_id))
+        state['pending_profile'] = _has_any_requested_keys(pending, _PROFILE_KEYS + _GENDER_KEYS + _CNIC_KEYS)
+        state['pending_license'] = _has_any_requested_keys(pending, _LICENSE_KEYS)
+    except Exception:
+        return state, False
+    return state, True
+
+
+def get_verification_gate_state(user_id):
+    """Cached {exists, banned, pending_profile, pending_license} for a user."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return {'exists': False}
+
+    key = _gate_cache_key(user_id)
+    try:
+        state = cache.get(key)
+    except Exception:
+        state = None
+    if state is not None:
+        return state
+
+    state, cacheable = _compute_gate_state(user_id)
+    ttl = _gate_cache_ttl()
+    if cacheable and ttl:
+        try:
+            cache.set(key, state, timeout=ttl)
+        except Exception:
+            pass
+    return state
+
+
+def verification_block_response(user_id):
+    state = get_verification_gate_state(user_id)
+    if not state.get('exists'):
         return JsonResponse({'success': False, 'error': 'User not found'}, status=404)
 
-    status = (getattr(user, 'status', None) or '').strip().upper()
-    if status == 'BANNED':
+    if state.get('banned'):
         return JsonResponse(
             {
                 'success': False,
@@ -59,31 +145,16 @@ def ride_booking_block_response(user_id):
     if blocked is not None:
         return blocked
 
-    try:
-        pending = list(_pending_user_profile_change_requests(user_id))
-
-        has_pending_gender = _has_any_requested_keys(pending, ['gender'])
-        has_pending_user_data = _has_any_requested_keys(pending, [
-            'name', 'address', 'email', 'phone_no', 'phone_number',
-        ])
-        has_pending_cnic = _has_any_requested_keys(pending, [
-            'cnic_no', 'cnic',
-            'cnic_front_image_url', 'cnic_back_image_url',
-            'cnic_front_image', 'cnic_back_image',
-            'cnic_front', 'cnic_back',
-        ])
-
-        if has_pending_user_data or has_pending_cnic or has_pending_gender:
-            return JsonResponse(
-                {
-                    'success': False,
-                    'error': 'Your profile verification is pending (CNIC/Gender/Profile info). Please wait for admin verification before booking rides.',
-                    'code': 'VERIFICATION_PENDING',
-                },
-                status=403,
-            )
-    except Exception:
-        pass
+    state = get_verification_gate_state(user_id)
+    if state.get('pending_profile'):
+        return JsonResponse(
+            {
+                'success': False,
+                'error': 'Your profile verification is pending (CNIC/Gender/Profile info). Please wait for admin verification before booking rides.',
+                'code': 'VERIFICATION_PENDING',
+            },
+            status=403,
+        )
 
     return None
 
@@ -98,45 +169,25 @@ def ride_create_block_response(user_id):
     if blocked is not None:
         return blocked
 
-    try:
-        pending = list(_pending_user_profile_change_requests(user_id))
+    state = get_verification_gate_state(user_id)
+    if state.get('pending_profile'):
+        return JsonResponse(
+            {
+                'success': False,
+                'error': 'Your profile verification is pending (CNIC/Gender/Profile info). Please wait for admin verification before creating rides.',
+                'code': 'VERIFICATION_PENDING',
+            },
+            status=403,
+        )
 
-        has_pending_gender = _has_any_requested_keys(pending, ['gender'])
-        has_pending_user_data = _has_any_requested_keys(pending, [
-            'name', 'address', 'email', 'phone_no', 'phone_number',
-        ])
-        has_pending_cnic = _has_any_requested_keys(pending, [
-            'cnic_no', 'cnic',
-            'cnic_front_image_url', 'cnic_back_image_url',
-            'cnic_front_image', 'cnic_back_image',
-            'cnic_front', 'cnic_back',
-        ])
-        has_pending_license = _has_any_requested_keys(pending, [
-            'driving_license_no',
-            'driving_license_front_url', 'driving_license_back_url',
-            'driving_license_front', 'driving_license_back',
-        ])
-
-        if has_pending_user_data or has_pending_cnic or has_pending_gender:
-            return JsonResponse(
-                {
-                    'success': False,
-                    'error': 'Your profile verification is pending (CNIC/Gender/Profile info). Please wait for admin verification before creating rides.',
-                    'code': 'VERIFICATION_PENDING',
-                },
-                status=403,
-            )
-
-        if has_pending_license:
-            return JsonResponse(
-                {
-                    'success': False,
-                    'error': 'Driving license verification is pending. You can book rides, but you cannot create rides until it is verified.',
-                    'code': 'DRIVING_LICENSE_PENDING',
-                },
-                status=403,
-            )
-    except Exception:
-        pass
+    if state.get('pending_license'):
+        return JsonResponse(
+            {
+                'success': False,
+                'error': 'Driving license verification is pending. You can book rides, but you cannot create rides until it is verified.',
+                'code': 'DRIVING_LICENSE_PENDING',
+            },
+            status=403,
+        )
 
     return None
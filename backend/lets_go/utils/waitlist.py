@@ -0,0 +1,191 @@
+import random
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import Trip, Booking, BookingWaitlistEntry
+from .blocking import get_blocked_user_ids
+from .notification_outbox import enqueue_notifications
+
+
+MAX_PROMOTIONS_PER_RELEASE = 20
+
+
+def join_waitlist(trip, passenger, from_stop, to_stop, number_of_seats, male_seats=0, female_seats=0,
+                  original_fare=None, proposed_fare=None, is_negotiated=False, special_requests=None):
+    """Queue a passenger on a full trip. Returns (entry, position) with 1-based position.
+
+    A passenger has at most one WAITING entry per trip; joining again refreshes
+    the request details but keeps the original place in the queue.
+    """
+    entry = (
+        BookingWaitlistEntry.objects
+        .filter(trip_id=trip.id, passenger_id=passenger.id, status=BookingWaitlistEntry.STATUS_WAITING)
+        .first()
+    )
+    fields = {
+        'from_stop': from_stop,
+        'to_stop': to_stop,
+        'number_of_seats': int(number_of_seats or 1),
+        'male_seats': int(male_seats or 0),
+        'female_seats': int(female_seats or 0),
+        'original_fare': original_fare,
+        'proposed_fare': proposed_fare,
+        'is_negotiated': bool(is_negotiated),
+        'special_requests': special_requests or None,
+    }
+    if entry is None:
+        entry = BookingWaitlistEntry.objects.create(trip=trip, passenger=passenger, **fields)
+    else:
+        for k, v in fields.items():
+            setattr(entry, k, v)
+        entry.save(update_fields=list(fields.keys()))
+    return entry, waitlist_position(entry)
+
+
+def waitlist_position(entry):
+    return (
+        BookingWaitlistEntry.objects
+        .filter(trip_id=entry.trip_id, status=BookingWaitlistEntry.STATUS_WAITING, id__lte=entry.id)
+        .count()
+    )
+
+
+def _promotion_payloads(trip, booking, passenger):
+    common = {
+        'trip_id': str(trip.trip_id),
+        'booking_id': str(booking.id),
+        'seats': str(booking.number_of_seats),
+        'from_stop_name': str(getattr(booking.from_stop, 'stop_name', '') or ''),
+        'to_stop_name': str(getattr(booking.to_stop, 'stop_name', '') or ''),
+        'from_stop_order': str(getattr(booking.from_stop, 'stop_order', '') or ''),
+        'to_stop_order': str(getattr(booking.to_stop, 'stop_order', '') or ''),
+    }
+    return [
+        {
+            'user_id': str(passenger.id),
+            'driver_id': str(trip.driver_id),
+            'title': 'A seat opened up',
+            'body': 'You moved off the waitlist; your request was sent to the driver.',
+            'data': dict(common, type='booking_update', action='waitlist_promoted',
+                         sender_id=str(trip.driver_id), sender_role='driver'),
+        },
+        {
+            'user_id': str(trip.driver_id),
+            'driver_id': str(trip.driver_id),
+            'title': 'New ride request',
+            'body': f'Passenger requested {booking.number_of_seats} seat(s) from the waitlist.',
+            'data': dict(common, type='ride_request', source='waitlist',
+                         sender_id=str(passenger.id), sender_name=str(passenger.name or ''),
+                         sender_role='passenger',
+                         sender_photo_url=str(getattr(passenger, 'profile_photo_url', '') or '')),
+        },
+    ]
+
+
+def promote_waitlist(trip_id):
+    """Turn waiting entries into PENDING, seat-holding booking requests.
+
+    Must be called in the same transaction that released the seats: the trip
+    row is locked, entries are taken FIFO (first fit, so a large party at the
+    head does not stall smaller requests behind it) and the seats they hold
+    are subtracted with one conditional update. Notifications are queued in
+    the outbox with the bookings. Returns the bookings that were created.
+    """
+    with transaction.atomic():
+        trip = (
+            Trip.objects
+            .select_for_update()
+            .only('id', 'trip_id', 'driver_id', 'available_seats', 'trip_status')
+            .get(id=trip_id)
+        )
+        waiting = BookingWaitlistEntry.objects.filter(trip_id=trip.id, status=BookingWaitlistEntry.STATUS_WAITING)
+        if trip.trip_status != 'SCHEDULED':
+            waiting.update(status=BookingWaitlistEntry.STATUS_EXPIRED)
+            return []
+
+        seats_left = int(trip.available_seats or 0)
+        if seats_left <= 0:
+            return []
+
+        entries = list(
+            waiting
+            .select_for_update(of=('self',))
+            .select_related('passenger', 'from_stop', 'to_stop')
+            .order_by('created_at', 'id')[:MAX_PROMOTIONS_PER_RELEASE]
+        )
+        if not entries:
+            return []
+
+        blocked_ids = set(get_blocked_user_ids(trip.driver_id))
+        blocked_ids.update(
+            Booking.objects
+            .filter(trip_id=trip.id, blocked=True, passenger_id__in=[e.passenger_id for e in entries])
+            .values_list('passenger_id', flat=True)
+        )
+
+        now = timezone.now()
+        promoted = []
+        payloads = []
+        seats_used = 0
+        for entry in entries:
+            if entry.passenger_id in blocked_ids:
+                entry.status = BookingWaitlistEntry.STATUS_CANCELLED
+                entry.save(update_fields=['status'])
+                continue
+            seats = int(entry.number_of_seats or 1)
+            if seats > seats_left:
+                continue
+
+            original_fare = int(entry.original_fare or 0)
+            if entry.is_negotiated and entry.proposed_fare is not None:
+                final_fare = int(entry.proposed_fare)
+            else:
+                final_fare = original_fare
+
+            booking = Booking.objects.create(
+                booking_id=f"B{random.randint(100, 999)}-{datetime.now().strftime('%Y-%m-%d-%H:%M')}-{entry.passenger_id}",
+                trip_id=trip.id,
+                passenger=entry.passenger,
+                from_stop=entry.from_stop,
+                to_stop=entry.to_stop,
+                number_of_seats=seats,
+                male_seats=entry.male_seats,
+                female_seats=entry.female_seats,
+                total_fare=final_fare * seats,
+                original_fare=original_fare,
+                passenger_offer=entry.proposed_fare,
+                negotiated_fare=None if entry.is_negotiated else final_fare,
+                booking_status='PENDING',
+                bargaining_status='PENDING' if entry.is_negotiated else 'NO_NEGOTIATION',
+                negotiation_notes=entry.special_requests,
+                seats_locked=True,
+            )
+            entry.status = BookingWaitlistEntry.STATUS_PROMOTED
+            entry.booking = booking
+            entry.promoted_at = now
+            entry.save(update_fields=['status', 'booking', 'promoted_at'])
+
+            seats_left -= seats
+            seats_used += seats
+            promoted.append(booking)
+            payloads.extend(_promotion_payloads(trip, booking, entry.passenger))
+            if seats_left <= 0:
+                break
+
+        if seats_used:
+            Trip.objects.filter(id=trip.id).update(available_seats=F('available_seats') - seats_used)
+            print(f"[promote_waitlist] trip={trip.trip_id} promoted={len(promoted)} seats={seats_used}")
+            enqueue_notifications(payloads)
+        return promoted
+
+
+def release_seats_and_promote(trip_id, seats):
+    """Give seats back to a trip and offer them to the waitlist atomically."""
+    seats = int(seats or 0)
+    with transaction.atomic():
+        if seats > 0:
+            Trip.objects.filter(id=trip_id).update(available_seats=F('available_seats') + seats)
+        return promote_waitlist(trip_id)
@@ -7,7 +7,8 @@ import math
 import re
 import difflib
 
-from .models import Trip, RouteStop, TripStopBreakdown, Booking, BlockedUser
+from .models import Trip, RouteStop, TripStopBreakdown, Booking
+from .utils.blocking import get_blocked_user_ids
 
 
 def _to_int(value):
@@ -269,9 +270,9 @@ def all_trips(request):
             if user_id:
                 trips_qs = trips_qs.exclude(driver_id=user_id)
 
-                blocked_driver_ids = BlockedUser.objects.filter(blocker_id=user_id).values_list('blocked_user_id', flat=True)
-                blocked_by_driver_ids = BlockedUser.objects.filter(blocked_user_id=user_id).values_list('blocker_id', flat=True)
-                trips_qs = trips_qs.exclude(driver_id__in=blocked_driver_ids).exclude(driver_id__in=blocked_by_driver_ids)
+                blocked_ids = get_blocked_user_ids(user_id)
+                if blocked_ids:
+                    trips_qs = trips_qs.exclude(driver_id__in=blocked_ids)
 
                 trips_qs = trips_qs.exclude(
                     trip_bookings__passenger_id=user_id,
@@ -394,9 +395,9 @@ def search_trips(request):
         if user_id:
             trips = trips.exclude(driver_id=user_id)
 
-            blocked_driver_ids = BlockedUser.objects.filter(blocker_id=user_id).values_list('blocked_user_id', flat=True)
-            blocked_by_driver_ids = BlockedUser.objects.filter(blocked_user_id=user_id).values_list('blocker_id', flat=True)
-            trips = trips.exclude(driver_id__in=blocked_driver_ids).exclude(driver_id__in=blocked_by_driver_ids)
+            blocked_ids = get_blocked_user_ids(user_id)
+            if blocked_ids:
+                trips = trips.exclude(driver_id__in=blocked_ids)
 
             trips = trips.exclude(
                 trip_bookings__passenger_id=user_id,
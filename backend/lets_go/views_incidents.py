@@ -13,11 +13,14 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 
-from .models.models_trip import Trip, RideAuditEvent
+from .models.models_trip import Trip, RideAuditEvent, trip_json_deferred
 from .models.models_booking import Booking
 from .models.models_userdata import UsersData
 from .models.models_emergency import EmergencyContact
 from .models.models_incident import SosIncident, SosShareToken, TripShareToken
+from .utils.live_store import live_tracking_state_for, parse_path_since, path_since
+from .utils.share_cache import cached_share_snapshot, get_share_access
+from .utils.live_stream import live_event_stream, path_delta, sse_response
 
 
 def _coerce_int(v):
@@ -90,7 +93,11 @@ def _get_share_token(token: str):
     if not token:
         return None
     try:
-        return SosShareToken.objects.select_related('incident', 'incident__trip', 'incident__booking').get(token=token)
+        return (
+            SosShareToken.objects.select_related('incident', 'incident__trip', 'incident__booking')
+            .defer(*trip_json_deferred('incident__trip__'))
+            .get(token=token)
+        )
     except SosShareToken.DoesNotExist:
         return None
 
@@ -100,11 +107,107 @@ def _get_trip_share_token(token: str):
     if not token:
         return None
     try:
-        return TripShareToken.objects.select_related('trip', 'booking').get(token=token)
+        return TripShareToken.objects.select_related('trip', 'booking').defer(*trip_json_deferred()).get(token=token)
     except TripShareToken.DoesNotExist:
         return None
 
 
+# Driver path points kept in the cached share snapshot; enough for viewers'
+# `since` deltas, while full refreshes still send only the last 300.
+SHARE_PATH_TAIL_POINTS = 600
+
+
+def _build_share_snapshot(trip_pk, role, booking_id):
+    """Actor position and recent driver path for a share link, before any
+    per-viewer `since` filtering. Cached per trip by cached_share_snapshot."""
+    trip = Trip.objects.only('id').get(pk=trip_pk)
+    live_state = live_tracking_state_for(trip)
+    actor = None
+    path = None
+
+    if isinstance(live_state, dict):
+        dp = live_state.get('driver_path')
+        if isinstance(dp, list):
+            path = []
+            for p in dp[-SHARE_PATH_TAIL_POINTS:]:
+                if not isinstance(p, dict):
+                    continue
+                if p.get('lat') is None or p.get('lng') is None:
+                    continue
+                try:
+                    point = {'lat': float(p.get('lat')), 'lng': float(p.get('lng')), 'timestamp': p.get('timestamp')}
+                except (TypeError, ValueError):
+                    continue
+                if p.get('seq') is not None:
+                    point['seq'] = p.get('seq')
+                path.append(point)
+
+        if role == 'driver':
+            candidates = [live_state.get('driver')]
+        else:
+            passengers = live_state.get('passengers')
+            candidates = passengers if (booking_id is not None and isinstance(passengers, list)) else []
+        for p in candidates:
+            if not isinstance(p, dict):
+                continue
+            if role != 'driver' and p.get('booking_id') != booking_id:
+                continue
+            if p.get('lat') is not None and p.get('lng') is not None:
+                actor = {
+                    'lat': float(p.get('lat')),
+                    'lng': float(p.get('lng')),
+                    'speed': _coerce_float(p.get('speed')),
+                    'timestamp': p.get('timestamp'),
+                }
+                break
+
+    return {'actor': actor, 'driver_path': path}
+
+
+def _share_live_payload(trip_pk, role, booking_id, since=None):
+    """Live position of the shared actor (driver, or the passenger of
+    booking_id) plus the driver path, as served to share-link viewers.
+
+    since (a path seq or datetime) limits driver_path to newer points.
+    """
+    snapshot = cached_share_snapshot(trip_pk, role, booking_id, lambda: _build_share_snapshot(trip_pk, role, booking_id))
+    actor = snapshot.get('actor')
+    driver_path = None
+    path_mode = 'replace'
+    path_seq = None
+
+    if isinstance(snapshot.get('driver_path'), list):
+        tail, path_mode, path_seq = path_since(snapshot['driver_path'], since)
+        if path_mode == 'replace' and len(tail) > 300:
+            tail = tail[-300:]
+        driver_path = [{k: v for k, v in p.items() if k != 'timestamp'} for p in tail]
+
+    speed_kph = None
+    last_seen_seconds = None
+    if actor is not None:
+        if actor.get('speed') is not None:
+            speed_kph = float(actor.get('speed')) * 3.6
+        ts = _parse_iso_dt(actor.get('timestamp'))
+        if ts is not None:
+            try:
+                last_seen_seconds = max(int((timezone.now() - ts).total_seconds()), 0)
+            except Exception:
+                last_seen_seconds = None
+
+    return {
+        'live_state': {
+            'actor': actor,
+            'driver_path': driver_path,
+            'driver_path_mode': path_mode,
+            'driver_path_seq': path_seq,
+        },
+        'runtime': {
+            'last_seen_seconds': last_seen_seconds,
+            'speed_kph': speed_kph,
+        },
+    }
+
+
 def _send_sms(phone_number: str, message: str) -> bool:
     base_url = os.getenv("TEXTBEE_BASE_URL", "https://api.textbee.dev")
     api_key = os.getenv("TEXTBEE_API_KEY", "")
@@ -325,6 +428,9 @@ def trip_share_view(request, token):
         'share_live_url': request.build_absolute_uri(
             reverse('trip_share_live', kwargs={'token': share.token})
         ),
+        'share_stream_url': request.build_absolute_uri(
+            reverse('trip_share_stream', kwargs={'token': share.token})
+        ),
     }
 
     trip_public_data = {
@@ -375,7 +481,7 @@ def trip_share_view(request, token):
 
     driver_path_data = []
     try:
-        st = trip.live_tracking_state or {}
+        st = live_tracking_state_for(trip)
         path = st.get('driver_path') if isinstance(st, dict) else None
         if isinstance(path, list):
             tail = path[-300:] if len(path) > 300 else path
@@ -404,90 +510,30 @@ def trip_share_view(request, token):
 
 @require_http_methods(["GET"])
 def trip_share_live(request, token):
-    share = _get_trip_share_token(token)
-    if share is None or not share.is_active():
+    access = get_share_access('trip', token)
+    if access is None:
         return JsonResponse({'success': False, 'error': 'Invalid or expired link'}, status=404)
 
-    trip = share.trip
-    role = (share.role or '').strip().lower()
-
-    live_state = trip.live_tracking_state or {}
-    actor = None
-    ts = None
-    speed_kph = None
-    driver_path = None
+    payload = _share_live_payload(access['trip_pk'], access['role'], access['booking_id'], since=parse_path_since(request.GET.get('since')))
+    return JsonResponse(dict(payload, success=True, trip_id=access['trip_id']))
 
-    if isinstance(live_state, dict):
-        try:
-            dp = live_state.get('driver_path')
-            if isinstance(dp, list):
-                tail = dp[-300:] if len(dp) > 300 else dp
-                driver_path = []
-                for p in tail:
-                    if not isinstance(p, dict):
-                        continue
-                    if p.get('lat') is None or p.get('lng') is None:
-                        continue
-                    driver_path.append({'lat': float(p.get('lat')), 'lng': float(p.get('lng'))})
-        except Exception:
-            driver_path = None
 
-        if role == 'driver':
-            drv = live_state.get('driver')
-            if isinstance(drv, dict) and drv.get('lat') is not None and drv.get('lng') is not None:
-                actor = {
-                    'lat': float(drv.get('lat')),
-                    'lng': float(drv.get('lng')),
-                    'speed': _coerce_float(drv.get('speed')),
-                    'timestamp': drv.get('timestamp'),
-                }
-                ts = _parse_iso_dt(drv.get('timestamp'))
-                try:
-                    if actor.get('speed') is not None:
-                        speed_kph = float(actor.get('speed')) * 3.6
-                except Exception:
-                    speed_kph = None
-        else:
-            bid = getattr(share, 'booking_id', None)
-            passengers = live_state.get('passengers')
-            if bid is not None and isinstance(passengers, list):
-                for p in passengers:
-                    if not isinstance(p, dict):
-                        continue
-                    if p.get('booking_id') == bid and p.get('lat') is not None and p.get('lng') is not None:
-                        actor = {
-                            'lat': float(p.get('lat')),
-                            'lng': float(p.get('lng')),
-                            'speed': _coerce_float(p.get('speed')),
-                            'timestamp': p.get('timestamp'),
-                        }
-                        ts = _parse_iso_dt(p.get('timestamp'))
-                        try:
-                            if actor.get('speed') is not None:
-                                speed_kph = float(actor.get('speed')) * 3.6
-                        except Exception:
-                            speed_kph = None
-                        break
+@require_http_methods(["GET"])
+def trip_share_stream(request, token):
+    """Server-Sent Events version of trip_share_live."""
+    access = get_share_access('trip', token)
+    if access is None:
+        return JsonResponse({'success': False, 'error': 'Invalid or expired link'}, status=404)
 
-    last_seen_seconds = None
-    if ts is not None:
-        try:
-            last_seen_seconds = max(int((timezone.now() - ts).total_seconds()), 0)
-        except Exception:
-            last_seen_seconds = None
+    def build(cursor):
+        current = get_share_access('trip', token)
+        if current is None:
+            return None
+        payload = _share_live_payload(current['trip_pk'], current['role'], current['booking_id'], since=cursor.get('driver_path'))
+        payload['live_state'] = path_delta(payload['live_state'], cursor)
+        return dict(payload, success=True, trip_id=current['trip_id'])
 
-    return JsonResponse({
-        'success': True,
-        'trip_id': trip.trip_id,
-        'live_state': {
-            'actor': actor,
-            'driver_path': driver_path,
-        },
-        'runtime': {
-            'last_seen_seconds': last_seen_seconds,
-            'speed_kph': speed_kph,
-        },
-    })
+    return sse_response(live_event_stream(access['trip_pk'], build))
 
 
 @require_http_methods(["GET"])
@@ -513,6 +559,9 @@ def sos_share_view(request, token):
         'share_live_url': request.build_absolute_uri(
             reverse('sos_share_live', kwargs={'token': share.token})
         ),
+        'share_stream_url': request.build_absolute_uri(
+            reverse('sos_share_stream', kwargs={'token': share.token})
+        ),
     }
 
     trip_public_data = {
@@ -564,7 +613,7 @@ def sos_share_view(request, token):
 
     driver_path_data = []
     try:
-        st = trip.live_tracking_state or {}
+        st = live_tracking_state_for(trip)
         path = st.get('driver_path') if isinstance(st, dict) else None
         if isinstance(path, list):
             tail = path[-300:] if len(path) > 300 else path
@@ -595,92 +644,30 @@ def sos_share_view(request, token):
 
 @require_http_methods(["GET"])
 def sos_share_live(request, token):
-    share = _get_share_token(token)
-    if share is None or not share.is_active():
+    access = get_share_access('sos', token)
+    if access is None:
         return JsonResponse({'success': False, 'error': 'Invalid or expired link'}, status=404)
 
-    incident = share.incident
-    trip = incident.trip
-    role = (incident.role or '').strip().lower()
-
-    live_state = trip.live_tracking_state or {}
-    actor = None
-    ts = None
-    speed_kph = None
-    driver_path = None
+    payload = _share_live_payload(access['trip_pk'], access['role'], access['booking_id'], since=parse_path_since(request.GET.get('since')))
+    return JsonResponse(dict(payload, success=True, incident_id=access['incident_id'], trip_id=access['trip_id']))
 
-    if isinstance(live_state, dict):
-        try:
-            dp = live_state.get('driver_path')
-            if isinstance(dp, list):
-                tail = dp[-300:] if len(dp) > 300 else dp
-                driver_path = []
-                for p in tail:
-                    if not isinstance(p, dict):
-                        continue
-                    if p.get('lat') is None or p.get('lng') is None:
-                        continue
-                    driver_path.append({'lat': float(p.get('lat')), 'lng': float(p.get('lng'))})
-        except Exception:
-            driver_path = None
 
-        if role == 'driver':
-            drv = live_state.get('driver')
-            if isinstance(drv, dict) and drv.get('lat') is not None and drv.get('lng') is not None:
-                actor = {
-                    'lat': float(drv.get('lat')),
-                    'lng': float(drv.get('lng')),
-                    'speed': _coerce_float(drv.get('speed')),
-                    'timestamp': drv.get('timestamp'),
-                }
-                ts = _parse_iso_dt(drv.get('timestamp'))
-                try:
-                    if actor.get('speed') is not None:
-                        speed_kph = float(actor.get('speed')) * 3.6
-                except Exception:
-                    speed_kph = None
-        else:
-            bid = getattr(incident, 'booking_id', None)
-            passengers = live_state.get('passengers')
-            if bid is not None and isinstance(passengers, list):
-                for p in passengers:
-                    if not isinstance(p, dict):
-                        continue
-                    if p.get('booking_id') == bid and p.get('lat') is not None and p.get('lng') is not None:
-                        actor = {
-                            'lat': float(p.get('lat')),
-                            'lng': float(p.get('lng')),
-                            'speed': _coerce_float(p.get('speed')),
-                            'timestamp': p.get('timestamp'),
-                        }
-                        ts = _parse_iso_dt(p.get('timestamp'))
-                        try:
-                            if actor.get('speed') is not None:
-                                speed_kph = float(actor.get('speed')) * 3.6
-                        except Exception:
-                            speed_kph = None
-                        break
+@require_http_methods(["GET"])
+def sos_share_stream(request, token):
+    """Server-Sent Events version of sos_share_live."""
+    access = get_share_access('sos', token)
+    if access is None:
+        return JsonResponse({'success': False, 'error': 'Invalid or expired link'}, status=404)
 
-    last_seen_seconds = None
-    if ts is not None:
-        try:
-            last_seen_seconds = max(int((timezone.now() - ts).total_seconds()), 0)
-        except Exception:
-            last_seen_seconds = None
+    def build(cursor):
+        current = get_share_access('sos', token)
+        if current is None:
+            return None
+        payload = _share_live_payload(current['trip_pk'], current['role'], current['booking_id'], since=cursor.get('driver_path'))
+        payload['live_state'] = path_delta(payload['live_state'], cursor)
+        return dict(payload, success=True, incident_id=current['incident_id'], trip_id=current['trip_id'])
 
-    return JsonResponse({
-        'success': True,
-        'incident_id': incident.id,
-        'trip_id': trip.trip_id,
-        'live_state': {
-            'actor': actor,
-            'driver_path': driver_path,
-        },
-        'runtime': {
-            'last_seen_seconds': last_seen_seconds,
-            'speed_kph': speed_kph,
-        },
-    })
+    return sse_response(live_event_stream(access['trip_pk'], build))
 
 
 @require_http_methods(["GET"])
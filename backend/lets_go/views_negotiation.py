@@ -9,9 +9,13 @@ from django.db import connection, transaction
 from django.db.models import F
 from django.db.utils import OperationalError, DatabaseError
 
-from .models import UsersData, Trip, RouteStop, Booking, BlockedUser
+from .models import UsersData, Trip, RouteStop, Booking, BlockedUser, BookingWaitlistEntry
 from .views_notifications import send_ride_notification_async
+from .utils.notification_outbox import enqueue_notification, enqueue_notifications
 from .utils.verification_guard import verification_block_response, ride_booking_block_response
+from .utils.booking_rules import evaluate_booking_offer, AUTO_ACCEPT, AUTO_COUNTER, AUTO_REJECT
+from .utils.waitlist import join_waitlist, promote_waitlist, release_seats_and_promote
+from .utils.blocking import is_blocked_between
 
 
 def _to_int_pkr(value, default=None):
@@ -75,8 +79,8 @@ def handle_ride_booking_request(request, trip_id):
             except Exception:
                 pass
             try:
-                if BlockedUser.objects.filter(blocker_id=trip.driver_id, blocked_user_id=passenger.id).only('id').exists():
-                    return JsonResponse({'success': False, 'error': 'You are blocked by this driver.'}, status=403)
+                if is_blocked_between(trip.driver_id, passenger.id):
+                    return JsonResponse({'success': False, 'error': 'You cannot request rides from this driver.'}, status=403)
             except Exception:
                 pass
 
@@ -94,10 +98,12 @@ def handle_ride_booking_request(request, trip_id):
                     'error': 'Invalid stop selection'
                 }, status=400)
 
-            if trip.available_seats < number_of_seats:
+            join_waitlist_requested = bool(data.get('join_waitlist', False))
+            if trip.available_seats < number_of_seats and not join_waitlist_requested:
                 return JsonResponse({
                     'success': False,
-                    'error': f'Only {trip.available_seats} seats available'
+                    'error': f'Only {trip.available_seats} seats available',
+                    'waitlist_available': trip.trip_status == 'SCHEDULED',
                 }, status=400)
 
             # Check gender preference
@@ -164,16 +170,60 @@ def handle_ride_booking_request(request, trip_id):
                 trip_locked = (
                     Trip.objects
                     .select_for_update()
-                    .only('id', 'trip_id', 'available_seats', 'gender_preference', 'driver_id', 'is_negotiable')
+                    .only(
+                        'id', 'trip_id', 'available_seats', 'gender_preference', 'driver_id',
+                        'is_negotiable', 'minimum_acceptable_fare', 'bargaining_history',
+                    )
                     .get(id=trip.id)
                 )
 
                 if trip_locked.available_seats < number_of_seats:
+                    if join_waitlist_requested and trip.trip_status == 'SCHEDULED':
+                        entry, position = join_waitlist(
+                            trip_locked, passenger, from_stop, to_stop, number_of_seats,
+                            male_seats=male_seats, female_seats=female_seats,
+                            original_fare=original_fare, proposed_fare=proposed_fare,
+                            is_negotiated=is_negotiated, special_requests=special_requests,
+                        )
+                        return JsonResponse({
+                            'success': True,
+                            'message': 'Trip is full; you have been added to the waitlist',
+                            'waitlisted': True,
+                            'waitlist_id': entry.id,
+                            'waitlist_position': position,
+                        }, status=202)
                     return JsonResponse({
                         'success': False,
-                        'error': f'Only {trip_locked.available_seats} seats available'
+                        'error': f'Only {trip_locked.available_seats} seats available',
+                        'waitlist_available': trip.trip_status == 'SCHEDULED',
                     }, status=409)
 
+                # Driver's standing rules (minimum_acceptable_fare) settle the common
+                # case here instead of waiting for the driver to open the app.
+                auto_action, auto_fare = (None, None)
+                if is_negotiated:
+                    auto_action, auto_fare = evaluate_booking_offer(trip_locked, proposed_fare)
+
+                booking_status = 'PENDING'
+                bargaining_status = 'PENDING' if is_negotiated else 'NO_NEGOTIATION'
+                driver_response = None
+                seats_locked = True
+                if auto_action == AUTO_ACCEPT:
+                    booking_status = 'CONFIRMED'
+                    bargaining_status = 'ACCEPTED'
+                    negotiated_fare_to_store = auto_fare
+                    total_fare = int(auto_fare) * int(number_of_seats or 0)
+                    driver_response = 'Offer meets the driver\'s minimum fare'
+                elif auto_action == AUTO_COUNTER:
+                    bargaining_status = 'COUNTER_OFFER'
+                    negotiated_fare_to_store = auto_fare
+                    driver_response = 'Offer is below the driver\'s minimum fare'
+                elif auto_action == AUTO_REJECT:
+                    booking_status = 'CANCELLED'
+                    bargaining_status = 'REJECTED'
+                    driver_response = 'Offer is too far below the driver\'s minimum fare'
+                    seats_locked = False
+
                 # Create booking with bargaining information
                 booking = Booking.objects.create(
                     booking_id=f"B{random.randint(100, 999)}-{datetime.now().strftime('%Y-%m-%d-%H:%M')}-{passenger_id}",
@@ -189,67 +239,115 @@ def handle_ride_booking_request(request, trip_id):
                     passenger_offer=proposed_fare,
                     negotiated_fare=negotiated_fare_to_store,
                     booking_status='PENDING',
-                    bargaining_status='PENDING' if is_negotiated else 'NO_NEGOTIATION',
+                    bargaining_status=bargaining_status,
                     negotiation_notes=special_requests,
-                    seats_locked=True,
-                )
-
-                Trip.objects.filter(id=trip_locked.id).update(
-                    available_seats=F('available_seats') - number_of_seats
+                    driver_response=driver_response,
+                    seats_locked=seats_locked,
                 )
+                if booking_status != 'PENDING':
+                    # Booking.save() deducts seats itself when a booking is *created*
+                    # as CONFIRMED; seats here are already held via seats_locked.
+                    booking.booking_status = booking_status
+                    booking.save(update_fields=['booking_status', 'updated_at'])
+
+                if seats_locked:
+                    Trip.objects.filter(id=trip_locked.id).update(
+                        available_seats=F('available_seats') - number_of_seats
+                    )
 
-            # Fire-and-forget notification to the driver via Supabase Edge Function
-            try:
-                driver_user_id = getattr(trip, 'driver_id', None)
-                print(f"[handle_ride_booking_request] driver_user_id={driver_user_id}")
-                if driver_user_id:
-                    payload = {
-                        'user_id': str(driver_user_id),
-                        'driver_id': str(driver_user_id),
-                        'title': 'New ride request',
-                        'body': f'Passenger requested {number_of_seats} seat(s).',
-                        'data': {
-                            'type': 'ride_request',
-                            'trip_id': str(trip.trip_id),
-                            'booking_id': str(booking.id),
-                            'seats': str(number_of_seats),
-                            'from_stop_name': str(getattr(from_stop, 'stop_name', '') or ''),
-                            'to_stop_name': str(getattr(to_stop, 'stop_name', '') or ''),
-                            'from_stop_order': str(getattr(from_stop, 'stop_order', '') or ''),
-                            'to_stop_order': str(getattr(to_stop, 'stop_order', '') or ''),
-                            'sender_id': str(passenger.id),
-                            'sender_name': str(passenger.name or ''),
-                            'sender_role': 'passenger',
-                            'sender_photo_url': str(getattr(passenger, 'profile_photo_url', '') or ''),
-                        },
-                    }
-                    print(f"[handle_ride_booking_request] Calling send_ride_notification_async with payload={payload}")
-                    send_ride_notification_async(payload)
-            except Exception as e:
-                print(f"[handle_ride_booking_request][notify_error]: {e}")
-
-            # Add to bargaining history if negotiated
-            if is_negotiated:
-                bargaining_entry = {
-                    'timestamp': datetime.now().isoformat(),
-                    'passenger_id': passenger_id,
-                    'passenger_name': passenger.name,
-                    'original_fare': int(original_fare) if original_fare is not None else 0,
-                    'proposed_fare': int(proposed_fare) if proposed_fare is not None else None,
-                    'status': 'PENDING'
-                }
-
-                if not trip.bargaining_history:
-                    trip.bargaining_history = []
-                trip.bargaining_history.append(bargaining_entry)
-                trip.save()
+                # Add to bargaining history if negotiated. Written under the row lock
+                # with an explicit column update so it cannot clobber available_seats.
+                if is_negotiated:
+                    hist = trip_locked.bargaining_history or []
+                    hist.append({
+                        'timestamp': datetime.now().isoformat(),
+                        'passenger_id': passenger_id,
+                        'passenger_name': passenger.name,
+                        'original_fare': int(original_fare) if original_fare is not None else 0,
+                        'proposed_fare': int(proposed_fare) if proposed_fare is not None else None,
+                        'status': 'PENDING'
+                    })
+                    if auto_action:
+                        hist.append({
+                            'action': f'auto_{auto_action}',
+                            'passenger_id': passenger.id,
+                            'booking_id': booking.id,
+                            'fare_per_seat': int(auto_fare) if auto_fare is not None else None,
+                            'floor': trip_locked.minimum_acceptable_fare,
+                            'ts': timezone.now().isoformat(),
+                        })
+                    Trip.objects.filter(id=trip_locked.id).update(bargaining_history=hist)
+
+                # Notifications go to the outbox in the same transaction as the booking.
+                payloads = []
+                try:
+                    driver_user_id = getattr(trip, 'driver_id', None)
+                    print(f"[handle_ride_booking_request] driver_user_id={driver_user_id}, auto_action={auto_action}")
+                    if driver_user_id and auto_action != AUTO_REJECT:
+                        if auto_action == AUTO_ACCEPT:
+                            title = 'New booking confirmed'
+                            body = f'Passenger booked {number_of_seats} seat(s) at PKR {auto_fare} per seat.'
+                        elif auto_action == AUTO_COUNTER:
+                            title = 'New ride request'
+                            body = f'Passenger requested {number_of_seats} seat(s); countered at PKR {auto_fare} per seat.'
+                        else:
+                            title = 'New ride request'
+                            body = f'Passenger requested {number_of_seats} seat(s).'
+                        payloads.append({
+                            'user_id': str(driver_user_id),
+                            'driver_id': str(driver_user_id),
+                            'title': title,
+                            'body': body,
+                            'data': {
+                                'type': 'ride_request',
+                                'trip_id': str(trip.trip_id),
+                                'booking_id': str(booking.id),
+                                'seats': str(number_of_seats),
+                                'auto_action': str(auto_action or ''),
+                                'from_stop_name': str(getattr(from_stop, 'stop_name', '') or ''),
+                                'to_stop_name': str(getattr(to_stop, 'stop_name', '') or ''),
+                                'from_stop_order': str(getattr(from_stop, 'stop_order', '') or ''),
+                                'to_stop_order': str(getattr(to_stop, 'stop_order', '') or ''),
+                                'sender_id': str(passenger.id),
+                                'sender_name': str(passenger.name or ''),
+                                'sender_role': 'passenger',
+                                'sender_photo_url': str(getattr(passenger, 'profile_photo_url', '') or ''),
+                            },
+                        })
+                    if auto_action:
+                        driver = UsersData.objects.only('id', 'name', 'profile_photo_url').filter(id=driver_user_id).first()
+                        if auto_action == AUTO_ACCEPT:
+                            payload = _booking_update_payload(trip, driver, booking, 'driver_accept', 'Your request was accepted', 'Driver confirmed your booking.')
+                        elif auto_action == AUTO_COUNTER:
+                            payload = _booking_update_payload(trip, driver, booking, 'driver_counter', 'You have a counter offer', f"Driver offered PKR {auto_fare} per seat.")
+                            payload['data']['counter_fare'] = str(auto_fare)
+                        else:
+                            payload = _booking_update_payload(trip, driver, booking, 'driver_reject', 'Your request was rejected', 'Driver rejected your booking request.')
+                        payload['data']['auto_action'] = str(auto_action)
+                        payloads.append(payload)
+                except Exception as e:
+                    print(f"[handle_ride_booking_request][notify_error]: {e}")
+                print(f"[handle_ride_booking_request] Queueing {len(payloads)} notification(s)")
+                enqueue_notifications(payloads)
+
+            if auto_action == AUTO_ACCEPT:
+                message = 'Ride booking confirmed'
+            elif auto_action == AUTO_COUNTER:
+                message = 'Driver countered your offer'
+            elif auto_action == AUTO_REJECT:
+                message = 'Offer declined by driver'
+            else:
+                message = 'Ride booking request submitted successfully'
 
             return JsonResponse({
                 'success': True,
-                'message': 'Ride booking request submitted successfully',
+                'message': message,
                 'booking_id': booking.booking_id,
                 'booking_pk': booking.id,
+                'booking_status': booking.booking_status,
                 'bargaining_status': booking.bargaining_status,
+                'auto_decision': auto_action,
+                'negotiated_fare': int(booking.negotiated_fare) if booking.negotiated_fare is not None else None,
                 'total_fare': int(booking.total_fare) if booking.total_fare is not None else 0
             }, status=201)
 
@@ -524,31 +622,12 @@ def respond_booking_request(request, trip_id, booking_id):
                 pass
             booking.booking_status = 'CONFIRMED'
             booking.driver_response = reason
-            booking.save()
-
-            try:
-                if not getattr(booking, 'seats_locked', False):
-                    trip.available_seats -= booking.number_of_seats
-                    trip.save(update_fields=['available_seats'])
-                    booking.seats_locked = True
-                    booking.save(update_fields=['seats_locked', 'updated_at'])
-            except Exception:
-                pass
-            # store event
+            # Passenger notification, queued in the outbox with the booking change
+            payload = None
             try:
-                hist = trip.bargaining_history or []
-                hist.append({'action': 'driver_accept', 'passenger_id': booking.passenger_id, 'booking_id': booking.id, 'ts': timezone.now().isoformat(), 'accepted_fare_per_seat': int(final_per_seat) if final_per_seat is not None else None, 'accepted_fare_total': int(final_total) if final_total is not None else None})
-                trip.bargaining_history = hist
-                trip.save(update_fields=['bargaining_history'])
-            except Exception:
-                pass
-            print(f"[respond_booking_request] ACCEPT branch completed in {(pytime.time()-t3)*1000:.1f}ms, final_per_seat={final_per_seat} final_total={final_total}")
-            # Notify passenger of acceptance
-            try:
-                passenger_id = booking.passenger_id
-                if passenger_id:
+                if booking.passenger_id:
                     payload = {
-                        'user_id': str(passenger_id),
+                        'user_id': str(booking.passenger_id),
                         'driver_id': str(trip.driver_id),
                         'title': 'Your request was accepted',
                         'body': 'Driver confirmed your booking.',
@@ -568,10 +647,32 @@ def respond_booking_request(request, trip_id, booking_id):
                             'sender_photo_url': str(getattr(getattr(trip, 'driver', None), 'profile_photo_url', '') or ''),
                         },
                     }
-                    print(f"[respond_booking_request] Calling send_ride_notification_async with payload={payload}")
-                    send_ride_notification_async(payload)
             except Exception as e:
                 print('[respond_booking_request][notify_error][accept]:', e)
+
+            with transaction.atomic():
+                booking.save()
+
+                try:
+                    if not getattr(booking, 'seats_locked', False):
+                        with transaction.atomic():
+                            trip.available_seats -= booking.number_of_seats
+                            trip.save(update_fields=['available_seats'])
+                            booking.seats_locked = True
+                            booking.save(update_fields=['seats_locked', 'updated_at'])
+                except Exception:
+                    pass
+                if payload is not None:
+                    enqueue_notification(payload)
+            # store event
+            try:
+                hist = trip.bargaining_history or []
+                hist.append({'action': 'driver_accept', 'passenger_id': booking.passenger_id, 'booking_id': booking.id, 'ts': timezone.now().isoformat(), 'accepted_fare_per_seat': int(final_per_seat) if final_per_seat is not None else None, 'accepted_fare_total': int(final_total) if final_total is not None else None})
+                trip.bargaining_history = hist
+                trip.save(update_fields=['bargaining_history'])
+            except Exception:
+                pass
+            print(f"[respond_booking_request] ACCEPT branch completed in {(pytime.time()-t3)*1000:.1f}ms, final_per_seat={final_per_seat} final_total={final_total}")
             print(f"[respond_booking_request] END action=accept total_elapsed={(pytime.time()-t0)*1000:.1f}ms")
             return JsonResponse({'success': True, 'message': 'Booking confirmed', 'booking': {
                 'id': booking.id,
@@ -587,11 +688,10 @@ def respond_booking_request(request, trip_id, booking_id):
             booking.save()
             try:
                 if getattr(booking, 'seats_locked', False):
-                    Trip.objects.filter(id=trip.id).update(
-                        available_seats=F('available_seats') + (booking.number_of_seats or 0)
-                    )
-                    booking.seats_locked = False
-                    booking.save(update_fields=['seats_locked', 'updated_at'])
+                    with transaction.atomic():
+                        booking.seats_locked = False
+                        booking.save(update_fields=['seats_locked', 'updated_at'])
+                        release_seats_and_promote(trip.id, booking.number_of_seats)
             except Exception:
                 pass
             try:
@@ -700,11 +800,10 @@ def respond_booking_request(request, trip_id, booking_id):
             booking.save(update_fields=['bargaining_status', 'booking_status', 'driver_response', 'blocked'])
             try:
                 if getattr(booking, 'seats_locked', False):
-                    Trip.objects.filter(id=trip.id).update(
-                        available_seats=F('available_seats') + (booking.number_of_seats or 0)
-                    )
-                    booking.seats_locked = False
-                    booking.save(update_fields=['seats_locked', 'updated_at'])
+                    with transaction.atomic():
+                        booking.seats_locked = False
+                        booking.save(update_fields=['seats_locked', 'updated_at'])
+                        release_seats_and_promote(trip.id, booking.number_of_seats)
             except Exception:
                 pass
             try:
@@ -739,11 +838,10 @@ def respond_booking_request(request, trip_id, booking_id):
                 pass
             try:
                 if getattr(booking, 'seats_locked', False):
-                    Trip.objects.filter(id=trip.id).update(
-                        available_seats=F('available_seats') + (booking.number_of_seats or 0)
-                    )
-                    booking.seats_locked = False
-                    booking.save(update_fields=['seats_locked', 'updated_at'])
+                    with transaction.atomic():
+                        booking.seats_locked = False
+                        booking.save(update_fields=['seats_locked', 'updated_at'])
+                        release_seats_and_promote(trip.id, booking.number_of_seats)
             except Exception:
                 pass
             try:
@@ -768,6 +866,269 @@ def respond_booking_request(request, trip_id, booking_id):
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+MAX_BATCH_DECISIONS = 50
+
+
+class _BatchSeatConflict(Exception):
+    pass
+
+
+def _booking_update_payload(trip, driver, booking, action, title, body):
+    return {
+        'user_id': str(booking.passenger_id),
+        'driver_id': str(trip.driver_id),
+        'title': title,
+        'body': body,
+        'data': {
+            'type': 'booking_update',
+            'action': action,
+            'trip_id': str(trip.trip_id),
+            'booking_id': str(booking.id),
+            'seats': str(getattr(booking, 'number_of_seats', '') or ''),
+            'from_stop_name': str(getattr(getattr(booking, 'from_stop', None), 'stop_name', '') or ''),
+            'to_stop_name': str(getattr(getattr(booking, 'to_stop', None), 'stop_name', '') or ''),
+            'from_stop_order': str(getattr(getattr(booking, 'from_stop', None), 'stop_order', '') or ''),
+            'to_stop_order': str(getattr(getattr(booking, 'to_stop', None), 'stop_order', '') or ''),
+            'sender_id': str(trip.driver_id),
+            'sender_name': str(driver.name if driver else 'Driver'),
+            'sender_role': 'driver',
+            'sender_photo_url': str(getattr(driver, 'profile_photo_url', '') or ''),
+        },
+    }
+
+
+@csrf_exempt
+def respond_booking_requests_batch(request, trip_id):
+    """Driver accepts/rejects several pending booking requests in one call.
+
+    Payload: {"driver_id": 1, "decisions": [{"booking_id": 10, "action": "accept"},
+    {"booking_id": 11, "action": "reject", "reason": "..."}]}
+
+    All decisions are applied in one transaction under a single trip row lock.
+    Seats for every accepted booking are reserved with one conditional update,
+    bookings are written with bulk_update and notifications go out as one batch
+    after commit. Each decision gets its own result entry.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Only POST allowed'}, status=405)
+    try:
+        t0 = pytime.time()
+        data = json.loads(request.body or '{}')
+        driver_id = data.get('driver_id')
+        decisions = data.get('decisions')
+        print(f"[respond_booking_requests_batch] START trip_id={trip_id}, driver_id={driver_id}, decisions={len(decisions) if isinstance(decisions, list) else None}")
+
+        if not driver_id:
+            return JsonResponse({'success': False, 'error': 'driver_id is required'}, status=400)
+        try:
+            driver_id = int(driver_id)
+        except (TypeError, ValueError):
+            return JsonResponse({'success': False, 'error': 'Invalid driver_id'}, status=400)
+        if not isinstance(decisions, list) or not decisions:
+            return JsonResponse({'success': False, 'error': 'decisions must be a non-empty list'}, status=400)
+        if len(decisions) > MAX_BATCH_DECISIONS:
+            return JsonResponse({'success': False, 'error': f'At most {MAX_BATCH_DECISIONS} decisions per request'}, status=400)
+
+        blocked = verification_block_response(driver_id)
+        if blocked is not None:
+            return blocked
+
+        booking_ids = []
+        for d in decisions:
+            try:
+                booking_ids.append(int((d or {}).get('booking_id')))
+            except (TypeError, ValueError, AttributeError):
+                continue
+
+        try:
+            connection.close_if_unusable_or_obsolete()
+        except Exception:
+            pass
+
+        results = []
+        payloads = []
+        promoted = []
+        with transaction.atomic():
+            trip = (
+                Trip.objects
+                .select_for_update()
+                .only('id', 'trip_id', 'driver_id', 'is_negotiable', 'available_seats', 'bargaining_history')
+                .get(trip_id=trip_id)
+            )
+            if trip.driver_id != driver_id:
+                return JsonResponse({'success': False, 'error': 'Only the trip driver can respond'}, status=403)
+
+            bookings = {
+                b.id: b
+                for b in (
+                    Booking.objects
+                    .select_for_update(of=('self',))
+                    .select_related('from_stop', 'to_stop')
+                    .filter(trip_id=trip.id, id__in=booking_ids)
+                )
+            }
+            driver = UsersData.objects.only('id', 'name', 'profile_photo_url').filter(id=driver_id).first()
+
+            now = timezone.now()
+            seats_left = int(trip.available_seats or 0)
+            seats_to_reserve = 0
+            seats_to_release = 0
+            seen = set()
+            changed = []
+            hist = trip.bargaining_history or []
+
+            for d in decisions:
+                d = d if isinstance(d, dict) else {}
+                action = (d.get('action') or '').lower()
+                reason = d.get('reason')
+                try:
+                    booking_id = int(d.get('booking_id'))
+                except (TypeError, ValueError):
+                    results.append({'booking_id': d.get('booking_id'), 'success': False, 'error': 'Invalid booking_id'})
+                    continue
+                if action not in ('accept', 'reject'):
+                    results.append({'booking_id': booking_id, 'success': False, 'error': 'Invalid action'})
+                    continue
+                if booking_id in seen:
+                    results.append({'booking_id': booking_id, 'success': False, 'error': 'Duplicate decision for booking'})
+                    continue
+                seen.add(booking_id)
+                booking = bookings.get(booking_id)
+                if booking is None:
+                    results.append({'booking_id': booking_id, 'success': False, 'error': 'Booking not found for this trip'})
+                    continue
+                if booking.booking_status != 'PENDING':
+                    results.append({'booking_id': booking_id, 'success': False, 'error': f'Booking is {booking.booking_status.lower()}'})
+                    continue
+
+                seats = int(booking.number_of_seats or 1)
+                if action == 'accept':
+                    if not booking.seats_locked:
+                        if seats > seats_left:
+                            results.append({'booking_id': booking_id, 'success': False, 'error': 'Not enough seats available'})
+                            continue
+                        seats_left -= seats
+                        seats_to_reserve += seats
+                        booking.seats_locked = True
+
+                    final_per_seat = None
+                    if trip.is_negotiable:
+                        if booking.passenger_offer is not None:
+                            final_per_seat = booking.passenger_offer
+                        elif booking.negotiated_fare is not None:
+                            final_per_seat = booking.negotiated_fare
+                        booking.bargaining_status = 'ACCEPTED'
+                    if final_per_seat is None:
+                        final_per_seat = getattr(booking, 'original_fare', None)
+                    final_per_seat = _to_int_pkr(final_per_seat, default=None)
+                    final_total = final_per_seat * seats if final_per_seat is not None else None
+
+                    if final_per_seat is not None:
+                        booking.negotiated_fare = final_per_seat
+                    if final_total is not None:
+                        booking.total_fare = final_total
+                    booking.booking_status = 'CONFIRMED'
+                    booking.driver_response = reason
+                    hist.append({'action': 'driver_accept', 'passenger_id': booking.passenger_id, 'booking_id': booking.id, 'ts': now.isoformat(), 'accepted_fare_per_seat': final_per_seat, 'accepted_fare_total': final_total})
+                    payloads.append(_booking_update_payload(trip, driver, booking, 'driver_accept', 'Your request was accepted', 'Driver confirmed your booking.'))
+                else:
+                    if booking.seats_locked:
+                        seats_to_release += seats
+                        seats_left += seats
+                        booking.seats_locked = False
+                    booking.bargaining_status = 'REJECTED'
+                    booking.booking_status = 'CANCELLED'
+                    booking.driver_response = reason
+                    hist.append({'action': 'reject', 'passenger_id': booking.passenger_id, 'booking_id': booking.id, 'reason': reason, 'ts': now.isoformat()})
+                    payloads.append(_booking_update_payload(trip, driver, booking, 'driver_reject', 'Your request was rejected', 'Driver rejected your booking request.'))
+
+                # bulk_update() bypasses auto_now, so stamp it explicitly.
+                booking.updated_at = now
+                changed.append(booking)
+                results.append({
+                    'booking_id': booking.id,
+                    'success': True,
+                    'action': action,
+                    'status': booking.booking_status,
+                    'bargaining_status': booking.bargaining_status,
+                    'total_fare': int(booking.total_fare or 0) if action == 'accept' else None,
+                })
+
+            if changed:
+                try:
+                    with transaction.atomic():
+                        if seats_to_reserve or seats_to_release:
+                            # Guard on the net change: seats released by rejections
+                            # in this batch can go to the accepted requests.
+                            updated = (
+                                Trip.objects
+                                .filter(id=trip.id, available_seats__gte=seats_to_reserve - seats_to_release)
+                                .update(available_seats=F('available_seats') - seats_to_reserve + seats_to_release)
+                            )
+                            if not updated:
+                                raise _BatchSeatConflict()
+                        Booking.objects.bulk_update(changed, [
+                            'booking_status', 'bargaining_status', 'negotiated_fare', 'total_fare',
+                            'driver_response', 'seats_locked', 'updated_at',
+                        ])
+                        trip.bargaining_history = hist
+                        trip.save(update_fields=['bargaining_history'])
+                        if seats_to_release:
+                            promoted = promote_waitlist(trip.id)
+                            seats_left -= sum(int(b.number_of_seats or 0) for b in promoted)
+                        enqueue_notifications(payloads)
+                except _BatchSeatConflict:
+                    return JsonResponse({'success': False, 'error': 'Not enough seats available'}, status=409)
+
+        ok = sum(1 for r in results if r.get('success'))
+        print(f"[respond_booking_requests_batch] END ok={ok} failed={len(results) - ok} reserved={seats_to_reserve} released={seats_to_release} total_elapsed={(pytime.time()-t0)*1000:.1f}ms")
+        return JsonResponse({
+            'success': True,
+            'trip_id': trip.trip_id,
+            'available_seats': seats_left,
+            'processed': ok,
+            'failed': len(results) - ok,
+            'waitlist_promoted': len(promoted),
+            'results': results,
+        })
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    except Trip.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Trip not found'}, status=404)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@csrf_exempt
+def leave_trip_waitlist(request, trip_id):
+    """Passenger removes themselves from a trip's waitlist."""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Only POST allowed'}, status=405)
+    try:
+        data = json.loads(request.body or '{}')
+        passenger_id = data.get('passenger_id')
+        if not passenger_id:
+            return JsonResponse({'success': False, 'error': 'passenger_id is required'}, status=400)
+        updated = (
+            BookingWaitlistEntry.objects
+            .filter(
+                trip__trip_id=trip_id,
+                passenger_id=int(passenger_id),
+                status=BookingWaitlistEntry.STATUS_WAITING,
+            )
+            .update(status=BookingWaitlistEntry.STATUS_CANCELLED)
+        )
+        if not updated:
+            return JsonResponse({'success': False, 'error': 'Not on the waitlist for this trip'}, status=404)
+        return JsonResponse({'success': True, 'message': 'Removed from waitlist'})
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Invalid passenger_id'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
 @csrf_exempt
 def unblock_passenger_for_trip(request, trip_id, passenger_id):
     """Driver unblocks a passenger for this trip so they can request again."""
@@ -872,27 +1233,8 @@ def passenger_respond_booking(request, trip_id, booking_id):
             booking.booking_status = 'CONFIRMED'
             booking.bargaining_status = 'ACCEPTED'
             setattr(booking, 'passenger_response', note)
-            booking.save()
-            t.available_seats -= (booking.number_of_seats or 1)
-            t.save(update_fields=['available_seats'])
-            print(f"[passenger_respond_booking] ACCEPT branch: updated booking and seats in {(pytime.time()-t2)*1000:.1f}ms, final_per_seat={final_per_seat} final_total={final_total}")
-            # Store event in trip bargaining history
-            try:
-                hist = trip.bargaining_history or []
-                hist.append({
-                    'action': 'passenger_accept',
-                    'passenger_id': booking.passenger_id,
-                    'booking_id': booking.id,
-                    'accepted_fare_per_seat': int(final_per_seat) if final_per_seat is not None else None,
-                    'accepted_fare_total': int(final_total) if final_total is not None else None,
-                    'note': note,
-                    'ts': timezone.now().isoformat(),
-                })
-                trip.bargaining_history = hist
-                trip.save(update_fields=['bargaining_history'])
-            except Exception as e:
-                print('[passenger_respond_booking][history_error][accept]:', e)
-            # Notify driver that passenger accepted
+            # Driver notification, queued in the outbox with the booking change
+            payload = None
             try:
                 driver_user_id = getattr(trip, 'driver_id', None)
                 if driver_user_id:
@@ -917,10 +1259,31 @@ def passenger_respond_booking(request, trip_id, booking_id):
                             'sender_photo_url': str(getattr(getattr(booking, 'passenger', None), 'profile_photo_url', '') or ''),
                         },
                     }
-                    print(f"[passenger_respond_booking] Calling send_ride_notification_async with payload={payload}")
-                    send_ride_notification_async(payload)
             except Exception as e:
                 print('[passenger_respond_booking][notify_error][accept]:', e)
+            with transaction.atomic():
+                booking.save()
+                t.available_seats -= (booking.number_of_seats or 1)
+                t.save(update_fields=['available_seats'])
+                if payload is not None:
+                    enqueue_notification(payload)
+            print(f"[passenger_respond_booking] ACCEPT branch: updated booking and seats in {(pytime.time()-t2)*1000:.1f}ms, final_per_seat={final_per_seat} final_total={final_total}")
+            # Store event in trip bargaining history
+            try:
+                hist = trip.bargaining_history or []
+                hist.append({
+                    'action': 'passenger_accept',
+                    'passenger_id': booking.passenger_id,
+                    'booking_id': booking.id,
+                    'accepted_fare_per_seat': int(final_per_seat) if final_per_seat is not None else None,
+                    'accepted_fare_total': int(final_total) if final_total is not None else None,
+                    'note': note,
+                    'ts': timezone.now().isoformat(),
+                })
+                trip.bargaining_history = hist
+                trip.save(update_fields=['bargaining_history'])
+            except Exception as e:
+                print('[passenger_respond_booking][history_error][accept]:', e)
             print(f"[passenger_respond_booking] END action=accept total_elapsed={(pytime.time()-t0)*1000:.1f}ms")
             return JsonResponse({'success': True, 'message': 'Booking confirmed', 'booking': {
                 'id': booking.id,
@@ -994,11 +1357,10 @@ def passenger_respond_booking(request, trip_id, booking_id):
             booking.save()
             try:
                 if getattr(booking, 'seats_locked', False):
-                    Trip.objects.filter(id=trip.id).update(
-                        available_seats=F('available_seats') + (booking.number_of_seats or 0)
-                    )
-                    booking.seats_locked = False
-                    booking.save(update_fields=['seats_locked', 'updated_at'])
+                    with transaction.atomic():
+                        booking.seats_locked = False
+                        booking.save(update_fields=['seats_locked', 'updated_at'])
+                        release_seats_and_promote(trip.id, booking.number_of_seats)
             except Exception:
                 pass
             try:
@@ -1236,8 +1598,8 @@ def request_ride_booking(request, trip_id):
                 except Exception:
                     pass
                 try:
-                    if BlockedUser.objects.filter(blocker_id=trip.driver_id, blocked_user_id=passenger.id).only('id').exists():
-                        return JsonResponse({'success': False, 'error': 'You are blocked by this driver.'}, status=403)
+                    if is_blocked_between(trip.driver_id, passenger.id):
+                        return JsonResponse({'success': False, 'error': 'You cannot request rides from this driver.'}, status=403)
                 except Exception:
                     pass
 
@@ -3,12 +3,12 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import ensure_csrf_cookie
+import hmac
 import json
 import os
-import threading
-import requests
 from .models.models_userdata import UsersData
 from .constants import SUPABASE_EDGE_API_KEY
+from .utils.notification_pool import get_notification_pool
 @csrf_exempt
 @require_http_methods(["POST"])
 def update_fcm_token(request):
@@ -126,37 +126,61 @@ def _normalize_ride_notification_payload(payload: dict) -> dict:
     return normalized
 
 
+def _edge_function_headers():
+    return {
+        'Content-Type': 'application/json',
+        'apikey': SUPABASE_FN_API_KEY,
+        # Supabase Edge Functions typically require an Authorization bearer token
+        'Authorization': f'Bearer {SUPABASE_FN_API_KEY}',
+    }
+
+
 def send_ride_notification_async(payload: dict):
     """Fire-and-forget call to Supabase Edge Function for ride notifications.
 
-    This must never raise back into the HTTP view; all errors are logged only.
+    Queued on the process-wide notification pool (utils/notification_pool.py);
+    this must never raise back into the HTTP view; all errors are logged only.
     """
+    try:
+        if not SUPABASE_FN_API_KEY:
+            print('[send_ride_notification_async] Missing SUPABASE_EDGE_API_KEY; skipping notification')
+            return
+        normalized_payload = _normalize_ride_notification_payload(payload)
+        print(f'[send_ride_notification_async] queueing Edge Function call with payload: {normalized_payload}')
+        get_notification_pool().submit(
+            SUPABASE_FN_URL,
+            normalized_payload,
+            headers=_edge_function_headers(),
+            tag='send_ride_notification_async',
+        )
+    except Exception as e:
+        print('[send_ride_notification_async][ERROR]:', e)
+
+
+def send_ride_notifications_batch_async(payloads: list):
+    """Fire-and-forget delivery of several ride notifications.
 
-    def _worker():
+    All payloads go onto the shared notification pool, whose workers reuse
+    keep-alive sessions, so a batch of N decisions costs no extra threads.
+    """
+    payloads = [p for p in (payloads or []) if isinstance(p, dict)]
+    if not payloads:
+        return
+    if not SUPABASE_FN_API_KEY:
+        print('[send_ride_notifications_batch_async] Missing SUPABASE_EDGE_API_KEY; skipping notifications')
+        return
+    pool = get_notification_pool()
+    headers = _edge_function_headers()
+    for payload in payloads:
         try:
-            if not SUPABASE_FN_API_KEY:
-                print('[send_ride_notification_async] Missing SUPABASE_EDGE_API_KEY; skipping notification')
-                return
-            url = SUPABASE_FN_URL
-            normalized_payload = _normalize_ride_notification_payload(payload)
-            print(f'[send_ride_notification_async] invoking Edge Function at {url} with payload: {normalized_payload}')
-            resp = requests.post(
-                url,
-                headers={
-                    'Content-Type': 'application/json',
-                    'apikey': SUPABASE_FN_API_KEY,
-                    # Supabase Edge Functions typically require an Authorization bearer token
-                    'Authorization': f'Bearer {SUPABASE_FN_API_KEY}',
-                },
-                json=normalized_payload,
-                # Slightly higher timeout to reduce spurious read timeouts in logs
-                timeout=10,
+            pool.submit(
+                SUPABASE_FN_URL,
+                _normalize_ride_notification_payload(payload),
+                headers=headers,
+                tag='send_ride_notifications_batch_async',
             )
-            print(f'[send_ride_notification_async] status={resp.status_code}, body={resp.text[:200]}')
         except Exception as e:
-            print('[send_ride_notification_async][ERROR]:', e)
-
-    threading.Thread(target=_worker, daemon=True).start()
+            print('[send_ride_notifications_batch_async][ERROR]:', e)
 
 
 def register_fcm_token_with_supabase_async(user_id: int, fcm_token: str):
@@ -164,31 +188,91 @@ def register_fcm_token_with_supabase_async(user_id: int, fcm_token: str):
 
     This replaces the previous frontend call to `register-fcm-token`.
     """
+    try:
+        if not SUPABASE_FN_API_KEY:
+            print('[register_fcm_token_with_supabase_async] Missing SUPABASE_EDGE_API_KEY; skipping registration')
+            return
+        payload = {
+            'user_id': str(user_id),
+            'fcm_token': fcm_token,
+        }
+        print(f'[register_fcm_token_with_supabase_async] queueing Edge Function call for user_id={user_id}')
+        get_notification_pool().submit(
+            SUPABASE_REGISTER_FCM_URL,
+            payload,
+            headers=_edge_function_headers(),
+            tag='register_fcm_token_with_supabase_async',
+        )
+    except Exception as e:
+        print('[register_fcm_token_with_supabase_async][ERROR]:', e)
 
-    def _worker():
-        try:
-            if not SUPABASE_FN_API_KEY:
-                print('[register_fcm_token_with_supabase_async] Missing SUPABASE_EDGE_API_KEY; skipping registration')
-                return
-            url = SUPABASE_REGISTER_FCM_URL
-            payload = {
-                'user_id': str(user_id),
-                'fcm_token': fcm_token,
-            }
-            print(f'[register_fcm_token_with_supabase_async] invoking Edge Function at {url} with payload: {payload}')
-            resp = requests.post(
-                url,
-                headers={
-                    'Content-Type': 'application/json',
-                    'apikey': SUPABASE_FN_API_KEY,
-                    'Authorization': f'Bearer {SUPABASE_FN_API_KEY}',
-                },
-                json=payload,
-                timeout=5,
-            )
-            print(f'[register_fcm_token_with_supabase_async] status={resp.status_code}, body={resp.text[:200]}')
-        except Exception as e:
-            print('[register_fcm_token_with_supabase_async][ERROR]:', e)
 
-    threading.Thread(target=_worker, daemon=True).start()
+def post_ride_notification(session, payload: dict, timeout=10):
+    """Deliver one ride notification synchronously; raises on any failure.
+
+    Used by the notification outbox dispatcher, which needs the outcome to
+    decide between marking a row sent and scheduling a retry.
+    """
+    if not SUPABASE_FN_API_KEY:
+        raise RuntimeError('SUPABASE_EDGE_API_KEY is not configured')
+    resp = session.post(
+        SUPABASE_FN_URL,
+        headers=_edge_function_headers(),
+        json=_normalize_ride_notification_payload(payload),
+        timeout=timeout,
+    )
+    if not 200 <= resp.status_code < 300:
+        raise RuntimeError(f'status={resp.status_code}, body={resp.text[:200]}')
+
+
+def submit_ride_notification(payload: dict, on_done=None, tag='notification_outbox'):
+    """Queue one ride notification on the pool with a completion callback.
+
+    Returns False when nothing was queued (missing key or a full queue); the
+    caller's retry path is then responsible for the message.
+    """
+    if not SUPABASE_FN_API_KEY:
+        return False
+    return get_notification_pool().submit(
+        SUPABASE_FN_URL,
+        _normalize_ride_notification_payload(payload),
+        headers=_edge_function_headers(),
+        tag=tag,
+        on_done=on_done,
+    )
+
 
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def dispatch_notification_outbox(request):
+    """Cron entry point for the notification outbox retry path.
+
+    Vercel Cron calls this with `Authorization: Bearer <CRON_SECRET>`; it
+    delivers due rows for at most NOTIFICATION_OUTBOX_CRON_SECONDS. With
+    ?purge=1 it first deletes SENT rows older than the retention window.
+    """
+    from django.conf import settings
+    from .utils.notification_outbox import dispatch_pending, purge_sent
+
+    secret = getattr(settings, 'CRON_SECRET', '')
+    if not secret:
+        print('[dispatch_notification_outbox] CRON_SECRET is not configured')
+        return JsonResponse({'success': False, 'error': 'Not configured'}, status=503)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {secret}'):
+        return JsonResponse({'success': False, 'error': 'Unauthorized'}, status=401)
+    try:
+        purged = 0
+        retention_days = int(getattr(settings, 'NOTIFICATION_OUTBOX_RETENTION_DAYS', 7))
+        if request.GET.get('purge') == '1' and retention_days > 0:
+            purged = purge_sent(retention_days)
+        # Small batches with a short timeout keep one run inside the
+        # function's execution limit; unfinished leases expire and retry.
+        totals = dispatch_pending(
+            batch_size=10,
+            timeout=5,
+            time_budget=getattr(settings, 'NOTIFICATION_OUTBOX_CRON_SECONDS', 20),
+        )
+    except Exception as e:
+        print('[dispatch_notification_outbox][ERROR]:', repr(e))
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    return JsonResponse({'success': True, 'purged': purged, **totals})
@@ -3,17 +3,28 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 from django.conf import settings
+from django.db import transaction
 import json
 import math
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-from .models.models_trip import Trip, TripStopBreakdown, TripLiveLocationUpdate, RideAuditEvent
+from .models.models_trip import Trip, TripStopBreakdown, TripLiveLocationUpdate, RideAuditEvent, trip_json_deferred
 from .models.models_booking import Booking, PickupCodeVerification
 from .models.models_route import RouteStop
 from .models import TripPayment
 from .views_authentication import upload_to_supabase
 from .views_notifications import send_ride_notification_async
 from .utils.verification_guard import verification_block_response
+from .utils.live_store import get_live_store, live_tracking_state_for, merge_live_snapshot, parse_path_since, path_since
+from .utils.json_update import merge_json_field
+from .utils.notification_outbox import enqueue_notifications
+from .utils.location_buffer import get_location_buffer
+from .utils.route_index import get_route_index
+from .utils.arrival import detect_arrivals
+from .utils.geofence import distance_to_next_stop, evaluate_geofences
+from .utils.live_ingest import enrich_driver_point, ingest_driver_point, ingest_passenger_point, position_message, publish_live_update
+from .utils.live_stream import cached_stream_payload, live_event_stream, path_delta, sse_response
+from .utils.reporting import recommend_reporting
 
 
 def _coerce_int(v):
@@ -85,52 +96,33 @@ def _haversine_meters(lat1, lon1, lat2, lon2):
     return r * c
 
 
-def _record_system_notification_if_due(trip: Trip, key: str, cooldown_seconds: int) -> bool:
-    """Return True if notification is due and record timestamp in live_tracking_state."""
+def _latest_driver_position(trip: Trip):
+    """(lat, lng) of the driver's latest fix: live store first, since
+    TripLiveLocationUpdate rows are written behind and may lag."""
     try:
-        now = timezone.now()
-        state = trip.live_tracking_state
-        if not isinstance(state, dict):
-            state = {}
-        sent = state.get('system_notifications')
-        if not isinstance(sent, dict):
-            sent = {}
-        last_dt = _parse_iso_dt(sent.get(key))
-        if last_dt is not None:
-            try:
-                if (now - last_dt).total_seconds() < float(cooldown_seconds):
-                    return False
-            except Exception:
-                pass
-
-        sent[key] = now.isoformat()
-        state['system_notifications'] = sent
-        trip.live_tracking_state = state
-        trip.save(update_fields=['live_tracking_state'])
-        return True
+        snapshot = get_live_store().snapshot(trip.id) or {}
+        drv = snapshot.get('driver')
+        if isinstance(drv, dict) and drv.get('lat') is not None and drv.get('lng') is not None:
+            return drv.get('lat'), drv.get('lng')
     except Exception:
-        return True
+        pass
+    latest = (
+        TripLiveLocationUpdate.objects
+        .filter(trip=trip, role='DRIVER')
+        .only('latitude', 'longitude', 'recorded_at')
+        .order_by('-recorded_at')
+        .first()
+    )
+    if latest is None:
+        return None, None
+    return latest.latitude, latest.longitude
 
 
 def _set_trip_booking_flag(trip: Trip, booking_id: int, flag: str, value) -> None:
     try:
-        state = trip.live_tracking_state
-        if not isinstance(state, dict):
-            state = {}
-        flags = state.get('booking_flags')
-        if not isinstance(flags, dict):
-            flags = {}
-        bid = str(int(booking_id))
-        row = flags.get(bid)
-        if not isinstance(row, dict):
-            row = {}
-        row[flag] = value
-        flags[bid] = row
-        state['booking_flags'] = flags
-        trip.live_tracking_state = state
-        trip.save(update_fields=['live_tracking_state'])
-    except Exception:
-        pass
+        merge_json_field(trip, 'live_tracking_state', {flag: value}, path=('booking_flags', int(booking_id)))
+    except Exception as e:
+        print('[_set_trip_booking_flag][ERROR]:', repr(e))
 
 
 @csrf_exempt
@@ -211,7 +203,7 @@ def update_booking_readiness(request, booking_id):
         }, status=400)
 
     try:
-        booking = Booking.objects.select_related('trip', 'passenger').get(id=booking_id)
+        booking = Booking.objects.select_related('trip', 'passenger').defer(*trip_json_deferred()).get(id=booking_id)
     except Booking.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Booking not found'}, status=404)
 
@@ -259,33 +251,14 @@ def start_trip_ride(request, trip_id):
         trip.started_at = now
         trip.started_by_user_id = driver_id
 
-    state = trip.live_tracking_state or {}
-    state.setdefault('passengers', [])
-    state['last_update'] = now.isoformat()
-    trip.live_tracking_state = state
-    trip.save(update_fields=['trip_status', 'actual_departure_time', 'started_at', 'started_by_user', 'live_tracking_state'])
-
-    try:
-        RideAuditEvent.objects.create(
-            trip=trip,
-            booking=None,
-            actor=trip.driver,
-            event_type='TRIP_STARTED',
-            payload={
-                'driver_id': driver_id,
-                'started_at': now.isoformat(),
-            },
-        )
-    except Exception:
-        pass
-
     confirmed = (
         Booking.objects
         .filter(trip=trip, booking_status='CONFIRMED')
         .select_related('passenger', 'from_stop', 'to_stop')
     )
+    payloads = []
     for booking in confirmed:
-        payload = {
+        payloads.append({
             'user_id': str(booking.passenger.id),
             'driver_id': str(trip.driver_id),
             'title': 'Ride started',
@@ -295,17 +268,13 @@ def start_trip_ride(request, trip_id):
                 'trip_id': str(trip.trip_id),
                 'booking_id': str(booking.id),
             },
-        }
-        try:
-            send_ride_notification_async(payload)
-        except Exception:
-            pass
+        })
 
         try:
             passenger_name = getattr(getattr(booking, 'passenger', None), 'name', None) or 'Passenger'
             pickup_name = getattr(getattr(booking, 'from_stop', None), 'stop_name', None) or 'Pickup'
             drop_name = getattr(getattr(booking, 'to_stop', None), 'stop_name', None) or 'Drop-off'
-            payload_driver = {
+            payloads.append({
                 'user_id': str(trip.driver_id),
                 'driver_id': str(trip.driver_id),
                 'title': 'Pickup passenger',
@@ -318,11 +287,31 @@ def start_trip_ride(request, trip_id):
                     'pickup_stop_name': str(pickup_name),
                     'dropoff_stop_name': str(drop_name),
                 },
-            }
-            send_ride_notification_async(payload_driver)
+            })
         except Exception:
             pass
 
+    # Notifications are queued in the outbox with the status change, so they
+    # are only sent if the trip really started.
+    with transaction.atomic():
+        trip.save(update_fields=['trip_status', 'actual_departure_time', 'started_at', 'started_by_user'])
+        merge_json_field(trip, 'live_tracking_state', {'last_update': now.isoformat()}, defaults={'passengers': []})
+        enqueue_notifications(payloads)
+
+    try:
+        RideAuditEvent.objects.create(
+            trip=trip,
+            booking=None,
+            actor=trip.driver,
+            event_type='TRIP_STARTED',
+            payload={
+                'driver_id': driver_id,
+                'started_at': now.isoformat(),
+            },
+        )
+    except Exception:
+        pass
+
     return JsonResponse({'success': True, 'trip_id': trip.trip_id, 'trip_status': trip.trip_status})
 
 
@@ -331,7 +320,7 @@ def start_trip_ride(request, trip_id):
 def start_booking_ride(request, booking_id):
     """Passenger confirms they started ride; records who/when and notifies driver."""
     try:
-        booking = Booking.objects.select_related('trip', 'passenger').get(id=booking_id)
+        booking = Booking.objects.select_related('trip', 'passenger').defer(*trip_json_deferred()).get(id=booking_id)
     except Booking.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Booking not found'}, status=404)
 
@@ -417,11 +406,46 @@ def complete_trip_ride(request, trip_id):
     trip.actual_arrival_time = now.time()
     trip.completed_at = now
 
-    state = trip.live_tracking_state or {}
+    # Final positions from the live store plus the end markers, merged in one
+    # UPDATE so booking flags written concurrently are kept.
+    try:
+        snapshot = get_live_store().snapshot(trip.id)
+    except Exception as e:
+        print('[complete_trip_ride][live_store_snapshot_error]:', repr(e))
+        snapshot = None
+    state = merge_live_snapshot({}, snapshot)
     state['ended_at'] = now.isoformat()
     state['ended_by_user_id'] = driver_id
-    trip.live_tracking_state = state
-    trip.save(update_fields=['trip_status', 'actual_arrival_time', 'completed_at', 'live_tracking_state'])
+
+    payloads = []
+    try:
+        confirmed = Booking.objects.filter(trip=trip, booking_status__in=['CONFIRMED', 'COMPLETED']).only('id', 'passenger_id')
+        for booking in confirmed:
+            payloads.append({
+                'user_id': str(booking.passenger_id),
+                'driver_id': str(trip.driver_id),
+                'title': 'Trip completed',
+                'body': f'Your trip {trip.trip_id} has completed.',
+                'data': {
+                    'type': 'trip_completed',
+                    'trip_id': str(trip.trip_id),
+                    'booking_id': str(booking.id),
+                },
+            })
+    except Exception as e:
+        print('[complete_trip_ride][notify_error]:', repr(e))
+
+    # As in start_trip_ride, notifications commit with the status change.
+    with transaction.atomic():
+        trip.save(update_fields=['trip_status', 'actual_arrival_time', 'completed_at'])
+        merge_json_field(trip, 'live_tracking_state', state)
+        enqueue_notifications(payloads)
+    try:
+        store = get_live_store()
+        store.clear(trip.id)
+        store.publish(trip.id)
+    except Exception as e:
+        print('[complete_trip_ride][live_store_clear_error]:', repr(e))
 
     try:
         RideAuditEvent.objects.create(
@@ -437,27 +461,6 @@ def complete_trip_ride(request, trip_id):
     except Exception:
         pass
 
-    try:
-        confirmed = Booking.objects.filter(trip=trip, booking_status__in=['CONFIRMED', 'COMPLETED']).select_related('passenger')
-        for booking in confirmed:
-            payload = {
-                'user_id': str(booking.passenger.id),
-                'driver_id': str(trip.driver_id),
-                'title': 'Trip completed',
-                'body': f'Your trip {trip.trip_id} has completed.',
-                'data': {
-                    'type': 'trip_completed',
-                    'trip_id': str(trip.trip_id),
-                    'booking_id': str(booking.id),
-                },
-            }
-            try:
-                send_ride_notification_async(payload)
-            except Exception:
-                pass
-    except Exception:
-        pass
-
     return JsonResponse({'success': True, 'trip_id': trip.trip_id, 'trip_status': trip.trip_status})
 
 
@@ -465,7 +468,7 @@ def complete_trip_ride(request, trip_id):
 @require_http_methods(["POST"])
 def mark_booking_dropped_off(request, booking_id):
     try:
-        booking = Booking.objects.select_related('trip', 'passenger').get(id=booking_id)
+        booking = Booking.objects.select_related('trip', 'passenger').defer(*trip_json_deferred()).get(id=booking_id)
     except Booking.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Booking not found'}, status=404)
 
@@ -528,7 +531,7 @@ def mark_booking_dropped_off(request, booking_id):
 @require_http_methods(["POST"])
 def driver_mark_reached_pickup(request, booking_id):
     try:
-        booking = Booking.objects.select_related('trip', 'trip__driver', 'passenger', 'from_stop').get(id=booking_id)
+        booking = Booking.objects.select_related('trip', 'trip__driver', 'passenger', 'from_stop').defer(*trip_json_deferred()).get(id=booking_id)
     except Booking.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Booking not found'}, status=404)
 
@@ -579,7 +582,7 @@ def driver_mark_reached_pickup(request, booking_id):
 @require_http_methods(["POST"])
 def driver_mark_reached_dropoff(request, booking_id):
     try:
-        booking = Booking.objects.select_related('trip', 'trip__driver', 'passenger', 'to_stop').get(id=booking_id)
+        booking = Booking.objects.select_related('trip', 'trip__driver', 'passenger', 'to_stop').defer(*trip_json_deferred()).get(id=booking_id)
     except Booking.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Booking not found'}, status=404)
 
@@ -730,7 +733,7 @@ def get_booking_payment_details(request, booking_id):
 @require_http_methods(["POST"])
 def submit_booking_payment(request, booking_id):
     try:
-        booking = Booking.objects.select_related('trip', 'trip__driver', 'passenger').get(id=booking_id)
+        booking = Booking.objects.select_related('trip', 'trip__driver', 'passenger').defer(*trip_json_deferred()).get(id=booking_id)
     except Booking.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Booking not found'}, status=404)
 
@@ -824,7 +827,7 @@ def submit_booking_payment(request, booking_id):
 @require_http_methods(["POST"])
 def confirm_booking_payment(request, booking_id):
     try:
-        booking = Booking.objects.select_related('trip', 'trip__driver', 'passenger').get(id=booking_id)
+        booking = Booking.objects.select_related('trip', 'trip__driver', 'passenger').defer(*trip_json_deferred()).get(id=booking_id)
     except Booking.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Booking not found'}, status=404)
 
@@ -943,7 +946,12 @@ def get_trip_payments(request, trip_id):
 @csrf_exempt
 @require_http_methods(["POST"])
 def update_live_location(request, trip_id):
-    """Update live location for driver or passenger; persists for admin monitoring."""
+    """Update live location for driver or passenger; persists for admin monitoring.
+
+    The response carries `reporting` ({next_interval_s, min_distance_m}): when
+    the client should send its next fix and how far it must have moved for an
+    earlier fix to be worth sending. See utils/reporting.py.
+    """
     trip, error = _get_trip_or_404(trip_id)
     if error is not None:
         return error
@@ -964,137 +972,219 @@ def update_live_location(request, trip_id):
 
     if role == 'DRIVER' and trip.trip_status != 'IN_PROGRESS':
         # This can happen briefly after ending/cancelling a trip while background tracking is still flushing.
-        return JsonResponse({'success': True, 'ignored': True, 'reason': 'Trip not in progress'})
+        return JsonResponse({
+            'success': True,
+            'ignored': True,
+            'reason': 'Trip not in progress',
+            'reporting': recommend_reporting(trip.trip_status),
+        })
 
-    state = trip.live_tracking_state or {}
-    passengers = state.get('passengers', [])
-    now_iso = timezone.now().isoformat()
     now_dt = timezone.now()
+    now_iso = now_dt.isoformat()
 
     if role == 'DRIVER':
         if user_id is None or trip.driver_id != user_id:
             return JsonResponse({'success': False, 'error': 'Not authorized as driver'}, status=403)
 
-        # Store the actual traveled path for map display (thinned to avoid unbounded growth).
+        stored = ingest_driver_point(trip, user_id, lat, lng, speed, now=now_dt)
+        message = position_message('DRIVER', stored)
+        stop_booking_id = None
+    else:
+        booking_id = _coerce_int(data.get('booking_id'))
+        if booking_id is None:
+            return JsonResponse({'success': False, 'error': 'booking_id required for passenger'}, status=400)
         try:
-            driver_path = state.get('driver_path')
-            if not isinstance(driver_path, list):
-                driver_path = []
-
-            last = driver_path[-1] if driver_path else None
-            last_lat = last.get('lat') if isinstance(last, dict) else None
-            last_lng = last.get('lng') if isinstance(last, dict) else None
-            last_ts = last.get('timestamp') if isinstance(last, dict) else None
-
-            append = False
-            if last_lat is None or last_lng is None:
-                append = True
-            else:
-                dist_m = _haversine_meters(last_lat, last_lng, lat, lng)
-                # Append if moved >= 12m, or if timestamp changed and we have no distance.
-                if dist_m is None:
-                    append = (last_ts != now_iso)
-                else:
-                    append = dist_m >= 12.0
-
-            if append:
-                driver_path.append({
-                    'lat': lat,
-                    'lng': lng,
-                    'speed': speed,
-                    'timestamp': now_iso,
-                })
-
-                # Keep only the latest N points to avoid huge JSON payloads.
-                max_points = 2000
-                if len(driver_path) > max_points:
-                    driver_path = driver_path[-max_points:]
-
-            state['driver_path'] = driver_path
-        except Exception:
-            pass
+            booking = Booking.objects.only('id', 'trip_id', 'passenger_id', 'ride_status').get(id=booking_id, trip=trip, passenger_id=user_id)
+        except Booking.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Invalid booking for passenger'}, status=404)
+
+        if getattr(booking, 'ride_status', None) != 'RIDE_STARTED':
+            # Passenger can stop sending once dropped off; ignore any late flushes.
+            return JsonResponse({'success': True, 'ignored': True, 'reason': 'Passenger not on board'})
+
+        stored = ingest_passenger_point(trip, booking, lat, lng, speed, now=now_dt)
+        message = position_message('PASSENGER', stored)
+        stop_booking_id = booking.id
+
+    publish_live_update(trip.id, now_iso, [message])
+
+    try:
+        distance_to_stop_m = distance_to_next_stop(trip.id, lat, lng, booking_id=stop_booking_id)
+    except Exception as e:
+        print('[update_live_location][next_stop_error]:', repr(e))
+        distance_to_stop_m = None
+    speed_mps = stored.get('speed_smoothed_mps', stored.get('speed'))
+    reporting = recommend_reporting(trip.trip_status, speed_mps, distance_to_stop_m)
+
+    return JsonResponse({'success': True, 'reporting': reporting})
 
-        state['driver'] = {
-            'user_id': user_id,
-            'lat': lat,
-            'lng': lng,
-            'speed': speed,
-            'timestamp': now_iso,
-        }
 
+MAX_LOCATION_BATCH_POINTS = 1000
+LOCATION_BATCH_MIN_SPACING_M = 12.0
+
+
+def _parse_point_ts(v):
+    """ISO string or epoch seconds/milliseconds -> aware datetime."""
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
         try:
-            TripLiveLocationUpdate.objects.create(
-                trip=trip,
-                user=trip.driver,
-                booking=None,
-                role='DRIVER',
-                latitude=lat,
-                longitude=lng,
-                speed_mps=speed,
-                recorded_at=now_dt,
-            )
+            secs = float(v) / 1000.0 if float(v) > 1e12 else float(v)
+            return datetime.fromtimestamp(secs, tz=dt_timezone.utc)
         except Exception:
-            pass
+            return None
+    return _parse_iso_dt(v)
+
+
+def _thin_points(points, min_spacing_m):
+    """Drop points closer than min_spacing_m to the previous kept point; the
+    newest point is always kept so the live snapshot stays exact."""
+    kept = []
+    for i, p in enumerate(points):
+        if kept and i != len(points) - 1:
+            d = _haversine_meters(kept[-1]['lat'], kept[-1]['lng'], p['lat'], p['lng'])
+            if d is not None and d < min_spacing_m:
+                continue
+        kept.append(p)
+    return kept
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def update_live_location_batch(request, trip_id):
+    """Upload positions buffered while offline, oldest to newest, in one call.
+
+    Body: {"user_id", "role", "booking_id" (passenger), "points": [{"lat", "lng",
+    "speed", "timestamp"}, ...]}. Authorisation is checked once, the points are
+    thinned to LOCATION_BATCH_MIN_SPACING_M and written in bulk, and only the
+    newest point updates the live snapshot.
+    """
+    trip, error = _get_trip_or_404(trip_id)
+    if error is not None:
+        return error
+
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+    except Exception:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON body'}, status=400)
+
+    user_id = _coerce_int(data.get('user_id'))
+    role = data.get('role')
+    raw_points = data.get('points')
+    if user_id is None or role not in ['DRIVER', 'PASSENGER'] or not isinstance(raw_points, list):
+        return JsonResponse({'success': False, 'error': 'Missing or invalid fields'}, status=400)
+    if len(raw_points) > MAX_LOCATION_BATCH_POINTS:
+        return JsonResponse({'success': False, 'error': f'At most {MAX_LOCATION_BATCH_POINTS} points per batch'}, status=400)
+
+    booking = None
+    if role == 'DRIVER':
+        if trip.driver_id != user_id:
+            return JsonResponse({'success': False, 'error': 'Not authorized as driver'}, status=403)
+        if trip.trip_status != 'IN_PROGRESS':
+            return JsonResponse({'success': True, 'ignored': True, 'reason': 'Trip not in progress'})
     else:
         booking_id = _coerce_int(data.get('booking_id'))
         if booking_id is None:
             return JsonResponse({'success': False, 'error': 'booking_id required for passenger'}, status=400)
         try:
-            booking = Booking.objects.select_related('passenger').get(id=booking_id, trip=trip, passenger_id=user_id)
+            booking = Booking.objects.only('id', 'trip_id', 'passenger_id', 'ride_status').get(id=booking_id, trip=trip, passenger_id=user_id)
         except Booking.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Invalid booking for passenger'}, status=404)
-
         if getattr(booking, 'ride_status', None) != 'RIDE_STARTED':
-            # Passenger can stop sending once dropped off; ignore any late flushes.
             return JsonResponse({'success': True, 'ignored': True, 'reason': 'Passenger not on board'})
 
-        updated = False
-        for p in passengers:
+    now_dt = timezone.now()
+    points = []
+    for rp in raw_points:
+        if not isinstance(rp, dict):
+            continue
+        lat = _coerce_float(rp.get('lat'))
+        lng = _coerce_float(rp.get('lng'))
+        if lat is None or lng is None or not (-90.0 <= lat <= 90.0) or not (-180.0 <= lng <= 180.0):
+            continue
+        ts = _parse_point_ts(rp.get('timestamp'))
+        if ts is None or ts > now_dt + timedelta(minutes=5):
+            continue
+        points.append({'lat': lat, 'lng': lng, 'speed': _coerce_float(rp.get('speed')), 'ts': ts})
+    received = len(raw_points)
+    if not points:
+        return JsonResponse({'success': True, 'received': received, 'accepted': 0, 'stored': 0})
+
+    points.sort(key=lambda p: p['ts'])
+    kept = _thin_points(points, LOCATION_BATCH_MIN_SPACING_M)
+
+    rows = [
+        TripLiveLocationUpdate(
+            trip_id=trip.id,
+            user_id=user_id,
+            booking_id=booking.id if booking is not None else None,
+            role=role,
+            latitude=p['lat'],
+            longitude=p['lng'],
+            speed_mps=p['speed'],
+            recorded_at=p['ts'],
+        )
+        for p in kept
+    ]
+    stored = 0
+    try:
+        if getattr(settings, 'LIVE_LOCATION_WRITE_BEHIND', False):
+            stored = get_location_buffer().extend(rows)
+        else:
+            TripLiveLocationUpdate.objects.bulk_create(rows, batch_size=500)
+            stored = len(rows)
+    except Exception as e:
+        print('[update_live_location_batch][persist_error]:', repr(e))
+
+    store = get_live_store()
+    newest = kept[-1]
+    newest_point = {
+        'lat': newest['lat'],
+        'lng': newest['lng'],
+        'speed': newest['speed'],
+        'timestamp': newest['ts'].isoformat(),
+    }
+    snapshot = store.snapshot(trip.id) or {}
+    messages = []
+    if role == 'DRIVER':
+        # Path points older than what live pings already recorded are skipped so
+        # the ring buffer stays in time order.
+        tail = store.get_driver_path(trip.id, limit=1)
+        tail_ts = _parse_iso_dt(tail[-1].get('timestamp')) if tail else None
+        for p in kept:
+            if tail_ts is not None and p['ts'] <= tail_ts:
+                continue
+            store.append_driver_path(trip.id, {
+                'lat': p['lat'], 'lng': p['lng'], 'speed': p['speed'], 'timestamp': p['ts'].isoformat(),
+            }, min_distance_m=LOCATION_BATCH_MIN_SPACING_M)
+        current = snapshot.get('driver') or {}
+        current_ts = _parse_iso_dt(current.get('timestamp'))
+        if current_ts is None or newest['ts'] > current_ts:
+            stored_point = enrich_driver_point(trip, dict(newest_point, user_id=user_id), current)
+            store.set_driver(trip.id, stored_point)
             try:
-                existing_bid = _coerce_int(p.get('booking_id')) if isinstance(p, dict) else None
-            except Exception:
-                existing_bid = None
-            if existing_bid is not None and existing_bid == booking_id:
-                p.update({
-                    'booking_id': booking_id,
-                    'user_id': user_id,
-                    'lat': lat,
-                    'lng': lng,
-                    'speed': speed,
-                    'timestamp': now_iso,
-                })
-                updated = True
-                break
-        if not updated:
-            passengers.append({
-                'booking_id': booking_id,
-                'user_id': user_id,
-                'lat': lat,
-                'lng': lng,
-                'speed': speed,
-                'timestamp': now_iso,
-            })
-        state['passengers'] = passengers
-
-        try:
-            TripLiveLocationUpdate.objects.create(
-                trip=trip,
-                user=booking.passenger,
-                booking=booking,
-                role='PASSENGER',
-                latitude=lat,
-                longitude=lng,
-                speed_mps=speed,
-                recorded_at=now_dt,
-            )
-        except Exception:
-            pass
+                evaluate_geofences(trip, stored_point)
+            except Exception as e:
+                print('[update_live_location_batch][geofence_error]:', repr(e))
+            try:
+                detect_arrivals(trip, stored_point, newest['ts'])
+            except Exception as e:
+                print('[update_live_location_batch][arrival_error]:', repr(e))
+            messages.append(position_message('DRIVER', stored_point))
+    else:
+        current = next((p for p in snapshot.get('passengers') or [] if p.get('booking_id') == booking.id), None)
+        current_ts = _parse_iso_dt((current or {}).get('timestamp'))
+        if current_ts is None or newest['ts'] > current_ts:
+            stored_point = dict(newest_point, booking_id=booking.id, user_id=user_id)
+            store.set_passenger(trip.id, booking.id, stored_point)
+            messages.append(position_message('PASSENGER', stored_point))
 
-    state['last_update'] = now_iso
-    trip.live_tracking_state = state
-    trip.save(update_fields=['live_tracking_state'])
+    publish_live_update(trip.id, now_dt.isoformat(), messages)
 
-    return JsonResponse({'success': True})
+    return JsonResponse({
+        'success': True,
+        'received': received,
+        'accepted': len(points),
+        'stored': stored,
+    })
 
 
 @csrf_exempt
@@ -1105,6 +1195,66 @@ def get_live_location(request, trip_id):
     if error is not None:
         return error
 
+    payload = _live_location_payload(request, trip)
+    if isinstance(payload, JsonResponse):
+        return payload
+    return JsonResponse(payload)
+
+
+@require_http_methods(["GET"])
+def stream_live_location(request, trip_id):
+    """Server-Sent Events version of get_live_location (same query parameters).
+
+    Sends the full snapshot once, then an update only when a new location is
+    published for the trip, with driver_path reduced to the new points. The
+    update body is built once per published version for all viewers with the
+    same query and path cursor. Clients without EventSource keep polling
+    get_live_location.
+    """
+    trip, error = _get_trip_or_404(trip_id)
+    if error is not None:
+        return error
+
+    first = _live_location_payload(request, trip)
+    if isinstance(first, JsonResponse):
+        return first
+    variant = ':'.join(str(request.GET.get(k) or '') for k in ('role', 'user_id', 'booking_id', 'since'))
+
+    def load(since):
+        current = Trip.objects.filter(pk=trip.pk).first()
+        if current is None:
+            return None
+        payload = _live_location_payload(request, current, since=since)
+        return None if isinstance(payload, JsonResponse) else payload
+
+    def build(cursor):
+        if not cursor.get('started'):
+            cursor['started'] = True
+            payload = first
+        else:
+            # Viewers that are caught up hold the same path cursor, so it is
+            # part of the cache variant and only the new chunks are read.
+            since = cursor.get('driver_path')
+            payload = cached_stream_payload(
+                trip.pk, cursor.get('version'), f'{variant}:{since}', lambda: load(since),
+            )
+            if payload is None:
+                return None
+        payload['live_state'] = path_delta(payload.get('live_state'), cursor)
+        return payload
+
+    return sse_response(live_event_stream(trip.pk, build))
+
+
+def _live_location_payload(request, trip, since=None):
+    """get_live_location's response body as a dict, or a JsonResponse error.
+
+    With `since` (argument, else the ?since= query value: a driver_path seq or
+    ISO timestamp) live_state.driver_path only holds newer points; see
+    driver_path_mode / driver_path_seq in the response.
+    """
+    if since is None:
+        since = parse_path_since(request.GET.get('since'))
     requester_role = (request.GET.get('role') or '').upper().strip()
     requester_user_id = request.GET.get('user_id')
     requester_booking_id = request.GET.get('booking_id')
@@ -1137,7 +1287,12 @@ def get_live_location(request, trip_id):
             except Booking.DoesNotExist:
                 return JsonResponse({'success': False, 'error': 'Not authorized for this trip'}, status=403)
 
-    live_state = trip.live_tracking_state or {}
+    live_state = live_tracking_state_for(trip, path_after=since if isinstance(since, int) else None)
+    if isinstance(live_state, dict) and isinstance(live_state.get('driver_path'), list):
+        path, path_mode, path_seq = path_since(live_state.get('driver_path'), since)
+        live_state['driver_path'] = path
+        live_state['driver_path_mode'] = path_mode
+        live_state['driver_path_seq'] = path_seq
     if requester_role == 'PASSENGER' and isinstance(live_state, dict):
         try:
             booking_id_int = int(requester_booking_id) if requester_booking_id is not None else None
@@ -1251,67 +1406,48 @@ def get_live_location(request, trip_id):
         driver_meta['signal_lost'] = seconds > 30
 
     if isinstance(driver_obj, dict):
-        driver_speed_mps = _coerce_float(driver_obj.get('speed'))
-
-    if driver_speed_mps is None and isinstance(live_state, dict):
-        try:
-            path = live_state.get('driver_path')
-            if isinstance(path, list) and len(path) >= 2:
-                a = path[-2] if isinstance(path[-2], dict) else None
-                b = path[-1] if isinstance(path[-1], dict) else None
-                if a and b:
-                    a_ts = _parse_iso_dt(a.get('timestamp'))
-                    b_ts = _parse_iso_dt(b.get('timestamp'))
-                    if a_ts and b_ts:
-                        dt_s = (b_ts - a_ts).total_seconds()
-                        if dt_s > 0.1:
-                            d_m = _haversine_meters(a.get('lat'), a.get('lng'), b.get('lat'), b.get('lng'))
-                            if d_m is not None:
-                                driver_speed_mps = float(d_m) / float(dt_s)
-        except Exception:
-            pass
+        # Smoothed on ingest (utils/motion.py); the raw reported speed is only
+        # used for points written before smoothing existed.
+        driver_speed_mps = _coerce_float(driver_obj.get('speed_smoothed_mps'))
+        if driver_speed_mps is None:
+            driver_speed_mps = _coerce_float(driver_obj.get('speed'))
+        heading = _coerce_float(driver_obj.get('heading_deg'))
+        if heading is not None:
+            driver_meta['heading_deg'] = heading
 
     if driver_speed_mps is not None and driver_speed_mps > 0:
         driver_speed_kph = float(driver_speed_mps) * 3.6
 
+    # Linear referencing: the driver's along-route offset, snapped from the
+    # offset stored at ingest, drives deviation and all remaining-distance ETAs.
+    route_index = None
+    driver_offset_m = None
     try:
         if isinstance(driver_obj, dict) and driver_obj.get('lat') is not None and driver_obj.get('lng') is not None:
             min_d = None
-
-            try:
-                geom = getattr(getattr(trip, 'route', None), 'route_geometry', None)
-            except Exception:
-                geom = None
-            if isinstance(geom, list) and geom:
-                for p in geom:
-                    if not isinstance(p, dict):
-                        continue
-                    d = _haversine_meters(driver_obj.get('lat'), driver_obj.get('lng'), p.get('lat'), p.get('lng'))
-                    if d is None:
-                        continue
-                    if min_d is None or d < min_d:
-                        min_d = d
-            else:
-                stops = list(
-                    RouteStop.objects
-                    .filter(route=trip.route)
-                    .exclude(latitude__isnull=True)
-                    .exclude(longitude__isnull=True)
-                    .only('latitude', 'longitude')
-                )
-                for s in stops:
-                    d = _haversine_meters(driver_obj.get('lat'), driver_obj.get('lng'), s.latitude, s.longitude)
-                    if d is None:
-                        continue
-                    if min_d is None or d < min_d:
-                        min_d = d
+            route_index = get_route_index(trip.route_id)
+            if route_index is not None:
+                hit, driver_offset_m = route_index.locate(driver_obj.get('lat'), driver_obj.get('lng'), driver_obj.get('route_offset_m'))
+                if hit is not None:
+                    min_d = hit.distance_m
 
             if min_d is not None:
                 driver_meta['deviation_meters'] = float(min_d)
                 driver_meta['is_deviating'] = min_d > 300
+            if driver_offset_m is not None:
+                driver_meta['route_offset_m'] = float(driver_offset_m)
+                driver_meta['route_length_m'] = float(route_index.length_m)
     except Exception:
         pass
 
+    def _remaining_to_stop_m(stop_order, lat, lng):
+        # Along-route distance when the stop is projected on the route, else straight-line.
+        if route_index is not None and driver_offset_m is not None:
+            d_route = route_index.remaining_to_stop(driver_offset_m, stop_order)
+            if d_route is not None:
+                return d_route
+        return _haversine_meters(driver_obj.get('lat'), driver_obj.get('lng'), lat, lng)
+
     try:
         if isinstance(driver_obj, dict) and driver_obj.get('lat') is not None and driver_obj.get('lng') is not None:
             last_stop = (
@@ -1319,12 +1455,12 @@ def get_live_location(request, trip_id):
                 .filter(route=trip.route)
                 .exclude(latitude__isnull=True)
                 .exclude(longitude__isnull=True)
-                .only('latitude', 'longitude')
+                .only('stop_order', 'latitude', 'longitude')
                 .order_by('-stop_order')
                 .first()
             )
             if last_stop is not None:
-                d_m = _haversine_meters(driver_obj.get('lat'), driver_obj.get('lng'), last_stop.latitude, last_stop.longitude)
+                d_m = _remaining_to_stop_m(last_stop.stop_order, last_stop.latitude, last_stop.longitude)
                 if d_m is not None:
                     driver_distance_to_final_m = float(d_m)
                     if driver_speed_mps is not None and driver_speed_mps >= 0.5:
@@ -1337,7 +1473,7 @@ def get_live_location(request, trip_id):
         if requester_role == 'PASSENGER' and requester_booking is not None and isinstance(driver_obj, dict):
             to_stop = getattr(requester_booking, 'to_stop', None)
             if to_stop is not None and driver_obj.get('lat') is not None and driver_obj.get('lng') is not None:
-                d_m = _haversine_meters(driver_obj.get('lat'), driver_obj.get('lng'), getattr(to_stop, 'latitude', None), getattr(to_stop, 'longitude', None))
+                d_m = _remaining_to_stop_m(getattr(to_stop, 'stop_order', None), getattr(to_stop, 'latitude', None), getattr(to_stop, 'longitude', None))
                 if d_m is not None:
                     passenger_distance_to_dropoff_m = float(d_m)
                     if driver_speed_mps is not None and driver_speed_mps >= 0.5:
@@ -1346,59 +1482,6 @@ def get_live_location(request, trip_id):
     except Exception:
         pass
 
-    try:
-        if requester_role == 'PASSENGER' and requester_booking is not None and isinstance(driver_obj, dict):
-            if driver_obj.get('lat') is None or driver_obj.get('lng') is None:
-                raise Exception('missing driver coordinates')
-
-            pickup_verified = getattr(requester_booking, 'pickup_verified_at', None) is not None
-            ride_status = getattr(requester_booking, 'ride_status', None)
-
-            if not pickup_verified:
-                from_stop = getattr(requester_booking, 'from_stop', None)
-                if from_stop is not None and getattr(from_stop, 'latitude', None) is not None and getattr(from_stop, 'longitude', None) is not None:
-                    d_pick = _haversine_meters(driver_obj.get('lat'), driver_obj.get('lng'), getattr(from_stop, 'latitude', None), getattr(from_stop, 'longitude', None))
-                    if d_pick is not None and float(d_pick) <= 600.0:
-                        key = f"passenger_near_pickup_{requester_booking.id}"
-                        if _record_system_notification_if_due(trip, key, cooldown_seconds=300):
-                            payload = {
-                                'user_id': str(requester_booking.passenger_id),
-                                'driver_id': str(trip.driver_id),
-                                'title': 'Driver almost reached',
-                                'body': 'Your driver almost reached to pick you.',
-                                'data': {
-                                    'type': 'driver_near_pickup',
-                                    'trip_id': str(trip.trip_id),
-                                    'booking_id': str(requester_booking.id),
-                                },
-                            }
-                            try:
-                                send_ride_notification_async(payload)
-                            except Exception:
-                                pass
-
-            if ride_status == 'RIDE_STARTED' and passenger_distance_to_dropoff_m is not None:
-                if float(passenger_distance_to_dropoff_m) <= 800.0:
-                    key = f"passenger_near_destination_{requester_booking.id}"
-                    if _record_system_notification_if_due(trip, key, cooldown_seconds=600):
-                        payload = {
-                            'user_id': str(requester_booking.passenger_id),
-                            'driver_id': str(trip.driver_id),
-                            'title': 'Near destination',
-                            'body': 'You are near your destination.',
-                            'data': {
-                                'type': 'near_destination',
-                                'trip_id': str(trip.trip_id),
-                                'booking_id': str(requester_booking.id),
-                            },
-                        }
-                        try:
-                            send_ride_notification_async(payload)
-                        except Exception:
-                            pass
-    except Exception:
-        pass
-
     try:
         if requester_role == 'DRIVER' and isinstance(live_state, dict) and isinstance(driver_obj, dict):
             driver_lat = driver_obj.get('lat')
@@ -1414,7 +1497,7 @@ def get_live_location(request, trip_id):
                         d_lat = p2.get('dropoff_lat')
                         d_lng = p2.get('dropoff_lng')
                         if d_lat is not None and d_lng is not None:
-                            d_m = _haversine_meters(driver_lat, driver_lng, d_lat, d_lng)
+                            d_m = _remaining_to_stop_m(p2.get('dropoff_stop_order'), d_lat, d_lng)
                             if d_m is not None:
                                 p2['distance_to_dropoff_m'] = float(d_m)
                                 if driver_speed_mps is not None and driver_speed_mps >= 0.5:
@@ -1425,7 +1508,7 @@ def get_live_location(request, trip_id):
     except Exception:
         pass
 
-    return JsonResponse({
+    return {
         'success': True,
         'trip_id': trip.trip_id,
         'trip_status': trip.trip_status,
@@ -1444,7 +1527,7 @@ def get_live_location(request, trip_id):
             'passenger_eta_seconds_to_dropoff': passenger_eta_seconds_to_dropoff,
             'passenger_eta_at': passenger_eta_at,
         },
-    })
+    }
 
 
 @csrf_exempt
@@ -1488,16 +1571,7 @@ def generate_pickup_code(request, trip_id, booking_id):
 
     if driver_lat is None or driver_lng is None:
         try:
-            latest_driver = (
-                TripLiveLocationUpdate.objects
-                .filter(trip=trip, role='DRIVER')
-                .only('latitude', 'longitude')
-                .order_by('-recorded_at')
-                .first()
-            )
-            if latest_driver is not None:
-                driver_lat = latest_driver.latitude
-                driver_lng = latest_driver.longitude
+            driver_lat, driver_lng = _latest_driver_position(trip)
         except Exception:
             pass
 
@@ -1577,7 +1651,7 @@ def verify_pickup_code(request):
         return JsonResponse({'success': False, 'error': 'Missing required fields'}, status=400)
 
     try:
-        booking = Booking.objects.select_related('trip', 'passenger').get(id=booking_id, passenger_id=passenger_id)
+        booking = Booking.objects.select_related('trip', 'passenger').defer(*trip_json_deferred()).get(id=booking_id, passenger_id=passenger_id)
     except Booking.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Booking not found'}, status=404)
 
@@ -1637,15 +1711,10 @@ def verify_pickup_code(request):
         pickup_lat = getattr(pickup_stop, 'latitude', None)
         pickup_lng = getattr(pickup_stop, 'longitude', None)
         if pickup_lat is not None and pickup_lng is not None:
-            latest_driver = (
-                TripLiveLocationUpdate.objects
-                .filter(trip=booking.trip, role='DRIVER')
-                .only('latitude', 'longitude', 'recorded_at')
-                .order_by('-recorded_at')
-                .first()
-            )
-            driver_lat = latest_driver.latitude if latest_driver is not None else pickup_code.driver_latitude
-            driver_lng = latest_driver.longitude if latest_driver is not None else pickup_code.driver_longitude
+            driver_lat, driver_lng = _latest_driver_position(booking.trip)
+            if driver_lat is None or driver_lng is None:
+                driver_lat = pickup_code.driver_latitude
+                driver_lng = pickup_code.driver_longitude
             if driver_lat is not None and driver_lng is not None:
                 dist = _haversine_meters(driver_lat, driver_lng, pickup_lat, pickup_lng)
     except Exception:
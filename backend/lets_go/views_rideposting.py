@@ -577,7 +577,7 @@ def get_trip_breakdown(request, trip_id):
     """Get detailed breakdown for a specific trip"""
     if request.method == 'GET':
         try:
-            trip = Trip.objects.get(trip_id=trip_id)
+            trip = Trip.objects.with_json('fare_calculation').get(trip_id=trip_id)
             
             # Get stop breakdown data
             stop_breakdowns = trip.stop_breakdowns.all().order_by('from_stop_order')
@@ -729,7 +729,7 @@ def get_user_rides(request, user_id):
                 .only(
                     'id', 'trip_id', 'trip_date', 'departure_time', 'created_at', 'updated_at', 'trip_status',
                     'total_seats', 'available_seats', 'base_fare', 'gender_preference', 'notes', 'is_negotiable',
-                    'total_distance_km', 'total_duration_minutes',
+                    'total_distance_km', 'total_duration_minutes', 'fare_calculation',
                     'route__route_id', 'route__route_name', 'route__route_description', 'route__total_distance_km', 'route__estimated_duration_minutes',
                     'vehicle__id', 'vehicle__model_number', 'vehicle__company_name', 'vehicle__plate_number', 'vehicle__vehicle_type', 'vehicle__color', 'vehicle__seats', 'vehicle__fuel_type',
                 )
@@ -875,7 +875,7 @@ def get_trip_details(request, trip_id):
     if request.method == 'GET':
         try:
             print('[GET_TRIP_DETAILS] START', trip_id)
-            trip = Trip.objects.get(trip_id=trip_id)
+            trip = Trip.objects.with_json('fare_calculation').get(trip_id=trip_id)
             
             # Update status automatically
             trip = update_trip_status_automatically(trip)
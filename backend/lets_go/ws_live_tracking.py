@@ -0,0 +1,278 @@
+"""WebSocket live tracking for the ASGI entry point (backend/asgi.py).
+
+    ws(s)://<host>/ws/trips/<trip_id>/live/?role=DRIVER&user_id=<id>
+    ws(s)://<host>/ws/trips/<trip_id>/live/?role=PASSENGER&user_id=<id>&booking_id=<id>
+    ws(s)://<host>/ws/trips/<trip_id>/live/?role=ADMIN          (admin session cookie)
+
+The connection is authorised once, with the same rules as the HTTP live
+location endpoints. After that, drivers and on-board passengers send
+{"lat", "lng", "speed"} text frames. Each frame costs a JSON parse plus a
+live-store update: no HTTP request, middleware or trip lookup. Every
+subscriber of the trip receives {"type": "position", "role", "point"}
+messages through the live broker (utils/live_broker.py). The first message
+on connect is {"type": "snapshot", "live_state"}.
+"""
+import asyncio
+import json
+import re
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models.models_trip import Trip
+from .models.models_booking import Booking
+from .utils.live_broker import get_live_broker
+from .utils.live_ingest import ingest_driver_point, ingest_passenger_point, position_message, publish_live_update
+from .utils.live_store import live_tracking_state_for
+
+
+LIVE_PATH_RE = re.compile(r'^/ws/trips/(?P<trip_id>[^/]+)/live/?$')
+
+CLOSE_NOT_FOUND = 4404
+CLOSE_FORBIDDEN = 4403
+CLOSE_BAD_REQUEST = 4400
+
+# While ingest is gated (trip not started / passenger not on board) the status
+# is re-read at most this often, so the first pings after a start get through.
+GATED_RECHECK_SECONDS = 5.0
+
+
+def _coerce_int(v):
+    try:
+        return int(str(v).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _coerce_float(v):
+    if v is None or isinstance(v, bool):
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+class _Connection:
+    def __init__(self, trip, role, user_id=None, booking=None):
+        self.trip = trip
+        self.role = role
+        self.user_id = user_id
+        self.booking = booking
+        self.checked_at = time.monotonic()
+
+    @property
+    def can_ingest(self):
+        if self.role == 'DRIVER':
+            return self.trip.trip_status == 'IN_PROGRESS'
+        if self.role == 'PASSENGER':
+            return getattr(self.booking, 'ride_status', None) == 'RIDE_STARTED'
+        return False
+
+    def visible(self, message):
+        """Passengers only see the driver and their own booking."""
+        if self.role != 'PASSENGER':
+            return message
+        if message.get('type') == 'position' and message.get('role') == 'PASSENGER':
+            point = message.get('point') or {}
+            return message if point.get('booking_id') == self.booking.id else None
+        if message.get('type') == 'snapshot':
+            return dict(message, live_state=_passenger_view(message.get('live_state'), self.booking.id))
+        return message
+
+
+def _passenger_view(live_state, booking_id):
+    if not isinstance(live_state, dict):
+        return live_state
+    live_state = dict(live_state)
+    passengers = live_state.get('passengers')
+    if isinstance(passengers, list):
+        live_state['passengers'] = [p for p in passengers if isinstance(p, dict) and p.get('booking_id') == booking_id]
+    return live_state
+
+
+def _session_user_is_active(scope):
+    from importlib import import_module
+    from http.cookies import SimpleCookie
+    from django.contrib.auth import get_user_model
+
+    headers = dict(scope.get('headers') or [])
+    cookie = SimpleCookie()
+    try:
+        cookie.load(headers.get(b'cookie', b'').decode('latin-1'))
+    except Exception:
+        return False
+    morsel = cookie.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return False
+    session = import_module(settings.SESSION_ENGINE).SessionStore(morsel.value)
+    user_pk = session.get('_auth_user_id')
+    if user_pk is None:
+        return False
+    return get_user_model().objects.filter(pk=user_pk, is_active=True).exists()
+
+
+def _authorize(scope, trip_id, params):
+    """(_Connection, None) or (None, close code)."""
+    trip = Trip.objects.only('id', 'trip_id', 'driver_id', 'route_id', 'trip_status').filter(trip_id=trip_id).first()
+    if trip is None:
+        return None, CLOSE_NOT_FOUND
+
+    role = (params.get('role') or '').upper().strip()
+    user_id = _coerce_int(params.get('user_id'))
+    if role == 'DRIVER':
+        if user_id is None or trip.driver_id != user_id:
+            return None, CLOSE_FORBIDDEN
+        return _Connection(trip, role, user_id=user_id), None
+    if role == 'PASSENGER':
+        booking_id = _coerce_int(params.get('booking_id'))
+        if user_id is None or booking_id is None:
+            return None, CLOSE_BAD_REQUEST
+        booking = (
+            Booking.objects
+            .only('id', 'trip_id', 'passenger_id', 'ride_status', 'booking_status')
+            .filter(id=booking_id, trip=trip, passenger_id=user_id, booking_status__in=['CONFIRMED', 'COMPLETED'])
+            .first()
+        )
+        if booking is None:
+            return None, CLOSE_FORBIDDEN
+        return _Connection(trip, role, user_id=user_id, booking=booking), None
+    if role == 'ADMIN':
+        if not _session_user_is_active(scope):
+            return None, CLOSE_FORBIDDEN
+        return _Connection(trip, role), None
+    return None, CLOSE_BAD_REQUEST
+
+
+def _refresh(conn):
+    """Re-read the trip/booking status that gates ingest."""
+    conn.trip.trip_status = Trip.objects.filter(pk=conn.trip.pk).values_list('trip_status', flat=True).first()
+    if conn.booking is not None:
+        conn.booking.ride_status = Booking.objects.filter(pk=conn.booking.pk).values_list('ride_status', flat=True).first()
+    conn.checked_at = time.monotonic()
+
+
+def _snapshot(conn):
+    state = live_tracking_state_for(conn.trip)
+    if conn.role == 'PASSENGER':
+        state = _passenger_view(state, conn.booking.id)
+    return {'type': 'snapshot', 'live_state': state}
+
+
+def _ingest(conn, lat, lng, speed):
+    now = timezone.now()
+    if conn.role == 'DRIVER':
+        message = position_message('DRIVER', ingest_driver_point(conn.trip, conn.user_id, lat, lng, speed, now=now))
+    else:
+        message = position_message('PASSENGER', ingest_passenger_point(conn.trip, conn.booking, lat, lng, speed, now=now))
+    publish_live_update(conn.trip.pk, now.isoformat(), [message])
+
+
+def _db_call(fn, thread_sensitive=True):
+    """sync_to_async for ORM work outside Django's request cycle.
+
+    No request_started/finished signals fire for this raw ASGI app, so stale
+    connections on the executor thread are closed before and after each call.
+    """
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=thread_sensitive)
+
+
+class LiveTrackingWebSocketApp:
+    """Raw ASGI WebSocket application (no Channels dependency)."""
+
+    async def __call__(self, scope, receive, send):
+        event = await receive()
+        if event.get('type') != 'websocket.connect':
+            return
+
+        match = LIVE_PATH_RE.match(scope.get('path') or '')
+        if match is None:
+            await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+            return
+        query = parse_qs((scope.get('query_string') or b'').decode('latin-1'))
+        params = {k: v[0] for k, v in query.items() if v}
+
+        conn, code = await _db_call(_authorize)(scope, match.group('trip_id'), params)
+        if conn is None:
+            await send({'type': 'websocket.close', 'code': code})
+            return
+
+        await send({'type': 'websocket.accept'})
+        send_lock = asyncio.Lock()
+
+        async def send_json(data):
+            async with send_lock:
+                await send({'type': 'websocket.send', 'text': json.dumps(data, separators=(',', ':'), default=str)})
+
+        broker = get_live_broker()
+        subscription = broker.subscribe(conn.trip.pk)
+
+        async def forward():
+            while True:
+                message = conn.visible(await subscription.get())
+                if message is not None:
+                    await send_json(message)
+
+        forwarder = asyncio.get_running_loop().create_task(forward())
+        revalidate = float(getattr(settings, 'LIVE_WS_REVALIDATE_SECONDS', 30) or 30)
+        try:
+            await send_json(await _db_call(_snapshot)(conn))
+            while True:
+                event = await receive()
+                kind = event.get('type')
+                if kind == 'websocket.disconnect':
+                    break
+                if kind != 'websocket.receive':
+                    continue
+                await self._handle_frame(conn, event, send_json, revalidate)
+        finally:
+            forwarder.cancel()
+            subscription.close()
+
+    async def _handle_frame(self, conn, event, send_json, revalidate):
+        try:
+            data = json.loads(event.get('text') or event.get('bytes') or b'{}')
+        except (TypeError, ValueError):
+            await send_json({'type': 'error', 'error': 'Invalid JSON'})
+            return
+        if not isinstance(data, dict):
+            await send_json({'type': 'error', 'error': 'Invalid message'})
+            return
+        if data.get('type') == 'ping':
+            await send_json({'type': 'pong'})
+            return
+        if conn.role not in ('DRIVER', 'PASSENGER'):
+            await send_json({'type': 'error', 'error': 'Read-only connection'})
+            return
+
+        lat = _coerce_float(data.get('lat'))
+        lng = _coerce_float(data.get('lng'))
+        if lat is None or lng is None or not (-90.0 <= lat <= 90.0) or not (-180.0 <= lng <= 180.0):
+            await send_json({'type': 'error', 'error': 'Missing or invalid fields'})
+            return
+
+        elapsed = time.monotonic() - conn.checked_at
+        if elapsed >= revalidate or (not conn.can_ingest and elapsed >= GATED_RECHECK_SECONDS):
+            await _db_call(_refresh, thread_sensitive=False)(conn)
+        if not conn.can_ingest:
+            await send_json({'type': 'ignored', 'reason': 'Trip not in progress' if conn.role == 'DRIVER' else 'Passenger not on board'})
+            return
+
+        try:
+            await _db_call(_ingest, thread_sensitive=False)(conn, lat, lng, _coerce_float(data.get('speed')))
+        except Exception as e:
+            print('[LiveTrackingWebSocketApp][ingest_error]:', repr(e))
+            await send_json({'type': 'error', 'error': 'Failed to record location'})
+            return
+        if data.get('id') is not None:
+            await send_json({'type': 'ack', 'id': data.get('id')})
@@ -0,0 +1,66 @@
+// Live trip tracking for the admin trip/booking maps and the share pages.
+// Prefers the SSE stream (one update per new location) and falls back to
+// polling the JSON endpoint when EventSource is unavailable or failing.
+//
+//   const liveTracker = createLiveTracker({ streamUrl, poll, render });
+//   liveTracker.start();
+//
+// render(payload) receives every stream payload with live_state.driver_path
+// merged back into the full path the page holds. The polling fallback should
+// request withSince(url) and pass its JSON through mergeStreamPath(), so both
+// only carry driver_path points newer than what the page holds.
+function createLiveTracker({ streamUrl, poll, render, pollInterval = 3500 }) {
+  let streamPath = [];
+  let pathSeq = null;
+
+  function withSince(url) {
+    if (pathSeq == null) return url;
+    return url + (url.indexOf('?') === -1 ? '?' : '&') + 'since=' + encodeURIComponent(pathSeq);
+  }
+
+  function mergeStreamPath(payload) {
+    const live = payload && payload.live_state;
+    if (!live || !Array.isArray(live.driver_path)) return payload;
+    pathSeq = live.driver_path_seq != null ? live.driver_path_seq : null;
+    if (live.driver_path_mode === 'append') {
+      streamPath = streamPath.concat(live.driver_path).slice(-2000);
+    } else {
+      streamPath = live.driver_path.slice();
+    }
+    live.driver_path = streamPath;
+    return payload;
+  }
+
+  function startPolling() {
+    poll();
+    setInterval(poll, pollInterval);
+  }
+
+  function start() {
+    if (!streamUrl || !window.EventSource) {
+      startPolling();
+      return;
+    }
+    const source = new EventSource(streamUrl);
+    let failures = 0;
+    const onMessage = (e) => {
+      failures = 0;
+      try {
+        const payload = JSON.parse(e.data);
+        if (payload && payload.success) render(mergeStreamPath(payload));
+      } catch (err) {}
+    };
+    source.addEventListener('snapshot', onMessage);
+    source.addEventListener('update', onMessage);
+    source.addEventListener('end', () => source.close());
+    source.onerror = () => {
+      failures += 1;
+      if (failures >= 3) {
+        source.close();
+        startPolling();
+      }
+    };
+  }
+
+  return { mergeStreamPath, withSince, start };
+}